@@ -2,15 +2,20 @@ from __future__ import annotations
 
 from typing import Final
 
-from . import adapters, base, interfaces, mpris, server, types
+from . import adapters, backends, base, interfaces, monitors, mpris, poller, pool, server, stats, types
 
 from .adapters import *
+from .backends import *
 from .base import *
 from .enums import *
 from .events import *
 from .interfaces import *
+from .monitors import *
 from .mpris import *
+from .poller import *
+from .pool import *
 from .server import *
+from .stats import *
 
 
 __version__: Final[str] = '0.9.0'
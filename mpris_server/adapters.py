@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 from abc import ABC
+from collections.abc import Collection
 from typing import Final
 
 from .base import ActivePlaylist, DEFAULT_DESKTOP, DEFAULT_ORDERINGS, DEFAULT_PLAYLIST_COUNT, DEFAULT_RATE, DbusObj, \
   MIME_TYPES, NoTrack, Ordering, Paths, PlayState, PlaylistEntry, Position, Rate, Track, URI, Volume
-from .enums import LoopStatus
-from .mpris.metadata import Metadata, ValidMetadata
+from .enums import LoopStatus, Method, Property
+from .mpris.metadata import TracksMetadata, ValidMetadata
 
 
 __all__ = [
@@ -20,6 +21,9 @@ __all__ = [
 
 DEFAULT_ADAPTER_NAME: Final[str] = 'MprisAdapter'
 DEFAULT_FULLSCREEN: Final[bool] = False
+DEFAULT_DEFERRED_METHODS: Final[frozenset[Method]] = frozenset()
+DEFAULT_CONSTANT_PROPERTIES: Final[frozenset[Property]] = frozenset()
+DEFAULT_THREAD_SAFE: Final[bool] = False
 
 
 class RootAdapter(ABC):
@@ -64,6 +68,9 @@ class PlayerAdapter(ABC):
 
     If this function is implemented, metadata won't be built from get_current_track().
 
+    Return PrebuiltMetadata or an `a{sv}` Variant to skip validation and
+    have the metadata sent as-is.
+
     See: https://www.freedesktop.org/wiki/Specifications/mpris-spec/metadata/
     """
     pass
@@ -218,7 +225,13 @@ class TrackListAdapter(ABC):
   def get_tracks(self) -> list[DbusObj]:
     pass
 
-  def get_tracks_metadata(self, track_ids: list[DbusObj]) -> list[Metadata]:
+  def get_tracks_metadata(self, track_ids: list[DbusObj]) -> TracksMetadata:
+    """
+    Return metadata for each track in track_ids.
+
+    Prebuilt metadata, either PrebuiltMetadata dicts or an `aa{sv}` Variant,
+    is sent as-is.
+    """
     pass
 
   def go_to(self, track_id: DbusObj):
@@ -246,3 +259,31 @@ class MprisAdapter(
 
   def __init__(self, name: str = DEFAULT_ADAPTER_NAME):
     self.name = name
+
+  def get_deferred_methods(self) -> Collection[Method]:
+    """
+    Methods that are slow enough to run on a worker thread, like OpenUri() resolving a stream.
+
+    Backends that support it reply to these calls later, so the loop keeps serving
+    properties and other callers in the meantime. Deferred methods can run
+    concurrently with property reads, so the adapter has to be thread-safe for them.
+    """
+    return DEFAULT_DEFERRED_METHODS
+
+  def get_constant_properties(self) -> Collection[Property]:
+    """
+    Properties that won't change while published, like Identity or SupportedMimeTypes.
+
+    They're read once when the server is registered, and served from then on
+    without calling the adapter. Call Server.refresh_constants() if one changes.
+    """
+    return DEFAULT_CONSTANT_PROPERTIES
+
+  def is_thread_safe(self) -> bool:
+    """
+    Whether the adapter can be called from several threads at once.
+
+    Deferred methods and the Prefetcher call the adapter from worker threads.
+    Unless this returns True, they take turns, and otherwise they run in parallel.
+    """
+    return DEFAULT_THREAD_SAFE
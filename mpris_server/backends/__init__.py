@@ -0,0 +1,20 @@
+from .backend import Backend, CallContext
+from .gio import GioBackend
+from .pydbus import PydbusBackend
+from .spec import InterfaceSpec, get_interface_spec
+
+from . import backend, gio, pydbus, spec
+
+
+__all__ = [
+  'Backend',
+  'backend',
+  'CallContext',
+  'get_interface_spec',
+  'gio',
+  'GioBackend',
+  'InterfaceSpec',
+  'pydbus',
+  'PydbusBackend',
+  'spec',
+]
@@ -0,0 +1,443 @@
+"""
+Host MPRIS in an asyncio event loop, with dbus-fast instead of pydbus and GLib.
+
+Install it with `pip install mpris_server[asyncio]`, then publish a Server with
+`backend = await publish(server)` from inside the running loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable, Collection, Sequence
+from concurrent.futures import Executor, Future
+from contextlib import closing
+from functools import partial
+from typing import Any, Final
+from weakref import ref
+
+from dbus_fast import BusType as DbusFastBusType, Message, MessageType, NameFlag, RequestNameReply, Variant
+from dbus_fast.aio import MessageBus
+from dbus_fast.constants import ErrorType
+from dbus_fast.signature import SignatureType, get_signature_tree
+from gi.repository import GLib
+from pydbus.generic import subscription
+
+from .backend import Backend, CallContext, Deferrer, Export, NameTaken, OnNameLost, call_deferred, call_method, \
+  connect_signals, disconnect_signals, get_exports, is_deferred
+from .spec import INTROSPECTABLE_INTERFACE, MethodSpec, PROPERTIES_INTERFACE, PropertySpec, get_introspection
+from ..enums import BusType
+from ..interfaces.interface import MprisInterface
+from ..server import NAME_LOST as SERVER_NAME_LOST, Server
+from ..stats import stats
+
+
+__all__ = [
+  'AsyncioBackend',
+  'publish',
+]
+
+log = logging.getLogger(__name__)
+
+NAME_FLAGS: Final[NameFlag] = NameFlag.ALLOW_REPLACEMENT | NameFlag.DO_NOT_QUEUE
+OWNED: Final[frozenset[RequestNameReply]] = frozenset({
+  RequestNameReply.PRIMARY_OWNER,
+  RequestNameReply.ALREADY_OWNER,
+})
+
+DBUS_NAME: Final[str] = 'org.freedesktop.DBus'
+NAME_LOST: Final[str] = 'NameLost'
+
+BUS_TYPES: Final[dict[BusType, DbusFastBusType]] = {
+  BusType.DEFAULT: DbusFastBusType.SESSION,
+  BusType.SESSION: DbusFastBusType.SESSION,
+  BusType.SYSTEM: DbusFastBusType.SYSTEM,
+}
+
+VARIANT: Final[str] = 'v'
+ARRAY: Final[str] = 'a'
+DICT_ENTRY: Final[str] = '{'
+INTEGERS: Final[str] = 'ynqiuxth'
+STRINGS: Final[str] = 'sog'
+
+
+def from_glib(variant: GLib.Variant) -> Any:
+  """Convert a GLib.Variant, like prebuilt metadata, to dbus-fast values."""
+  type_string = variant.get_type_string()
+
+  if type_string == VARIANT:
+    inner = variant.get_variant()
+    return Variant(inner.get_type_string(), from_glib(inner))
+
+  if not variant.is_container():
+    return variant.unpack()
+
+  children = [variant.get_child_value(index) for index in range(variant.n_children())]
+
+  if type_string.startswith(f'{ARRAY}{DICT_ENTRY}'):
+    return {
+      from_glib(child.get_child_value(0)): from_glib(child.get_child_value(1))
+      for child in children
+    }
+
+  return [from_glib(child) for child in children]
+
+
+def to_dbus(value: Any, type_: SignatureType) -> Any:
+  """Convert a value an interface returned to what dbus-fast expects for type_."""
+  token = type_.token
+
+  if isinstance(value, GLib.Variant):
+    converted = from_glib(value)
+
+    if token == VARIANT and not isinstance(converted, Variant):
+      return Variant(value.get_type_string(), converted)
+
+    return converted
+
+  match token[0]:
+    case 'a' if type_.children[0].token == DICT_ENTRY:
+      key_type, value_type = type_.children[0].children
+      return {to_dbus(key, key_type): to_dbus(item, value_type) for key, item in value.items()}
+
+    case 'a':
+      return [to_dbus(item, type_.children[0]) for item in value]
+
+    case '(':
+      return [to_dbus(item, child) for item, child in zip(value, type_.children)]
+
+    case 'b':
+      return bool(value)
+
+    case 'd':
+      return float(value)
+
+    case token if token in INTEGERS:
+      return int(value)
+
+    case token if token in STRINGS:
+      return str(value)
+
+  return value
+
+
+def log_failure(future: Future):
+  if not future.cancelled() and (error := future.exception()):
+    log.error(f'D-Bus name request failed: {error}')
+
+
+def box(signature: str, value: Any) -> Variant:
+  if isinstance(value, Variant):
+    return value
+
+  return Variant(signature, to_dbus(value, get_signature_tree(signature).types[0]))
+
+
+def to_body(signature: str, values: Sequence[Any]) -> list[Any]:
+  return [
+    to_dbus(value, type_)
+    for value, type_ in zip(values, get_signature_tree(signature).types)
+  ]
+
+
+def get_value(interface: MprisInterface, name: str) -> Any:
+  if (constant := interface.constants.get(name)) is not None:
+    return constant
+
+  return getattr(interface, name)
+
+
+def reply(message: Message, method: MethodSpec, result: Any) -> Message:
+  match method.out_args:
+    case 0:
+      body = []
+
+    case 1:
+      body = [result]
+
+    case _:
+      body = [*result]
+
+  return Message.new_method_return(message, method.out_signature, to_body(method.out_signature, body))
+
+
+def reply_error(message: Message, error: Exception) -> Message:
+  log.exception(f'Exception while handling {message.interface}.{message.member}()')
+  return Message.new_error(message, f'unknown.{type(error).__name__}', str(error))
+
+
+class AsyncioBackend(Backend):
+  """
+  Export interfaces on a dbus-fast MessageBus, handling calls in its event loop.
+
+  Methods the adapter defers run on a worker pool, and are replied to from the loop.
+  """
+
+  bus: MessageBus
+  loop: asyncio.AbstractEventLoop
+  path: str | None
+  private: bool
+  deferrer: Deferrer
+
+  _exports: dict[str, Export]
+  _introspection: str
+  _subscriptions: list[subscription]
+  _names: set[str]
+  _pending: list[Future]
+  _handlers: dict[tuple[str, str], Callable[[Message], Message]]
+
+  def __init__(
+    self,
+    bus: MessageBus,
+    loop: asyncio.AbstractEventLoop | None = None,
+    private: bool = False,
+    executor: Executor | None = None,
+  ):
+    self.bus = bus
+    self.loop = loop or asyncio.get_running_loop()
+    self.path = None
+    self.private = private
+    self.deferrer = Deferrer(executor)
+
+    self._exports = {}
+    self._introspection = ''
+    self._subscriptions = []
+    self._names = set()
+    self._pending = []
+    self._handlers = {
+      (PROPERTIES_INTERFACE, 'Get'): self._get,
+      (PROPERTIES_INTERFACE, 'GetAll'): self._get_all,
+      (PROPERTIES_INTERFACE, 'Set'): self._set,
+      (INTROSPECTABLE_INTERFACE, 'Introspect'): self._introspect,
+    }
+
+  @property
+  def names(self) -> Collection[str]:
+    return self._names
+
+  def register(self, path: str, interfaces: Sequence[MprisInterface]):
+    self.path = path
+    self._exports = get_exports(interfaces)
+    self._introspection = get_introspection([export.spec for export in self._exports.values()])
+
+    for export in self._exports.values():
+      self._subscriptions += connect_signals(export, self._emit, box)
+
+    self.bus.add_message_handler(self._on_message)
+
+  def unregister(self):
+    if self.path is None:
+      return
+
+    self.bus.remove_message_handler(self._on_message)
+    disconnect_signals(self._subscriptions)
+
+    self.path = None
+    self._exports = {}
+
+  def request_name(self, name: str):
+    self._names.add(name)
+    self._call_soon(self._request_name(name))
+
+  def release_name(self, name: str):
+    if name in self._names:
+      self._names.discard(name)
+      self._call_soon(self.bus.release_name(name))
+
+  def close(self):
+    super().close()
+    self.deferrer.shutdown()
+
+    if self.private:
+      self.bus.disconnect()
+
+  async def flush(self):
+    """Wait for name requests and releases, raising the first error."""
+    pending, self._pending = self._pending, []
+    await asyncio.gather(*map(asyncio.wrap_future, pending))
+
+  async def _request_name(self, name: str):
+    reply = await self.bus.request_name(name, NAME_FLAGS)
+
+    if reply == RequestNameReply.EXISTS:
+      self._names.discard(name)
+      raise NameTaken(f'{name} is already owned on the bus.')
+
+    if reply not in OWNED:
+      self._names.discard(name)
+      raise RuntimeError(f'Could not own {name}: {reply.name}')
+
+  def _call_soon(self, coro):
+    # name calls are usually made from the loop, but signals and quits might not be
+    future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+    future.add_done_callback(log_failure)
+
+    self._pending = [*(pending for pending in self._pending if not pending.done()), future]
+
+  def _emit(self, interface: str, member: str, signature: str, args: tuple[Any, ...]):
+    message = Message.new_signal(self.path, interface, member, signature, to_body(signature, args))
+    self.loop.call_soon_threadsafe(self.bus.send, message)
+
+  def _on_message(self, message: Message) -> Message | bool | None:
+    if message.message_type == MessageType.SIGNAL:
+      self._on_signal(message)
+      return None
+
+    if message.message_type != MessageType.METHOD_CALL or message.path != self.path:
+      return None
+
+    try:
+      return self._dispatch(message)
+
+    except Exception as e:
+      return reply_error(message, e)
+
+  def _on_signal(self, message: Message):
+    if message.sender != DBUS_NAME or message.member != NAME_LOST:
+      return
+
+    name, = message.body
+
+    if name in self._names:
+      self._names.discard(name)
+      self.lost(name)
+
+  def _get(self, message: Message) -> Message:
+    interface_name, name = message.body
+    export, prop = self._get_property(interface_name, name)
+    value = get_value(export.interface, name)
+
+    return Message.new_method_return(message, VARIANT, [box(prop.signature, value)])
+
+  def _get_all(self, message: Message) -> Message:
+    interface_name, = message.body
+    interface, spec = self._exports[interface_name]
+    values = {
+      name: box(prop.signature, get_value(interface, name))
+      for name, prop in spec.properties.items()
+      if prop.readable
+    }
+
+    return Message.new_method_return(message, 'a{sv}', [values])
+
+  def _set(self, message: Message) -> Message:
+    interface_name, name, value = message.body
+    export, prop = self._get_property(interface_name, name)
+
+    if not prop.writable:
+      return Message.new_error(message, ErrorType.PROPERTY_READ_ONLY, f'{name} is read-only')
+
+    setattr(export.interface, name, value.value)
+    return Message.new_method_return(message)
+
+  def _introspect(self, message: Message) -> Message:
+    return Message.new_method_return(message, 's', [self._introspection])
+
+  def _dispatch(self, message: Message) -> Message | bool | None:
+    if handler := self._handlers.get((message.interface, message.member)):
+      return handler(message)
+
+    if not (export := self._find_export(message.interface, message.member)):
+      # leaves org.freedesktop.DBus.Peer to dbus-fast
+      return None
+
+    interface, spec = export
+    method = spec.methods[message.member]
+    context = CallContext(message.sender, message.serial, message.path, spec.name, message.member)
+    call = partial(call_method, interface, message.member, message.body, context)
+
+    if is_deferred(interface, message.member):
+      future = self.deferrer.submit(call_deferred, interface, call)
+      future.add_done_callback(partial(self._reply_later, message, method))
+
+      # handled, the reply is sent when the worker finishes
+      return True
+
+    return reply(message, method, call())
+
+  def _reply_later(self, message: Message, method: MethodSpec, future: Future):
+    try:
+      response = reply(message, method, future.result())
+
+    except Exception as e:
+      response = reply_error(message, e)
+
+    self.loop.call_soon_threadsafe(self.bus.send, response)
+
+  def _find_export(self, interface: str | None, member: str) -> Export | None:
+    if interface:
+      export = self._exports.get(interface)
+      return export if export and member in export.spec.methods else None
+
+    return next((export for export in self._exports.values() if member in export.spec.methods), None)
+
+  def _get_property(self, interface: str, name: str) -> tuple[Export, PropertySpec]:
+    export = self._exports[interface]
+    return export, export.spec.properties[name]
+
+
+async def request_instance(server: Server, backend: AsyncioBackend, taken: int | None = None):
+  """Own the first instance of server's name that's free, waiting for each request's reply."""
+  with closing(server._get_instances(taken)) as attempts:
+    for _ in attempts:
+      backend.request_name(server.bus_name)
+
+      try:
+        await backend.flush()
+        return
+
+      except NameTaken:
+        log.debug(f'{server.bus_name} is owned elsewhere, trying the next instance.')
+
+  raise NameTaken(f'Could not own an instance of {server.bus_name}.')
+
+
+async def request_name(server: Server, backend: AsyncioBackend):
+  """Like Server.request_name(), for requests that only fail once they're replied to."""
+  server.request_name()
+
+  try:
+    await backend.flush()
+
+  except NameTaken:
+    log.info(f'{server.bus_name} is taken, publishing {server.name} as another instance.')
+    await request_instance(server, backend, taken=server.instance)
+
+
+async def republish(server: Server, backend: AsyncioBackend, name: str):
+  try:
+    await request_instance(server, backend, taken=server.instance)
+
+  except Exception as e:
+    log.error(f'Could not publish {server.name} again after losing {name}: {e}')
+    return
+
+  log.info(f'Published {server.name} again as {server.bus_name}.')
+
+
+def get_name_lost_handler(server: Server, backend: AsyncioBackend) -> OnNameLost:
+  """Like the server's own handler, but waits for each request so taken instances are skipped."""
+  server_ref = ref(server)
+
+  def on_name_lost(name: str):
+    if not (server := server_ref()) or name != server.bus_name:
+      return
+
+    stats.incr(SERVER_NAME_LOST)
+
+    # not with the backend's own name calls, since flushing them waits for this too
+    asyncio.run_coroutine_threadsafe(republish(server, backend, name), backend.loop)
+
+  return on_name_lost
+
+
+async def publish(server: Server, bus_type: BusType = BusType.DEFAULT) -> AsyncioBackend:
+  """Connect to a bus, then register and publish server from the running loop."""
+  bus = await MessageBus(bus_type=BUS_TYPES.get(bus_type, DbusFastBusType.SESSION)).connect()
+  backend = AsyncioBackend(bus, private=True)
+
+  server.register(backend)
+  backend.on_name_lost = get_name_lost_handler(server, backend)
+  await request_name(server, backend)
+
+  log.info(f'Published {server.bus_name} to D-Bus {bus_type} bus.')
+  return backend
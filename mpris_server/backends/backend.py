@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Collection, Iterable, Sequence
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from functools import cache
+from inspect import signature
+from threading import Lock
+from typing import Any, Final, NamedTuple, TYPE_CHECKING
+from weakref import WeakKeyDictionary
+
+from pydbus.generic import signal, subscription
+
+from .spec import InterfaceSpec, PROPERTIES_CHANGED, PROPERTIES_CHANGED_SIGNATURE, PROPERTIES_INTERFACE, \
+  get_interface_spec
+from ..interfaces.interface import DBUS_CONTEXT, MprisInterface
+
+
+if TYPE_CHECKING:
+  from ..adapters import MprisAdapter
+
+
+__all__ = [
+  'Backend',
+  'CallContext',
+  'Deferrer',
+  'Export',
+  'NameTaken',
+  'adapter_calls',
+]
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKERS: Final[int] = 4
+WORKER_PREFIX: Final[str] = 'mpris-worker'
+
+# worker threads take turns calling adapters that aren't thread-safe
+_adapter_locks: Final[WeakKeyDictionary[MprisAdapter, Lock]] = WeakKeyDictionary()
+_adapter_locks_lock: Final[Lock] = Lock()
+
+
+# interface, member, signature and arguments
+type EmitSignal = Callable[[str, str, str, tuple[Any, ...]], None]
+# wraps a value in a variant of the given signature
+type Box = Callable[[str, Any], Any]
+# called with a bus name another connection took over
+type OnNameLost = Callable[[str], None]
+
+
+class NameTaken(RuntimeError):
+  """The bus name is owned by another connection, which doesn't allow replacement."""
+
+
+class CallContext(NamedTuple):
+  """The incoming call, for backends that don't use pydbus' MethodCallContext."""
+
+  sender: str | None
+  serial: int
+  path: str
+  interface: str
+  member: str
+
+
+class Export(NamedTuple):
+  interface: MprisInterface
+  spec: InterfaceSpec
+
+
+class Backend(ABC):
+  """
+  A D-Bus connection that exports MprisInterfaces and owns bus names for them.
+
+  Interfaces emit signals with pydbus' generic signals, which are plain
+  callback lists, so any backend can forward them to its connection.
+
+  Names are owned allowing replacement, and on_name_lost is called with
+  names another connection replaced them for.
+  """
+
+  on_name_lost: OnNameLost | None = None
+
+  @property
+  @abstractmethod
+  def names(self) -> Collection[str]:
+    """Bus names currently owned."""
+
+  @abstractmethod
+  def register(self, path: str, interfaces: Sequence[MprisInterface]):
+    """Export interfaces at path."""
+
+  @abstractmethod
+  def unregister(self):
+    """Stop exporting everything that was registered."""
+
+  @abstractmethod
+  def request_name(self, name: str):
+    """Own name, raising NameTaken if another connection owns it."""
+
+  @abstractmethod
+  def release_name(self, name: str):
+    pass
+
+  def lost(self, name: str):
+    log.warning(f'Lost {name} to another connection.')
+
+    if self.on_name_lost:
+      self.on_name_lost(name)
+
+  def close(self):
+    """Release names, unregister and close the connection if the backend owns it."""
+    for name in [*self.names]:
+      self.release_name(name)
+
+    self.unregister()
+
+
+class Deferrer:
+  """Runs deferred methods on a worker pool, so their replies can be sent later."""
+
+  workers: int
+
+  _executor: Executor | None
+  _owned: bool
+
+  def __init__(self, executor: Executor | None = None, workers: int = DEFAULT_WORKERS):
+    self.workers = workers
+
+    self._executor = executor
+    self._owned = executor is None
+
+  def submit(self, func: Callable[..., Any], *args, **kwargs) -> Future:
+    if self._executor is None:
+      self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=WORKER_PREFIX)
+
+    return self._executor.submit(func, *args, **kwargs)
+
+  def shutdown(self):
+    if self._owned and self._executor:
+      self._executor.shutdown(wait=False)
+      self._executor = None
+
+
+def is_deferred(interface: MprisInterface, member: str) -> bool:
+  if adapter := interface.adapter:
+    return member in adapter.get_deferred_methods()
+
+  return False
+
+
+def get_exports(interfaces: Iterable[MprisInterface]) -> dict[str, Export]:
+  exports: dict[str, Export] = {}
+
+  for interface in interfaces:
+    spec = get_interface_spec(type(interface))
+    exports[spec.name] = Export(interface, spec)
+
+  return exports
+
+
+def get_signals(interface: MprisInterface) -> Iterable[signal]:
+  for cls in type(interface).__mro__:
+    for attr in vars(cls).values():
+      if isinstance(attr, signal):
+        yield attr
+
+
+def prune_signal(sig: signal, *objects: object):
+  # pydbus never removes an object from a signal's map, even with no subscribers left
+  for obj in objects or [*sig.map]:
+    if obj in sig.map and not sig.map[obj]:
+      del sig.map[obj]
+
+
+def connect_signals(export: Export, emit: EmitSignal, box: Box) -> list[subscription]:
+  """Forward an interface's signals, and its PropertiesChanged, to emit."""
+  interface, spec = export
+  subscriptions: list[subscription] = []
+
+  for signal_spec in spec.signals.values():
+    def on_signal(*args, name: str = signal_spec.name, arg_types: str = signal_spec.signature):
+      emit(spec.name, name, arg_types, args)
+
+    subscriptions.append(getattr(interface, signal_spec.name).connect(on_signal))
+
+  def on_properties_changed(interface_name: str, changed: dict[str, Any], invalidated: list[str]):
+    changed = {
+      name: box(spec.properties[name].signature, value)
+      for name, value in changed.items()
+    }
+    args = interface_name, changed, invalidated
+
+    emit(PROPERTIES_INTERFACE, PROPERTIES_CHANGED, PROPERTIES_CHANGED_SIGNATURE, args)
+
+  subscriptions.append(interface.PropertiesChanged.connect(on_properties_changed))
+
+  return subscriptions
+
+
+def disconnect_signals(subscriptions: list[subscription]):
+  for sub in subscriptions:
+    sub.disconnect()
+
+  subscriptions.clear()
+
+
+@cache
+def accepts_context(cls: type[MprisInterface], member: str) -> bool:
+  return DBUS_CONTEXT in signature(getattr(cls, member)).parameters
+
+
+def adapter_calls(adapter: MprisAdapter | None) -> AbstractContextManager:
+  """Hold while calling the adapter from a worker thread, unless it's thread-safe."""
+  if adapter is None or adapter.is_thread_safe():
+    return nullcontext()
+
+  with _adapter_locks_lock:
+    if (lock := _adapter_locks.get(adapter)) is None:
+      lock = _adapter_locks[adapter] = Lock()
+
+  return lock
+
+
+def call_deferred(interface: MprisInterface, call: Callable[[], Any]) -> Any:
+  with adapter_calls(interface.adapter):
+    return call()
+
+
+def call_method(interface: MprisInterface, member: str, args: Sequence[Any], context: CallContext) -> Any:
+  method = getattr(interface, member)
+
+  if accepts_context(type(interface), member):
+    return method(*args, dbus_context=context)
+
+  return method(*args)
@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable, Collection, Sequence
+from concurrent.futures import Executor, Future
+from functools import cache, partial
+from typing import Any, Final, NamedTuple, Self
+
+from gi.repository import Gio, GLib
+from pydbus.generic import subscription
+
+from .backend import Backend, CallContext, Deferrer, Export, NameTaken, accepts_context, call_deferred, \
+  connect_signals, disconnect_signals, get_exports, is_deferred
+from .spec import MethodSpec, get_interface_spec
+from ..interfaces.interface import DBUS_CONTEXT, MprisInterface
+
+
+__all__ = [
+  'GioBackend',
+]
+
+log = logging.getLogger(__name__)
+
+DBUS_NAME: Final[str] = 'org.freedesktop.DBus'
+DBUS_PATH: Final[str] = '/org/freedesktop/DBus'
+
+# allow replacement and don't queue, like pydbus
+NAME_FLAGS: Final[int] = 0x1 | 0x4
+PRIMARY_OWNER: Final[int] = 1
+EXISTS: Final[int] = 3
+ALREADY_OWNER: Final[int] = 4
+NO_TIMEOUT: Final[int] = -1
+
+NAME_LOST: Final[str] = 'NameLost'
+NAME_ACQUIRED: Final[str] = 'NameAcquired'
+
+CONNECTION_FLAGS: Final[Gio.DBusConnectionFlags] = \
+  Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION
+
+
+type Getter = Callable[[MprisInterface], Any]
+type Setter = Callable[[MprisInterface, Any], None]
+type OnName = Callable[[str], None]
+
+
+class MethodEntry(NamedTuple):
+  function: Callable[..., Any]
+  spec: MethodSpec
+  reply_type: str
+  takes_context: bool
+
+
+class PropertyEntry(NamedTuple):
+  getter: Getter
+  setter: Setter | None
+  signature: str
+
+
+class DispatchTable(NamedTuple):
+  """An interface class's members, looked up once instead of on every call."""
+
+  info: Gio.DBusInterfaceInfo
+  methods: dict[str, MethodEntry]
+  properties: dict[str, PropertyEntry]
+
+
+@cache
+def get_dispatch_table(cls: type[MprisInterface]) -> DispatchTable:
+  spec = get_interface_spec(cls)
+  node = Gio.DBusNodeInfo.new_for_xml(cls.__doc__)
+  info = node.lookup_interface(spec.name)
+  info.cache_build()
+
+  methods = {
+    name: MethodEntry(getattr(cls, name), method, f'({method.out_signature})', accepts_context(cls, name))
+    for name, method in spec.methods.items()
+  }
+
+  properties: dict[str, PropertyEntry] = {}
+
+  for name, prop in spec.properties.items():
+    descriptor: property = getattr(cls, name)
+    setter = descriptor.fset if prop.writable else None
+    properties[name] = PropertyEntry(descriptor.fget, setter, prop.signature)
+
+  return DispatchTable(info, methods, properties)
+
+
+def box(signature: str, value: Any) -> GLib.Variant:
+  return GLib.Variant(signature, value)
+
+
+def call_bus(connection: Gio.DBusConnection, method: str, args: GLib.Variant) -> int:
+  result = connection.call_sync(
+    DBUS_NAME, DBUS_PATH, DBUS_NAME, method, args,
+    GLib.VariantType('(u)'), Gio.DBusCallFlags.NONE, NO_TIMEOUT, None,
+  )
+  reply, = result.unpack()
+
+  return reply
+
+
+def own_name(connection: Gio.DBusConnection, name: str):
+  reply = call_bus(connection, 'RequestName', GLib.Variant('(su)', (name, NAME_FLAGS)))
+
+  if reply == EXISTS:
+    raise NameTaken(f'{name} is already owned on the bus.')
+
+  if reply not in {PRIMARY_OWNER, ALREADY_OWNER}:
+    raise RuntimeError(f'Could not own {name}, reply: {reply}')
+
+
+def disown_name(connection: Gio.DBusConnection, name: str):
+  call_bus(connection, 'ReleaseName', GLib.Variant('(s)', (name,)))
+
+
+def watch_names(connection: Gio.DBusConnection, on_lost: OnName, on_acquired: OnName) -> list[int]:
+  """Subscribe to the bus telling this connection it lost or acquired a name."""
+  def on_signal(connection, sender, path, interface, member, parameters):
+    name, = parameters.unpack()
+    callback = on_lost if member == NAME_LOST else on_acquired
+    callback(name)
+
+  return [
+    connection.signal_subscribe(
+      DBUS_NAME, DBUS_NAME, member, DBUS_PATH, None, Gio.DBusSignalFlags.NONE, on_signal,
+    )
+    for member in (NAME_LOST, NAME_ACQUIRED)
+  ]
+
+
+def unwatch_names(connection: Gio.DBusConnection, watches: list[int]):
+  for watch in watches:
+    connection.signal_unsubscribe(watch)
+
+
+class GioBackend(Backend):
+  """
+  Register interfaces directly on a Gio.DBusConnection.
+
+  Calls are dispatched through tables built once per interface class, rather
+  than by pydbus' per-call reflection, and signals go straight to emit_signal.
+
+  Methods the adapter defers run on a worker pool, and their invocations
+  are returned from the worker when they finish.
+  """
+
+  connection: Gio.DBusConnection
+  private: bool
+  path: str | None
+  deferrer: Deferrer
+
+  _registrations: list[int]
+  _subscriptions: list[subscription]
+  _names: set[str]
+  _watches: list[int]
+
+  def __init__(self, connection: Gio.DBusConnection, private: bool = False, executor: Executor | None = None):
+    self.connection = connection
+    self.private = private
+    self.path = None
+    self.deferrer = Deferrer(executor)
+
+    self._registrations = []
+    self._subscriptions = []
+    self._names = set()
+    self._watches = []
+
+  @classmethod
+  def connect(cls, address: str) -> Self:
+    """Open a private connection, that is closed with the backend."""
+    connection = Gio.DBusConnection.new_for_address_sync(address, CONNECTION_FLAGS, None, None)
+    return cls(connection, private=True)
+
+  @classmethod
+  def for_bus(cls, bus_type: Gio.BusType = Gio.BusType.SESSION) -> Self:
+    return cls(Gio.bus_get_sync(bus_type, None))
+
+  @property
+  def names(self) -> Collection[str]:
+    return self._names
+
+  def register(self, path: str, interfaces: Sequence[MprisInterface]):
+    self.path = path
+
+    try:
+      for export in get_exports(interfaces).values():
+        self._register(path, export)
+
+    except Exception:
+      self.unregister()
+      raise
+
+  def _register(self, path: str, export: Export):
+    interface = export.interface
+    table = get_dispatch_table(type(interface))
+
+    def method_call(connection, sender, object_path, interface_name, method_name, parameters, invocation):
+      self._call(interface, table, invocation, sender, interface_name, method_name, parameters)
+
+    def get_property(connection, sender, object_path, interface_name, property_name) -> GLib.Variant:
+      if (constant := interface.constants.get(property_name)) is not None:
+        return constant
+
+      getter, _, signature = table.properties[property_name]
+      return GLib.Variant(signature, getter(interface))
+
+    def set_property(connection, sender, object_path, interface_name, property_name, value) -> bool:
+      _, setter, _ = table.properties[property_name]
+      setter(interface, value.unpack())
+      return True
+
+    registration = self.connection.register_object(path, table.info, method_call, get_property, set_property)
+    self._registrations.append(registration)
+    self._subscriptions += connect_signals(export, self._emit, box)
+
+  def unregister(self):
+    disconnect_signals(self._subscriptions)
+
+    registrations = self._registrations
+    self._registrations = []
+
+    for registration in registrations:
+      self.connection.unregister_object(registration)
+
+    self.path = None
+
+  def request_name(self, name: str):
+    if name in self._names:
+      return
+
+    if not self._watches:
+      self._watches = watch_names(self.connection, self._on_name_lost, self._on_name_acquired)
+
+    own_name(self.connection, name)
+    self._names.add(name)
+
+  def release_name(self, name: str):
+    if name in self._names:
+      self._names.discard(name)
+      disown_name(self.connection, name)
+
+  def close(self):
+    super().close()
+    self.deferrer.shutdown()
+
+    unwatch_names(self.connection, self._watches)
+    self._watches = []
+
+    if self.private:
+      self.connection.close_sync(None)
+
+  def _on_name_lost(self, name: str):
+    if name in self._names:
+      self._names.discard(name)
+      self.lost(name)
+
+  def _on_name_acquired(self, name: str):
+    log.debug(f'Acquired {name}.')
+
+  def _emit(self, interface: str, member: str, signature: str, args: tuple[Any, ...]):
+    self.connection.emit_signal(None, self.path, interface, member, GLib.Variant(f'({signature})', args))
+
+  def _call(
+    self,
+    interface: MprisInterface,
+    table: DispatchTable,
+    invocation: Gio.DBusMethodInvocation,
+    sender: str,
+    interface_name: str,
+    method_name: str,
+    parameters: GLib.Variant,
+  ):
+    try:
+      entry = table.methods[method_name]
+      kwargs = {}
+
+      if entry.takes_context:
+        serial = invocation.get_message().get_serial()
+        kwargs[DBUS_CONTEXT] = CallContext(sender, serial, self.path, interface_name, method_name)
+
+      call = partial(entry.function, interface, *parameters.unpack(), **kwargs)
+
+      if is_deferred(interface, method_name):
+        # invocations can be returned from any thread
+        future = self.deferrer.submit(call_deferred, interface, call)
+        future.add_done_callback(partial(reply_later, invocation, entry))
+        return
+
+      reply(invocation, entry, call())
+
+    except Exception as e:
+      reply_error(invocation, e)
+
+
+def reply(invocation: Gio.DBusMethodInvocation, entry: MethodEntry, result: Any):
+  match entry.spec.out_args:
+    case 0:
+      invocation.return_value(None)
+
+    case 1:
+      invocation.return_value(GLib.Variant(entry.reply_type, (result,)))
+
+    case _:
+      invocation.return_value(GLib.Variant(entry.reply_type, result))
+
+
+def reply_error(invocation: Gio.DBusMethodInvocation, error: Exception):
+  log.exception(f'Exception while handling {invocation.get_interface_name()}.{invocation.get_method_name()}()')
+  invocation.return_dbus_error(f'unknown.{type(error).__name__}', str(error))
+
+
+def reply_later(invocation: Gio.DBusMethodInvocation, entry: MethodEntry, future: Future):
+  try:
+    reply(invocation, entry, future.result())
+
+  except Exception as e:
+    reply_error(invocation, e)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Collection, Sequence
+from concurrent.futures import Executor
+from functools import cache, partial
+from typing import Any, Self
+
+from gi.repository import Gio, GLib
+from pydbus import connect
+from pydbus.bus import Bus
+from pydbus.registration import ObjectRegistration, ObjectWrapper
+
+from .backend import Backend, Deferrer, call_deferred, is_deferred, prune_signal
+from .gio import disown_name, own_name, unwatch_names, watch_names
+from ..interfaces.interface import MprisInterface
+
+
+__all__ = [
+  'PydbusBackend',
+]
+
+log = logging.getLogger(__name__)
+
+
+@cache
+def get_interface_info(cls: type[MprisInterface]) -> list[Gio.DBusInterfaceInfo]:
+  return Gio.DBusNodeInfo.new_for_xml(cls.__doc__).interfaces
+
+
+class InterfaceWrapper(ObjectWrapper):
+  """
+  pydbus' wrapper, except that deferred methods run on the backend's workers,
+  and constant properties are sent as the Variants they're kept as.
+  """
+
+  __slots__ = ('deferrer',)
+
+  object: MprisInterface
+  deferrer: Deferrer
+
+  def __init__(self, object: MprisInterface, interfaces: list[Gio.DBusInterfaceInfo], deferrer: Deferrer):
+    super().__init__(object, interfaces)
+    self.deferrer = deferrer
+
+  def call_method(self, connection, sender, object_path, interface_name, method_name, parameters, invocation):
+    args = (connection, sender, object_path, interface_name, method_name, parameters, invocation)
+    call = partial(super().call_method, *args)
+
+    if interface_name != self.object.INTERFACE or not is_deferred(self.object, method_name):
+      return call()
+
+    # pydbus returns the invocation when the method does, which is fine from any thread
+    try:
+      self.deferrer.submit(call_deferred, self.object, call)
+
+    except Exception as e:
+      log.exception(f'Could not defer {interface_name}.{method_name}(): {e}')
+      invocation.return_dbus_error(f'unknown.{type(e).__name__}', str(e))
+
+  def Get(self, interface_name: str, property_name: str) -> Any:
+    if (constant := self.object.constants.get(property_name)) is not None:
+      return constant
+
+    return super().Get(interface_name, property_name)
+
+  def GetAll(self, interface_name: str) -> dict[str, Any]:
+    constants = self.object.constants
+    values = {}
+
+    for name, signature in self.readable_properties.items():
+      namespace, prop = name.rsplit('.', 1)
+
+      if namespace != interface_name:
+        continue
+
+      if (constant := constants.get(prop)) is None:
+        constant = GLib.Variant(signature, getattr(self.object, prop))
+
+      values[prop] = constant
+
+    return values
+
+
+def register_object(bus: Bus, path: str, interface: MprisInterface, deferrer: Deferrer) -> ObjectRegistration:
+  interfaces = get_interface_info(type(interface))
+  wrapper = InterfaceWrapper(interface, interfaces, deferrer)
+
+  return ObjectRegistration(bus, path, interfaces, wrapper, own_wrapper=True)
+
+
+class PydbusBackend(Backend):
+  """
+  Export interfaces through pydbus, on a GLib main loop.
+
+  Methods the adapter defers run on a worker pool, and their invocations
+  are returned from the worker when they finish.
+  """
+
+  bus: Bus
+  private: bool
+  deferrer: Deferrer
+
+  _registrations: list[ObjectRegistration]
+  _names: set[str]
+  _watches: list[int]
+
+  def __init__(self, bus: Bus, private: bool = False, executor: Executor | None = None):
+    self.bus = bus
+    self.private = private
+    self.deferrer = Deferrer(executor)
+
+    self._registrations = []
+    self._names = set()
+    self._watches = []
+
+  @classmethod
+  def connect(cls, address: str) -> Self:
+    """Open a private connection, that is closed with the backend."""
+    return cls(connect(address), private=True)
+
+  @property
+  def names(self) -> Collection[str]:
+    return self._names
+
+  def register(self, path: str, interfaces: Sequence[MprisInterface]):
+    try:
+      for interface in interfaces:
+        self._registrations.append(register_object(self.bus, path, interface, self.deferrer))
+
+    except Exception:
+      self.unregister()
+      raise
+
+  def unregister(self):
+    registrations = self._registrations
+    self._registrations = []
+
+    for registration in reversed(registrations):
+      registration.unregister()
+
+    prune_signal(ObjectWrapper.SignalEmitted)
+
+  def request_name(self, name: str):
+    # owned through the connection, because pydbus can't tell a taken name apart from other failures
+    if name in self._names:
+      return
+
+    if not self._watches:
+      self._watches = watch_names(self.bus.con, self._on_name_lost, self._on_name_acquired)
+
+    own_name(self.bus.con, name)
+    self._names.add(name)
+
+  def release_name(self, name: str):
+    if name in self._names:
+      self._names.discard(name)
+      disown_name(self.bus.con, name)
+
+  def close(self):
+    super().close()
+    self.deferrer.shutdown()
+
+    unwatch_names(self.bus.con, self._watches)
+    self._watches = []
+
+    if self.private:
+      self.bus.con.close_sync(None)
+
+  def _on_name_lost(self, name: str):
+    if name in self._names:
+      self._names.discard(name)
+      self.lost(name)
+
+  def _on_name_acquired(self, name: str):
+    log.debug(f'Acquired {name}.')
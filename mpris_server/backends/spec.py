@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from functools import cache
+from typing import Final, NamedTuple
+from xml.etree import ElementTree
+from xml.etree.ElementTree import Element
+
+from ..enums import Access
+from ..interfaces.interface import MprisInterface
+
+
+__all__ = [
+  'InterfaceSpec',
+  'MethodSpec',
+  'PropertySpec',
+  'SignalSpec',
+  'get_interface_spec',
+  'get_introspection',
+]
+
+PROPERTIES_INTERFACE: Final[str] = 'org.freedesktop.DBus.Properties'
+INTROSPECTABLE_INTERFACE: Final[str] = 'org.freedesktop.DBus.Introspectable'
+PEER_INTERFACE: Final[str] = 'org.freedesktop.DBus.Peer'
+
+PROPERTIES_CHANGED: Final[str] = 'PropertiesChanged'
+PROPERTIES_CHANGED_SIGNATURE: Final[str] = 'sa{sv}as'
+
+IN: Final[str] = 'in'
+OUT: Final[str] = 'out'
+
+STANDARD_INTERFACES: Final[str] = f"""
+  <interface name="{PROPERTIES_INTERFACE}">
+    <method name="Get">
+      <arg direction="in" type="s"/>
+      <arg direction="in" type="s"/>
+      <arg direction="out" type="v"/>
+    </method>
+    <method name="GetAll">
+      <arg direction="in" type="s"/>
+      <arg direction="out" type="a{{sv}}"/>
+    </method>
+    <method name="Set">
+      <arg direction="in" type="s"/>
+      <arg direction="in" type="s"/>
+      <arg direction="in" type="v"/>
+    </method>
+    <signal name="{PROPERTIES_CHANGED}">
+      <arg type="s"/>
+      <arg type="a{{sv}}"/>
+      <arg type="as"/>
+    </signal>
+  </interface>
+  <interface name="{INTROSPECTABLE_INTERFACE}">
+    <method name="Introspect">
+      <arg direction="out" type="s"/>
+    </method>
+  </interface>
+  <interface name="{PEER_INTERFACE}">
+    <method name="Ping"/>
+    <method name="GetMachineId">
+      <arg direction="out" type="s"/>
+    </method>
+  </interface>
+"""
+
+
+class MethodSpec(NamedTuple):
+  name: str
+  in_signature: str
+  out_signature: str
+  out_args: int
+
+
+class PropertySpec(NamedTuple):
+  name: str
+  signature: str
+  readable: bool
+  writable: bool
+
+
+class SignalSpec(NamedTuple):
+  name: str
+  signature: str
+
+
+class InterfaceSpec(NamedTuple):
+  """Everything a backend needs to dispatch to an interface, parsed once from its XML."""
+
+  name: str
+  methods: dict[str, MethodSpec]
+  properties: dict[str, PropertySpec]
+  signals: dict[str, SignalSpec]
+  xml: str
+
+
+def get_signature(element: Element, direction: str | None = None) -> str:
+  return ''.join(
+    arg.get('type')
+    for arg in element.iter('arg')
+    if direction is None or arg.get('direction', IN) == direction
+  )
+
+
+def get_method_spec(element: Element) -> MethodSpec:
+  out_args = [arg for arg in element.iter('arg') if arg.get('direction') == OUT]
+
+  return MethodSpec(
+    element.get('name'),
+    get_signature(element, IN),
+    get_signature(element, OUT),
+    len(out_args),
+  )
+
+
+def get_property_spec(element: Element) -> PropertySpec:
+  access = element.get('access')
+
+  return PropertySpec(
+    element.get('name'),
+    element.get('type'),
+    access in {Access.READ, Access.READWRITE},
+    access == Access.READWRITE,
+  )
+
+
+@cache
+def get_interface_spec(cls: type[MprisInterface]) -> InterfaceSpec:
+  node = ElementTree.fromstring(cls.__doc__)
+  interface = node.find('interface')
+
+  return InterfaceSpec(
+    interface.get('name'),
+    {method.get('name'): get_method_spec(method) for method in interface.iter('method')},
+    {prop.get('name'): get_property_spec(prop) for prop in interface.iter('property')},
+    {sig.get('name'): SignalSpec(sig.get('name'), get_signature(sig)) for sig in interface.iter('signal')},
+    ElementTree.tostring(interface, encoding='unicode'),
+  )
+
+
+def get_introspection(specs: list[InterfaceSpec]) -> str:
+  interfaces = ''.join(spec.xml for spec in specs)
+  return f'<node>{STANDARD_INTERFACES}{interfaces}</node>'
@@ -3,14 +3,16 @@ from __future__ import annotations
 from collections.abc import Callable, Collection, Iterable, Mapping, Sequence
 from decimal import Decimal
 from enum import Enum, auto
+from functools import lru_cache
 from os import PathLike
 from string import ascii_letters, digits
+from sys import intern
 from typing import Concatenate, Final, NamedTuple, Self, TYPE_CHECKING, Union
 
 from gi.repository.GLib import Variant
 from strenum import StrEnum
 
-from .enums import Property
+from .enums import Invalidation, Property
 from .types import GenericAliases
 
 
@@ -105,6 +107,21 @@ ON_ROOT_PROPS: Final[Properties] = [
 ]
 INVALIDATED_PROPERTIES: Final[Properties] = ()
 
+# changed properties larger than this are invalidated instead of sent
+DEFAULT_INVALIDATION_THRESHOLD: Final[int] = 16 * 1024
+
+# properties that can grow large, everything else is always sent
+DEFAULT_INVALIDATIONS: Final[dict[Property, Invalidation]] = {
+  Property.Metadata: Invalidation.AUTO,
+  Property.SupportedMimeTypes: Invalidation.AUTO,
+  Property.SupportedUriSchemes: Invalidation.AUTO,
+  Property.Tracks: Invalidation.AUTO,
+}
+
+# rough D-Bus wire sizes, used to estimate the size of a property's value
+STRING_OVERHEAD: Final[int] = 5
+SCALAR_SIZE: Final[int] = 8
+
 
 class Ordering(StrEnum):
   Alphabetical = auto()
@@ -130,6 +147,9 @@ BEGINNING: Final[int] = 0
 VALID_PUNC: Final[str] = '_'
 VALID_CHARS: Final[set[str]] = {*ascii_letters, *digits, *VALID_PUNC}
 
+# number of distinct artists and albums shared by intern_track()
+SHARED_CACHE_SIZE: Final[int] = 4096
+
 NAME_PREFIX: Final[str] = "MprisServer_"
 RAND_CHARS: Final[int] = 5
 
@@ -261,15 +281,115 @@ class Track(NamedTuple):
   uri: str | None = None
 
 
+class InvalidationPolicy:
+  """
+  Decide which changed properties are sent with their values, and which are only invalidated.
+
+  Clients fetch invalidated properties themselves if they need them, which keeps
+  PropertiesChanged small when properties like Tracks grow large.
+  """
+
+  invalidations: dict[Property, Invalidation]
+  threshold: int
+
+  def __init__(
+    self,
+    invalidations: Mapping[Property, Invalidation] = DEFAULT_INVALIDATIONS,
+    threshold: int = DEFAULT_INVALIDATION_THRESHOLD,
+  ):
+    self.invalidations = dict(invalidations)
+    self.threshold = threshold
+
+  def get_invalidation(self, prop: Property | str) -> Invalidation:
+    return self.invalidations.get(prop, Invalidation.SEND)
+
+  def is_invalidated(self, prop: Property | str, value: DbusPyTypes | Variant) -> bool:
+    match self.get_invalidation(prop):
+      case Invalidation.INVALIDATE:
+        return True
+
+      case Invalidation.AUTO:
+        return get_wire_size(value) > self.threshold
+
+    return False
+
+  def split(self, changed_properties: PropertyValues) -> tuple[PropertyValues, list[Property]]:
+    changed: PropertyValues = {}
+    invalidated: list[Property] = []
+
+    for prop, value in changed_properties.items():
+      if self.is_invalidated(prop, value):
+        invalidated.append(prop)
+
+      else:
+        changed[prop] = value
+
+    return changed, invalidated
+
+
+def get_wire_size(value: DbusPyTypes | Variant | None) -> int:
+  match value:
+    case Variant():
+      return value.get_size()
+
+    case str() | bytes():
+      return len(value) + STRING_OVERHEAD
+
+    case Mapping():
+      return sum(get_wire_size(key) + get_wire_size(val) for key, val in value.items())
+
+    case Sequence():
+      return sum(get_wire_size(item) for item in value)
+
+  return SCALAR_SIZE
+
+
+@lru_cache(maxsize=SHARED_CACHE_SIZE)
+def get_artist(name: str) -> Artist:
+  return Artist(intern(name))
+
+
+@lru_cache(maxsize=SHARED_CACHE_SIZE)
+def get_album(art_url: str | None, artists: tuple[Artist, ...], name: str) -> Album:
+  return Album(art_url, artists, intern(name) if name else name)
+
+
+def intern_artists(artists: Sequence[Artist]) -> tuple[Artist, ...]:
+  if not artists:
+    return NO_ARTISTS
+
+  return tuple(get_artist(artist.name) for artist in artists)
+
+
+def intern_track(track: Track) -> Track:
+  """
+  Return a Track that shares its artists, album and repeated strings with other interned tracks.
+
+  Useful for keeping large libraries or tracklists in memory.
+  """
+  album: Album | None = track.album
+
+  if album:
+    album = get_album(album.art_url, intern_artists(album.artists), album.name)
+
+  return track._replace(
+    album=album,
+    artists=intern_artists(track.artists),
+    name=intern(track.name) if track.name else track.name,
+  )
+
+
 def emit_properties_changed[I: MprisInterface](
   interface: I,
   changed_properties: PropertyValues,
   invalidated_properties: Properties = INVALIDATED_PROPERTIES,
 ):
+  changed_properties, invalidated = interface.invalidation_policy.split(changed_properties)
+
   interface.PropertiesChanged(
     interface.INTERFACE,
     changed_properties,
-    invalidated_properties,
+    [*invalidated_properties, *invalidated],
   )
 
 
@@ -284,5 +404,10 @@ def dbus_emit_changes[I: MprisInterface](interface: I, changes: Changes):
   if not all(change in Property for change in changes):
     raise ValueError(f"Invalid property in {changes=}")
 
+  # don't read properties that will only be invalidated
+  policy = interface.invalidation_policy
+  invalidated = [change for change in changes if policy.get_invalidation(change) == Invalidation.INVALIDATE]
+  changes = [change for change in changes if change not in invalidated]
+
   changed_properties = get_changed_properties(interface, changes)
-  emit_properties_changed(interface, changed_properties)
+  emit_properties_changed(interface, changed_properties, invalidated)
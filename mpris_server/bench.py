@@ -0,0 +1,284 @@
+"""
+Micro-benchmarks for hot paths in mpris_server.
+
+Run with `python -m mpris_server.bench [benchmark ...]`.
+"""
+from __future__ import annotations
+
+import gc
+import sys
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from collections.abc import Callable
+from threading import Thread
+from timeit import Timer
+from typing import Final, NamedTuple
+from weakref import ref
+
+from gi.repository import Gio, GLib
+
+from .adapters import MprisAdapter
+from .backends.backend import Backend, get_signals
+from .backends.gio import GioBackend
+from .backends.pydbus import PydbusBackend
+from .backends.spec import PROPERTIES_INTERFACE
+from .base import Album, Artist, DBUS_PATH, Interface, Track, intern_track
+from .enums import Method, ValidationMode
+from .mpris.metadata import Metadata, MetadataEntries, create_metadata_from_track, get_dbus_metadata, \
+  is_valid_metadata
+from .server import Server
+
+
+type Benchmark = Callable[[Namespace], None]
+
+DEFAULT_NUMBER: Final[int] = 10_000
+NANOSECONDS: Final[int] = 1_000_000_000
+KIB: Final[int] = 1024
+
+SERVERS: Final[int] = 100
+TRACKS: Final[int] = 10_000
+DISTINCT_ARTISTS: Final[int] = 200
+DISTINCT_ALBUMS: Final[int] = 800
+
+DEFAULT_CYCLES: Final[int] = 10_000
+ROUND_TRIPS: Final[int] = 1_000
+SAMPLES: Final[int] = 10
+
+SAMPLE_METADATA: Final[Metadata] = {
+  MetadataEntries.ALBUM: "Album",
+  MetadataEntries.ALBUM_ARTISTS: ["Album Artist"],
+  MetadataEntries.ARTISTS: ["Artist A", "Artist B"],
+  MetadataEntries.ART_URL: "file:///tmp/cover.png",
+  MetadataEntries.COMMENT: ["Comment"],
+  MetadataEntries.DISC_NUMBER: 1,
+  MetadataEntries.GENRE: ["Genre"],
+  MetadataEntries.LENGTH: 180_000_000,
+  MetadataEntries.TITLE: "Title",
+  MetadataEntries.TRACK_ID: "/track/1",
+  MetadataEntries.TRACK_NUMBER: 3,
+  MetadataEntries.URL: "file:///tmp/track.flac",
+  MetadataEntries.USER_RATING: 0.5,
+}
+
+
+def time_per_call(func: Callable[[], object], number: int) -> float:
+  timer = Timer(func)
+  best = min(timer.repeat(repeat=3, number=number))
+
+  return best / number
+
+
+def report(name: str, seconds: float, unit: str = 'call'):
+  print(f'{name:<40} {seconds * NANOSECONDS:>12.1f} ns/{unit}')
+
+
+def bench_validation(args: Namespace):
+  entries = len(SAMPLE_METADATA)
+
+  for mode in ValidationMode:
+    def validate():
+      for entry, value in SAMPLE_METADATA.items():
+        is_valid_metadata(entry, value, mode)
+
+    def build():
+      get_dbus_metadata(SAMPLE_METADATA, mode)
+
+    report(f'validate ({mode})', time_per_call(validate, args.number) / entries, 'entry')
+    report(f'get_dbus_metadata ({mode})', time_per_call(build, args.number) / entries, 'entry')
+
+
+def measure_memory[T](func: Callable[[], T]) -> tuple[T, int]:
+  """Return func's result, and the bytes still allocated by it."""
+  gc.collect()
+  tracemalloc.start()
+
+  try:
+    before, _ = tracemalloc.get_traced_memory()
+    result = func()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+
+  finally:
+    tracemalloc.stop()
+
+  return result, after - before
+
+
+def report_memory(name: str, size: int, count: int, unit: str):
+  print(f'{name:<40} {size / KIB:>12.1f} KiB total {size / count:>10.1f} B/{unit}')
+
+
+def create_tracks(count: int = TRACKS) -> list[Track]:
+  # build fresh strings, the way tracks loaded from a backend would be
+  return [
+    Track(
+      album=Album(name=f'Album {index % DISTINCT_ALBUMS}', artists=[Artist(f'Artist {index % DISTINCT_ARTISTS}')]),
+      artists=[Artist(f'Artist {index % DISTINCT_ARTISTS}')],
+      length=180_000_000,
+      name=f'Track {index}',
+      track_id=f'/track/{index}',
+    )
+    for index in range(count)
+  ]
+
+
+def bench_memory(args: Namespace):
+  adapter = MprisAdapter()
+
+  servers, size = measure_memory(lambda: [Server(f'Bench{index}', adapter) for index in range(SERVERS)])
+  report_memory('Server (unpublished)', size, SERVERS, 'server')
+  del servers
+
+  tracks, size = measure_memory(create_tracks)
+  report_memory(f'{TRACKS} tracks', size, TRACKS, 'track')
+  del tracks
+
+  tracks, size = measure_memory(lambda: [intern_track(track) for track in create_tracks()])
+  report_memory(f'{TRACKS} tracks (interned)', size, TRACKS, 'track')
+
+  metadata, size = measure_memory(lambda: [create_metadata_from_track(track) for track in tracks])
+  report_memory(f'{TRACKS} metadata', size, TRACKS, 'track')
+
+
+def count_signal_entries(server: Server) -> int:
+  return sum(
+    sig.map.get(interface) is not None
+    for interface in server.interfaces
+    for sig in get_signals(interface)
+  )
+
+
+class Lifecycle(NamedTuple):
+  cycles: int
+  retained: list[int]
+  alive: int
+  signal_entries: int
+
+
+def run_lifecycle(cycles: int, samples: int = SAMPLES) -> Lifecycle:
+  """Publish, loop and close servers on a private bus, sampling the memory they retain."""
+  # imported here, the other benchmarks don't need a bus
+  from .loadgen import private_bus
+
+  adapter = MprisAdapter()
+  servers: list[ref[Server]] = []
+  retained: list[int] = []
+  signal_entries = 0
+  every = max(cycles // samples, 1)
+
+  with private_bus():
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+      baseline, _ = tracemalloc.get_traced_memory()
+
+      for cycle in range(1, cycles + 1):
+        with Server(f'Lifecycle{cycle}', adapter) as server:
+          server.loop(background=True)
+          servers.append(ref(server))
+
+        signal_entries += count_signal_entries(server)
+        del server
+
+        if cycle % every == 0 or cycle == cycles:
+          gc.collect()
+          size, _ = tracemalloc.get_traced_memory()
+          retained.append(size - baseline)
+
+    finally:
+      tracemalloc.stop()
+
+  alive = sum(server() is not None for server in servers)
+  return Lifecycle(cycles, retained, alive, signal_entries)
+
+
+def bench_lifecycle(args: Namespace):
+  lifecycle = run_lifecycle(args.cycles)
+  every = max(args.cycles // SAMPLES, 1)
+
+  for sample, size in enumerate(lifecycle.retained, start=1):
+    print(f'{min(sample * every, args.cycles):>10} cycles {size / KIB:>12.1f} KiB retained')
+
+  report_memory('publish/loop/close cycle', lifecycle.retained[-1], args.cycles, 'cycle')
+  print(f'servers alive after close: {lifecycle.alive}, leftover signal entries: {lifecycle.signal_entries}')
+
+
+def time_dispatch(client: Gio.DBusConnection, backend: Backend, adapter: MprisAdapter, number: int):
+  server = Server(f'Dispatch{type(backend).__name__}', adapter)
+  server.publish(backend=backend)
+
+  def call(interface: str, method: str, args: GLib.Variant | None = None):
+    client.call_sync(server.bus_name, DBUS_PATH, interface, method, args, None, Gio.DBusCallFlags.NONE, -1, None)
+
+  get_all = GLib.Variant('(s)', (Interface.Player,))
+
+  try:
+    name = type(backend).__name__
+    report(f'{name} GetAll(Player)', time_per_call(lambda: call(PROPERTIES_INTERFACE, 'GetAll', get_all), number))
+    report(f'{name} Player.Play()', time_per_call(lambda: call(Interface.Player, Method.Play), number))
+
+  finally:
+    server.close()
+
+
+def bench_dispatch(args: Namespace):
+  # imported here, the other benchmarks don't need a bus
+  from .loadgen import CONNECTION_FLAGS, SyntheticAdapter, private_bus
+
+  adapter = SyntheticAdapter()
+  number = min(args.number, ROUND_TRIPS)
+
+  with private_bus() as address:
+    loop = GLib.MainLoop()
+    thread = Thread(target=loop.run, daemon=True)
+    thread.start()
+
+    client = Gio.DBusConnection.new_for_address_sync(address, CONNECTION_FLAGS, None, None)
+
+    try:
+      time_dispatch(client, PydbusBackend.connect(address), adapter, number)
+      time_dispatch(client, GioBackend.connect(address), adapter, number)
+
+    finally:
+      client.close_sync(None)
+      loop.quit()
+      thread.join()
+
+
+BENCHMARKS: Final[dict[str, Benchmark]] = {
+  'dispatch': bench_dispatch,
+  'lifecycle': bench_lifecycle,
+  'memory': bench_memory,
+  'validation': bench_validation,
+}
+
+
+def get_args() -> Namespace:
+  parser = ArgumentParser(prog='python -m mpris_server.bench', description=__doc__)
+  parser.add_argument('benchmarks', nargs='*', help=f'any of: {", ".join(BENCHMARKS)}')
+  parser.add_argument('-n', '--number', type=int, default=DEFAULT_NUMBER)
+  parser.add_argument('-c', '--cycles', type=int, default=DEFAULT_CYCLES, help='publish cycles for lifecycle')
+
+  args = parser.parse_args()
+
+  if unknown := set(args.benchmarks) - BENCHMARKS.keys():
+    parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+
+  args.benchmarks = args.benchmarks or list(BENCHMARKS)
+
+  return args
+
+
+def main() -> int:
+  args = get_args()
+
+  for name in args.benchmarks:
+    print(f'# {name}')
+    BENCHMARKS[name](args)
+
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
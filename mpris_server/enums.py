@@ -10,10 +10,12 @@ __all__ = [
   'Arg',
   'BusType',
   'Direction',
+  'Invalidation',
   'LoopStatus',
   'Method',
   'Property',
   'Signal',
+  'ValidationMode',
 ]
 
 
@@ -53,6 +55,12 @@ class Direction(LowercaseStrEnum):
   OUT = auto()
 
 
+class Invalidation(LowercaseStrEnum):
+  AUTO = auto()
+  INVALIDATE = auto()
+  SEND = auto()
+
+
 class LoopStatus(StrEnum):
   NONE = 'None'
   TRACK = 'Track'
@@ -119,3 +127,9 @@ class Signal(StrEnum):
   TrackListReplaced = auto()
   TrackMetadataChanged = auto()
   TrackRemoved = auto()
+
+
+class ValidationMode(LowercaseStrEnum):
+  STRICT = auto()
+  LENIENT = auto()
+  OFF = auto()
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import override
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from threading import Lock
+from typing import Final, override
 
 from .base import Changes, DbusObj, ON_ENDED_PROPS, ON_OPTION_PROPS, ON_PLAYBACK_PROPS, ON_PLAYER_PROPS, \
   ON_PLAYLIST_PROPS, ON_PLAYPAUSE_PROPS, ON_ROOT_PROPS, ON_SEEK_PROPS, ON_TITLE_PROPS, ON_TRACKS_PROPS, ON_VOLUME_PROPS, \
-  Position, dbus_emit_changes
+  Position, dbus_emit_changes, emit_properties_changed
+from .enums import Property
 from .interfaces.interface import MprisInterface
 from .interfaces.player import Player
 from .interfaces.playlists import Playlists
 from .interfaces.root import Root
 from .interfaces.tracklist import TrackList
-from .mpris.metadata import Metadata
+from .mpris.metadata import Fingerprint, Metadata, ValidMetadata, get_dbus_track_metadata, get_fingerprint, \
+  get_metadata_track_id
+from .stats import stats
 
 
 __all__ = [
@@ -21,11 +27,62 @@ __all__ = [
   'PlayerEventAdapter',
   'PlaylistsEventAdapter',
   'RootEventAdapter',
+  'TrackAddition',
+  'TracklistChanges',
   'TracklistEventAdapter',
 ]
 
+# rough wire cost, in bytes, used to choose between per-track signals and TrackListReplaced
+SIGNAL_COST: Final[int] = 128
+METADATA_COST: Final[int] = 256
+TRACK_ID_COST: Final[int] = 48
+
+METADATA_SUPPRESSED: Final[str] = 'tracklist.metadata.suppressed'
+
+
+type TrackAddition = tuple[ValidMetadata, DbusObj]
+
+
+class TracklistChanges:
+  """Tracklist mutations collected by TracklistEventAdapter.tracklist_changes()."""
+
+  __slots__ = ('changes',)
+
+  # in order, either a TrackAddition or a removed track's ID
+  changes: list[TrackAddition | DbusObj]
+
+  def __init__(self):
+    self.changes = []
+
+  def __len__(self) -> int:
+    return len(self.changes)
+
+  def add(self, metadata: ValidMetadata, after_track: DbusObj):
+    self.changes.append((metadata, after_track))
+
+  def remove(self, track_id: DbusObj):
+    self.changes.append(track_id)
+
+  def get_signals_cost(self) -> int:
+    return sum(
+      SIGNAL_COST + (METADATA_COST if isinstance(change, tuple) else TRACK_ID_COST)
+      for change in self.changes
+    )
+
+  def should_replace(self, tracks: list[DbusObj]) -> bool:
+    replaced = SIGNAL_COST + len(tracks) * TRACK_ID_COST
+    return replaced < self.get_signals_cost()
+
 
 class BaseEventAdapter(ABC):
+  __slots__ = (
+    '__weakref__',
+    'player',
+    'playlist',
+    'root',
+    'tracklist',
+  )
+
   root: Root
   player: Player | None
   playlist: Playlists | None
@@ -54,6 +111,8 @@ class BaseEventAdapter(ABC):
 
 
 class RootEventAdapter(BaseEventAdapter, ABC):
+  __slots__ = ()
+
   @override
   def emit_all(self):
     self.on_root_all()
@@ -67,6 +126,8 @@ class RootEventAdapter(BaseEventAdapter, ABC):
 
 
 class PlayerEventAdapter(BaseEventAdapter, ABC):
+  __slots__ = ()
+
   @override
   def emit_all(self):
     self.on_player_all()
@@ -102,6 +163,8 @@ class PlayerEventAdapter(BaseEventAdapter, ABC):
 
 
 class PlaylistsEventAdapter(BaseEventAdapter, ABC):
+  __slots__ = ()
+
   @override
   def emit_all(self):
     self.on_playlists_all()
@@ -119,6 +182,26 @@ class PlaylistsEventAdapter(BaseEventAdapter, ABC):
 
 
 class TracklistEventAdapter(BaseEventAdapter, ABC):
+  __slots__ = (
+    '_fingerprints',
+    '_fingerprints_lock',
+  )
+
+  # fingerprints of the metadata last sent for each track ID
+  _fingerprints: dict[DbusObj, Fingerprint]
+  _fingerprints_lock: Lock
+
+  def __init__(
+    self,
+    root: Root,
+    player: Player | None = None,
+    playlists: Playlists | None = None,
+    tracklist: TrackList | None = None,
+  ):
+    super().__init__(root, player, playlists, tracklist)
+    self._fingerprints = {}
+    self._fingerprints_lock = Lock()
+
   @override
   def emit_all(self):
     self.on_tracklist_all()
@@ -131,20 +214,112 @@ class TracklistEventAdapter(BaseEventAdapter, ABC):
     self.emit_tracklist_changes(ON_TRACKS_PROPS)
 
   def on_list_replaced(self, tracks: list[DbusObj], current_track: DbusObj):
+    self._forget_tracks(tracks)
     self.tracklist.TrackListReplaced(tracks, current_track)
     self.emit_tracklist_changes(ON_TRACKS_PROPS)
 
-  def on_track_added(self, metadata: Metadata, after_track: DbusObj):
+  def on_track_added(self, metadata: ValidMetadata, after_track: DbusObj):
+    metadata = get_dbus_track_metadata(metadata)
+    self._remember(metadata)
     self.tracklist.TrackAdded(metadata, after_track)
     self.emit_tracklist_changes(ON_TRACKS_PROPS)
 
   def on_track_removed(self, track_id: DbusObj):
+    self._forget(track_id)
     self.tracklist.TrackRemoved(track_id)
     self.emit_tracklist_changes(ON_TRACKS_PROPS)
 
-  def on_track_metadata_change(self, track_id: DbusObj, metadata: Metadata):
+  def on_tracks_added(self, tracks: Iterable[TrackAddition], current_track: DbusObj):
+    with self.tracklist_changes(current_track) as changes:
+      for metadata, after_track in tracks:
+        changes.add(metadata, after_track)
+
+  def on_tracks_removed(self, track_ids: Iterable[DbusObj], current_track: DbusObj):
+    with self.tracklist_changes(current_track) as changes:
+      for track_id in track_ids:
+        changes.remove(track_id)
+
+  @contextmanager
+  def tracklist_changes(self, current_track: DbusObj) -> Iterator[TracklistChanges]:
+    """
+    Collect track additions and removals, and emit them once on exit.
+
+    Depending on which is cheaper, either a signal per change or a single
+    TrackListReplaced is emitted, followed by the Tracks property once.
+    current_track is the track that's playing, which TrackListReplaced carries.
+    """
+    changes = TracklistChanges()
+    yield changes
+
+    if not changes:
+      return
+
+    tracks = self.tracklist.Tracks
+
+    if changes.should_replace(tracks):
+      self._forget_tracks(tracks)
+      self.tracklist.TrackListReplaced(tracks, current_track)
+
+    else:
+      for change in changes.changes:
+        match change:
+          case metadata, after_track:
+            metadata = get_dbus_track_metadata(metadata)
+            self._remember(metadata)
+            self.tracklist.TrackAdded(metadata, after_track)
+
+          case track_id:
+            self._forget(track_id)
+            self.tracklist.TrackRemoved(track_id)
+
+    emit_properties_changed(self.tracklist, {
+      Property.CanEditTracks: self.tracklist.CanEditTracks,
+      Property.Tracks: tracks,
+    })
+
+  def on_track_metadata_change(self, track_id: DbusObj, metadata: ValidMetadata):
+    """Emit TrackMetadataChanged, unless the metadata is what was last sent for the track."""
+    metadata = get_dbus_track_metadata(metadata)
+    fingerprint = get_fingerprint(metadata)
+    new_id = get_metadata_track_id(metadata) or track_id
+
+    # checked and set together, events can come from several threads
+    with self._fingerprints_lock:
+      if self._fingerprints.get(track_id) == fingerprint:
+        stats.incr(METADATA_SUPPRESSED)
+        return
+
+      if new_id != track_id:
+        self._fingerprints.pop(track_id, None)
+
+      self._fingerprints[new_id] = fingerprint
+
     self.tracklist.TrackMetadataChanged(track_id, metadata)
-    self.emit_tracklist_changes(ON_TRACKS_PROPS)
+
+    # Tracks only lists IDs, it changes only if the track got a new one
+    if new_id != track_id:
+      self.emit_tracklist_changes(ON_TRACKS_PROPS)
+
+  def _remember(self, metadata: Metadata):
+    if track_id := get_metadata_track_id(metadata):
+      fingerprint = get_fingerprint(metadata)
+
+      with self._fingerprints_lock:
+        self._fingerprints[track_id] = fingerprint
+
+  def _forget(self, track_id: DbusObj):
+    with self._fingerprints_lock:
+      self._fingerprints.pop(track_id, None)
+
+  def _forget_tracks(self, tracks: list[DbusObj]):
+    current = set(tracks)
+
+    with self._fingerprints_lock:
+      self._fingerprints = {
+        track_id: fingerprint
+        for track_id, fingerprint in self._fingerprints.items()
+        if track_id in current
+      }
 
 
 class EventAdapter(
@@ -160,4 +335,5 @@ class EventAdapter(
   Implement this class and integrate it in your application to emit
   D-Bus signals when there are state changes in the media player.
   '''
-  pass
+
+  __slots__ = ()
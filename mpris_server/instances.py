@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+from threading import Lock
+from typing import Final
+
+
+__all__ = [
+  'InstanceRegistry',
+  'get_instance_name',
+  'instances',
+]
+
+INSTANCE_PREFIX: Final[str] = 'instance'
+FIRST_INSTANCE: Final[int] = 0
+
+
+def get_instance_name(index: int, pid: int | None = None) -> str:
+  """
+  The bus name element for a player instance, like `instance1234`, per the MPRIS spec.
+
+  Players after the first in a process get a suffix, like `instance1234_2`.
+  """
+  if pid is None:
+    pid = os.getpid()
+
+  if index == FIRST_INSTANCE:
+    return f'{INSTANCE_PREFIX}{pid}'
+
+  return f'{INSTANCE_PREFIX}{pid}_{index}'
+
+
+class InstanceRegistry:
+  """Hands out instance numbers for each name in this process, reusing released ones first."""
+
+  _next: dict[str, int]
+  _free: dict[str, list[int]]
+  _lock: Lock
+
+  def __init__(self):
+    self._next = {}
+    self._free = {}
+    self._lock = Lock()
+
+  def allocate(self, name: str) -> int:
+    with self._lock:
+      if free := self._free.get(name):
+        return free.pop()
+
+      index = self._next.get(name, FIRST_INSTANCE)
+      self._next[name] = index + 1
+
+      return index
+
+  def release(self, name: str, index: int):
+    with self._lock:
+      self._free.setdefault(name, []).append(index)
+
+
+instances: Final[InstanceRegistry] = InstanceRegistry()
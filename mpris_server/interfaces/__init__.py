@@ -1,4 +1,4 @@
-from .interface import MprisInterface
+from .interface import CallFinished, CallHook, MprisInterface, current_call, get_caller
 from .player import Player
 from .playlists import Playlists
 from .root import Root, get_desktop_entry
@@ -8,6 +8,10 @@ from . import interface, player, playlists, root, tracklist
 
 
 __all__ = [
+  'CallFinished',
+  'CallHook',
+  'current_call',
+  'get_caller',
   'get_desktop_entry',
   'interface',
   'MprisInterface',
@@ -2,33 +2,104 @@ from __future__ import annotations
 
 import logging
 from abc import ABC
+from collections.abc import Callable
+from contextvars import ContextVar
 from functools import wraps
-from typing import ClassVar, Final, Self, TYPE_CHECKING
+from inspect import Parameter, Signature, signature
+from threading import Lock
+from typing import Any, ClassVar, Final, Self, TYPE_CHECKING
 
 from pydbus.generic import signal
 
-from ..base import Interface, Method, NAME
+from ..base import Interface, InvalidationPolicy, Method, NAME
+from ..mpris.metadata import is_metadata_variant, unpack_metadata_variant
 
 
 if TYPE_CHECKING:
+  from gi.repository.GLib import Variant
+  from pydbus.method_call_context import MethodCallContext
+
   from ..adapters import MprisAdapter
 
 
 log = logging.getLogger(__name__)
 
+# pydbus passes the incoming call's context to methods that accept this keyword
+DBUS_CONTEXT: Final[str] = 'dbus_context'
+
+
+type CallFinished = Callable[[], None]
+type CallHook = Callable[[MprisInterface, str, tuple[Any, ...]], CallFinished | None]
+
+NO_HOOKS: Final[tuple[CallHook, ...]] = ()
+
+# hooks are added and removed from any thread
+_hooks_lock: Final[Lock] = Lock()
+
+# the D-Bus method call being handled, if any
+current_call: Final[ContextVar[MethodCallContext | None]] = ContextVar('current_call', default=None)
+
+
+def get_caller() -> str | None:
+  if context := current_call.get():
+    return context.sender
+
+  return None
+
+
+def get_constant(variant: Variant) -> Any:
+  # unpack() would unbox metadata values too, and they couldn't be sent as a{sv} again
+  if is_metadata_variant(variant):
+    return unpack_metadata_variant(variant)
+
+  return variant.unpack()
+
+
+def with_dbus_context(method: Method) -> Signature:
+  method_signature = signature(method)
+  params = [*method_signature.parameters.values()]
+  params.append(Parameter(DBUS_CONTEXT, Parameter.KEYWORD_ONLY, default=None))
+
+  return method_signature.replace(parameters=params)
+
 
 def log_trace[S: Self, **P, T](method: Method) -> Method:
   @wraps(method)
-  def new_method(self: S, *args: P.args, **kwargs: P.kwargs) -> T:
+  def new_method(self: S, *args: P.args, dbus_context: MethodCallContext | None = None, **kwargs: P.kwargs) -> T:
     name = method.__name__
-    func = f'{self.INTERFACE}.{name}()'
 
-    log.debug(f'{func} called.')
+    # constant properties are read without arguments, setters and methods have them
+    if not args and name in self.constants:
+      return get_constant(self.constants[name])
+
+    token = current_call.set(dbus_context) if dbus_context else None
+
+    finishers: list[CallFinished] = [
+      finished
+      for hook in self.call_hooks
+      if (finished := hook(self, name, args))
+    ]
 
-    if (result := method(self, *args, **kwargs)) is not None:
-      log.debug(f'{func} result: {result}')
+    try:
+      if not log.isEnabledFor(logging.DEBUG):
+        return method(self, *args, **kwargs)
 
-    return result
+      func = f'{self.INTERFACE}.{name}()'
+      log.debug(f'{func} called.')
+
+      if (result := method(self, *args, **kwargs)) is not None:
+        log.debug(f'{func} result: {result}')
+
+      return result
+
+    finally:
+      for finished in reversed(finishers):
+        finished()
+
+      if token:
+        current_call.reset(token)
+
+  new_method.__signature__ = with_dbus_context(method)
 
   return new_method
 
@@ -36,11 +107,36 @@ def log_trace[S: Self, **P, T](method: Method) -> Method:
 class MprisInterface[A: MprisAdapter](ABC):
   INTERFACE: ClassVar[Interface] = Interface.Root
 
+  __slots__ = (
+    '__weakref__',
+    'adapter',
+    'call_hooks',
+    'constants',
+    'invalidation_policy',
+    'name',
+  )
+
   name: str
   adapter: A | None
+  call_hooks: tuple[CallHook, ...]
+  constants: dict[str, Variant]
+  invalidation_policy: InvalidationPolicy
 
   PropertiesChanged: Final[signal] = signal()
 
   def __init__(self, name: str = NAME, adapter: A | None = None):
     self.name = name
     self.adapter = adapter
+    self.call_hooks = NO_HOOKS
+    self.constants = {}
+    # each interface gets its own, so tuning one doesn't change the others
+    self.invalidation_policy = InvalidationPolicy()
+
+  def add_call_hook(self, hook: CallHook):
+    # replaced rather than mutated, so calls in flight iterate a stable tuple
+    with _hooks_lock:
+      self.call_hooks = (*self.call_hooks, hook)
+
+  def remove_call_hook(self, hook: CallHook):
+    with _hooks_lock:
+      self.call_hooks = tuple(existing for existing in self.call_hooks if existing != hook)
@@ -2,15 +2,21 @@ from __future__ import annotations
 
 import logging
 from fractions import Fraction
-from typing import ClassVar, Final
+from typing import ClassVar, Final, TYPE_CHECKING
 
 from pydbus.generic import signal
 
 from .interface import MprisInterface, log_trace
-from ..base import BEGINNING, DbusObj, DbusTypes, Interface, MAX_RATE, MAX_VOLUME, MIN_RATE, MUTE_VOLUME, \
+from ..base import BEGINNING, DbusObj, DbusTypes, Interface, MAX_RATE, MAX_VOLUME, MIN_RATE, MUTE_VOLUME, NAME, \
   PAUSE_RATE, PlayState, Position, Rate, Track, Volume
 from ..enums import Access, Arg, Direction, LoopStatus, Method, Property, Signal
-from ..mpris.metadata import Metadata, MetadataEntries, create_metadata_from_track, get_dbus_metadata, update_metadata
+from ..mpris.metadata import Metadata, MetadataBudget, MetadataEntries, apply_metadata_budget, \
+  create_metadata_from_track, get_dbus_metadata, update_metadata
+
+
+if TYPE_CHECKING:
+  from ..adapters import MprisAdapter
+  from ..prefetch import Prefetcher
 
 
 log = logging.getLogger(__name__)
@@ -65,8 +71,21 @@ class Player(MprisInterface):
   </node>
   """
 
+  __slots__ = (
+    'metadata_budget',
+    'prefetcher',
+  )
+
   Seeked: Final[signal] = signal()
 
+  metadata_budget: MetadataBudget | None
+  prefetcher: Prefetcher | None
+
+  def __init__(self, name: str = NAME, adapter: MprisAdapter | None = None):
+    super().__init__(name, adapter)
+    self.metadata_budget = None
+    self.prefetcher = None
+
   def _get_metadata(self) -> Metadata | None:
     if metadata := self.adapter.metadata():
       return get_dbus_metadata(metadata)
@@ -84,9 +103,39 @@ class Player(MprisInterface):
 
     return metadata
 
+  def _get_prefetched_metadata(self, prefetched: Metadata) -> Metadata:
+    metadata: Metadata = prefetched.copy()
+
+    # the stream title belongs to what's playing, so it's never prefetched
+    if name := self.adapter.get_stream_title():
+      update_metadata(metadata, MetadataEntries.TITLE, name)
+
+    return metadata
+
   def _get_art_url(self, track: DbusObj | Track | None) -> str:
     return self.adapter.get_art_url(track)
 
+  def _build_metadata(self) -> Metadata:
+    # prefer adapter's metadata to building our own
+    if metadata := self._get_metadata():
+      return metadata
+
+    # build metadata if no metadata supplied by adapter
+    log.debug(f"Building {self.INTERFACE}.{Property.Metadata}")
+
+    track = self.adapter.get_current_track()
+
+    if track and self.prefetcher and (prefetched := self.prefetcher.get(track)) is not None:
+      return self._get_prefetched_metadata(prefetched)
+
+    metadata: Metadata = self._get_basic_metadata(track)
+
+    if not track:
+      log.warning(ERR_NOT_ENOUGH_METADATA)
+      return metadata
+
+    return create_metadata_from_track(track, metadata)
+
   @property
   @log_trace
   def CanControl(self) -> bool:
@@ -176,21 +225,12 @@ class Player(MprisInterface):
   @property
   @log_trace
   def Metadata(self) -> Metadata:
-    # prefer adapter's metadata to building our own
-    if metadata := self._get_metadata():
-      return metadata
+    metadata = self._build_metadata()
 
-    # build metadata if no metadata supplied by adapter
-    log.debug(f"Building {self.INTERFACE}.{Property.Metadata}")
-
-    track = self.adapter.get_current_track()
-    metadata: Metadata = self._get_basic_metadata(track)
-
-    if not track:
-      log.warning(ERR_NOT_ENOUGH_METADATA)
-      return metadata
+    if self.metadata_budget:
+      return apply_metadata_budget(metadata, self.metadata_budget)
 
-    return create_metadata_from_track(track, metadata)
+    return metadata
 
   @property
   @log_trace
@@ -16,6 +16,8 @@ log = logging.getLogger(__name__)
 class Playlists(MprisInterface):
   INTERFACE: ClassVar[Interface] = Interface.Playlists
 
+  __slots__ = ()
+
   __doc__: Final[str] = f"""
   <node>
     <interface name="{INTERFACE}">
@@ -16,6 +16,8 @@ NO_DESKTOP_ENTRY: Final[str] = ''
 class Root(MprisInterface):
   INTERFACE: ClassVar[Interface] = Interface.Root
 
+  __slots__ = ()
+
   __doc__: Final[str] = f"""
   <node>
     <interface name="{INTERFACE}">
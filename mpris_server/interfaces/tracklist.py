@@ -4,15 +4,17 @@ from typing import ClassVar, Final
 
 from pydbus.generic import signal
 
-from .interface import MprisInterface
+from .interface import MprisInterface, log_trace
 from ..base import DbusObj, DbusTypes, Interface, NoTrack
 from ..enums import Access, Arg, Direction, Method, Property, Signal
-from ..mpris.metadata import Metadata
+from ..mpris.metadata import Metadata, get_dbus_tracks_metadata
 
 
 class TrackList(MprisInterface):
   INTERFACE: ClassVar[Interface] = Interface.TrackList
 
+  __slots__ = ()
+
   __doc__: Final[str] = f"""
   <node>
     <interface name="{INTERFACE}">
@@ -60,16 +62,19 @@ class TrackList(MprisInterface):
   TrackRemoved: Final[signal] = signal()
 
   @property
+  @log_trace
   def CanEditTracks(self) -> bool:
     return self.adapter.can_edit_tracks()
 
   @property
+  @log_trace
   def Tracks(self) -> list[DbusObj]:
     if not (tracks := self.adapter.get_tracks()):
       return [NoTrack]
 
     return tracks
 
+  @log_trace
   def AddTrack(
     self,
     uri: str,
@@ -78,12 +83,16 @@ class TrackList(MprisInterface):
   ):
     self.adapter.add_track(uri, after_track, set_as_current)
 
+  @log_trace
   def GetTracksMetadata(self, track_ids: list[DbusObj]) -> list[Metadata]:
-    return self.adapter.get_tracks_metadata(track_ids)
+    tracks = self.adapter.get_tracks_metadata(track_ids)
+    return get_dbus_tracks_metadata(tracks)
 
+  @log_trace
   def GoTo(self, track_id: DbusObj):
     self.adapter.go_to(track_id)
 
+  @log_trace
   def RemoveTrack(self, track_id: DbusObj):
     self.adapter.remove_track(track_id)
 
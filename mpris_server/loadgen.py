@@ -0,0 +1,489 @@
+"""
+Load generator for soak and scale testing a published Server.
+
+Starts a private D-Bus daemon, publishes a synthetic adapter on it and
+attaches simulated controllers, then reports call latency percentiles,
+main loop lag and CPU usage for each scenario.
+
+Controllers run in their own process, like real clients do, so they don't
+compete with the server for the GIL, and the CPU usage is the server's alone.
+
+Run with `python -m mpris_server.loadgen [scenario ...]`.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+from argparse import ArgumentParser, Namespace
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from multiprocessing.connection import Connection
+from threading import Event, Lock, Thread
+from time import monotonic, sleep
+from typing import Final, NamedTuple
+
+from gi.repository import Gio, GLib
+
+from .adapters import MprisAdapter
+from .base import DBUS_PATH, Interface, PlayState, Position, Rate, Track, Volume
+from .server import Server
+from .stats import get_percentiles
+
+
+log = logging.getLogger(__name__)
+
+DBUS_DAEMON: Final[str] = 'dbus-daemon'
+DBUS_ENV: Final[str] = 'DBUS_SESSION_BUS_ADDRESS'
+PROPERTIES_INTERFACE: Final[str] = 'org.freedesktop.DBus.Properties'
+CONNECTION_FLAGS: Final[Gio.DBusConnectionFlags] = \
+  Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION
+
+NAME: Final[str] = 'LoadGen'
+CALL_TIMEOUT: Final[int] = 5_000
+LAG_PROBE_INTERVAL: Final[int] = 50
+MILLISECONDS: Final[int] = 1_000
+MICROSECONDS: Final[int] = 1_000_000
+TRACK_LENGTH: Final[Position] = 180 * MICROSECONDS
+MIN_WAIT: Final[float] = 0.001
+COMMANDS: Final[tuple[str, ...]] = ('PlayPause', 'Next', 'Previous', 'Play', 'Pause')
+
+START_METHOD: Final[str] = 'spawn'
+READY: Final[str] = 'ready'
+
+
+class Scenario(NamedTuple):
+  controllers: int = 6
+  duration: float = 10.0
+  latency: float = 0.0
+  poll_rate: float = 1.0
+  burst_size: int = 0
+  burst_interval: float = 1.0
+
+
+# GNOME Shell, KDE Connect, playerctl and a few browser extensions
+SCENARIOS: Final[dict[str, Scenario]] = {
+  'idle': Scenario(controllers=4, poll_rate=0.0),
+  'desktop': Scenario(controllers=6, poll_rate=1.0, burst_size=2, burst_interval=2.0),
+  'slow-adapter': Scenario(controllers=6, poll_rate=1.0, latency=0.02, burst_size=2),
+  'stress': Scenario(controllers=32, poll_rate=10.0, burst_size=10, burst_interval=0.5),
+}
+
+
+class SyntheticAdapter(MprisAdapter):
+  """Adapter that answers with plausible values after a fixed delay."""
+
+  latency: float
+  state: PlayState
+
+  _started: float
+
+  def __init__(self, latency: float = 0.0):
+    super().__init__(NAME)
+    self.latency = latency
+    self.state = PlayState.PLAYING
+    self._started = monotonic()
+
+  def _wait(self):
+    if self.latency:
+      sleep(self.latency)
+
+  def can_control(self) -> bool:
+    return True
+
+  def can_go_next(self) -> bool:
+    return True
+
+  def can_go_previous(self) -> bool:
+    return True
+
+  def can_pause(self) -> bool:
+    return True
+
+  def can_play(self) -> bool:
+    return True
+
+  def can_quit(self) -> bool:
+    return False
+
+  def can_raise(self) -> bool:
+    return False
+
+  def can_fullscreen(self) -> bool:
+    return False
+
+  def can_seek(self) -> bool:
+    return True
+
+  def has_tracklist(self) -> bool:
+    return False
+
+  def get_current_track(self) -> Track:
+    self._wait()
+    return Track(name='Synthetic Track', length=TRACK_LENGTH, track_id='/track/1')
+
+  def get_current_position(self) -> Position:
+    self._wait()
+    return round((monotonic() - self._started) * MICROSECONDS) % TRACK_LENGTH
+
+  def get_playstate(self) -> PlayState:
+    self._wait()
+    return self.state
+
+  def get_rate(self) -> Rate:
+    return Rate(1.0)
+
+  def get_shuffle(self) -> bool:
+    return False
+
+  def get_stream_title(self) -> str:
+    return 'Synthetic Track'
+
+  def get_volume(self) -> Volume:
+    return Volume(1.0)
+
+  def is_mute(self) -> bool:
+    return False
+
+  def is_playlist(self) -> bool:
+    return False
+
+  def is_repeating(self) -> bool:
+    return False
+
+  def get_art_url(self, track) -> str:
+    return ''
+
+  def next(self):
+    self._wait()
+
+  def previous(self):
+    self._wait()
+
+  def pause(self):
+    self._wait()
+    self.state = PlayState.PAUSED
+
+  def play(self):
+    self._wait()
+    self.state = PlayState.PLAYING
+
+  def resume(self):
+    self.play()
+
+
+class Results:
+  latencies: defaultdict[str, list[float]]
+  signals: int
+  errors: int
+  lags: list[float]
+
+  _lock: Lock
+
+  def __init__(self):
+    self.latencies = defaultdict(list)
+    self.signals = 0
+    self.errors = 0
+    self.lags = []
+    self._lock = Lock()
+
+  def add_latency(self, name: str, seconds: float):
+    with self._lock:
+      self.latencies[name].append(seconds)
+
+  def add_signal(self):
+    with self._lock:
+      self.signals += 1
+
+  def add_error(self):
+    with self._lock:
+      self.errors += 1
+
+  def to_counts(self) -> tuple[dict[str, list[float]], int, int]:
+    with self._lock:
+      return dict(self.latencies), self.signals, self.errors
+
+  def add_counts(self, latencies: dict[str, list[float]], signals: int, errors: int):
+    with self._lock:
+      for name, samples in latencies.items():
+        self.latencies[name] += samples
+
+      self.signals += signals
+      self.errors += errors
+
+
+class Controller(Thread):
+  """A simulated MPRIS client on its own bus connection."""
+
+  bus_name: str
+  scenario: Scenario
+  results: Results
+  stopped: Event
+
+  _connection: Gio.DBusConnection | None
+  _subscription: int
+
+  def __init__(self, index: int, address: str, bus_name: str, scenario: Scenario, results: Results, stopped: Event):
+    super().__init__(name=f'controller-{index}', daemon=True)
+    self.bus_name = bus_name
+    self.scenario = scenario
+    self.results = results
+    self.stopped = stopped
+
+    self._connection = Gio.DBusConnection.new_for_address_sync(address, CONNECTION_FLAGS, None, None)
+    self._subscription = self._connection.signal_subscribe(
+      bus_name, PROPERTIES_INTERFACE, 'PropertiesChanged', DBUS_PATH, None,
+      Gio.DBusSignalFlags.NONE, self._on_signal,
+    )
+
+  def _on_signal(self, *args):
+    self.results.add_signal()
+
+  def call(self, name: str, interface: str, method: str, args: GLib.Variant | None = None):
+    start = monotonic()
+
+    try:
+      self._connection.call_sync(
+        self.bus_name, DBUS_PATH, interface, method, args,
+        None, Gio.DBusCallFlags.NONE, CALL_TIMEOUT, None,
+      )
+
+    except GLib.Error as e:
+      log.debug(f'{name} failed: {e}')
+      self.results.add_error()
+      return
+
+    self.results.add_latency(name, monotonic() - start)
+
+  def get_all(self, interface: Interface):
+    args = GLib.Variant('(s)', (interface,))
+    self.call(f'GetAll({interface.rsplit(".", 1)[-1]})', PROPERTIES_INTERFACE, 'GetAll', args)
+
+  def get_position(self):
+    args = GLib.Variant('(ss)', (Interface.Player, 'Position'))
+    self.call('Get(Position)', PROPERTIES_INTERFACE, 'Get', args)
+
+  def send_burst(self):
+    for index in range(self.scenario.burst_size):
+      command = COMMANDS[index % len(COMMANDS)]
+      self.call(command, Interface.Player, command)
+
+  def run(self):
+    scenario = self.scenario
+
+    self.get_all(Interface.Root)
+    self.get_all(Interface.Player)
+
+    start = monotonic()
+    next_poll = start if scenario.poll_rate else None
+    next_burst = start if scenario.burst_size else None
+
+    while not self.stopped.is_set():
+      now = monotonic()
+
+      if next_poll is not None and now >= next_poll:
+        self.get_position()
+        next_poll = now + 1 / scenario.poll_rate
+
+      if next_burst is not None and now >= next_burst:
+        self.send_burst()
+        next_burst = now + scenario.burst_interval
+
+      deadlines = [deadline for deadline in (next_poll, next_burst) if deadline is not None]
+      timeout = min(deadlines) - monotonic() if deadlines else scenario.duration
+      self.stopped.wait(max(timeout, MIN_WAIT))
+
+  def close(self):
+    self._connection.signal_unsubscribe(self._subscription)
+    self._connection.close_sync(None)
+
+
+class LagProbe:
+  """Measure how late a repeating timeout fires on the server's main loop."""
+
+  results: Results
+
+  _expected: float
+  _source: int
+
+  def __init__(self, results: Results):
+    self.results = results
+    self._expected = monotonic() + LAG_PROBE_INTERVAL / MILLISECONDS
+    self._source = GLib.timeout_add(LAG_PROBE_INTERVAL, self._on_timeout)
+
+  def _on_timeout(self) -> bool:
+    now = monotonic()
+    self.results.lags.append(max(now - self._expected, 0.0))
+    self._expected = now + LAG_PROBE_INTERVAL / MILLISECONDS
+
+    return GLib.SOURCE_CONTINUE
+
+  def stop(self):
+    GLib.source_remove(self._source)
+
+
+@contextmanager
+def private_bus() -> Iterator[str]:
+  """Run a private session bus, and point this process's session bus at it."""
+  daemon = subprocess.Popen(
+    [DBUS_DAEMON, '--session', '--nofork', '--print-address=1'],
+    stdout=subprocess.PIPE,
+    text=True,
+  )
+
+  try:
+    address = daemon.stdout.readline().strip()
+    os.environ[DBUS_ENV] = address
+    log.info(f'Started private bus at {address}')
+
+    yield address
+
+  finally:
+    daemon.terminate()
+    daemon.wait()
+
+
+def get_cpu_time() -> float:
+  # the controllers run in a child process, so this is only the server's
+  usage = resource.getrusage(resource.RUSAGE_SELF)
+  return usage.ru_utime + usage.ru_stime
+
+
+def run_controllers(connection: Connection, address: str, bus_name: str, scenario: Scenario):
+  """Run a scenario's controllers in this process, and send their results back."""
+  results = Results()
+  stopped = Event()
+
+  # delivers PropertiesChanged to the controllers
+  loop = GLib.MainLoop()
+  thread = Thread(target=loop.run, daemon=True)
+  thread.start()
+
+  controllers = [
+    Controller(index, address, bus_name, scenario, results, stopped)
+    for index in range(scenario.controllers)
+  ]
+
+  try:
+    for controller in controllers:
+      controller.start()
+
+    connection.send(READY)
+    stopped.wait(scenario.duration)
+
+  finally:
+    stopped.set()
+
+    for controller in controllers:
+      controller.join()
+      controller.close()
+
+    loop.quit()
+
+  connection.send(results.to_counts())
+  connection.close()
+
+
+def run_scenario(address: str, scenario: Scenario) -> tuple[Results, float, float]:
+  results = Results()
+  adapter = SyntheticAdapter(scenario.latency)
+  server = Server(NAME, adapter)
+  server.loop(background=True)
+  probe = LagProbe(results)
+
+  context = multiprocessing.get_context(START_METHOD)
+  connection, child = context.Pipe()
+  process = context.Process(
+    target=run_controllers,
+    args=(child, address, server.bus_name, scenario),
+    name='loadgen-controllers',
+    daemon=True,
+  )
+
+  try:
+    process.start()
+    child.close()
+
+    # timed from when the controllers are connected, not from the process' startup
+    connection.recv()
+    start, cpu_start = monotonic(), get_cpu_time()
+
+    results.add_counts(*connection.recv())
+    wall, cpu = monotonic() - start, get_cpu_time() - cpu_start
+
+  finally:
+    process.join()
+    connection.close()
+    probe.stop()
+    server.quit()
+
+  return results, wall, cpu
+
+
+def format_percentiles(samples: list[float]) -> str:
+  percentiles = get_percentiles(samples)
+
+  return ' '.join(
+    f'p{percentile:g}={seconds * MILLISECONDS:.2f}ms'
+    for percentile, seconds in percentiles.items()
+  )
+
+
+def report(name: str, scenario: Scenario, results: Results, wall: float, cpu: float):
+  print(f'# {name}: {scenario}')
+
+  for call, samples in sorted(results.latencies.items()):
+    print(f'  {call:<20} n={len(samples):<7} {format_percentiles(samples)}')
+
+  print(f'  {"loop lag":<20} n={len(results.lags):<7} {format_percentiles(results.lags)}')
+  print(f'  signals={results.signals} errors={results.errors} cpu={cpu / wall:.1%} of one core')
+
+
+def get_args() -> Namespace:
+  parser = ArgumentParser(prog='python -m mpris_server.loadgen', description=__doc__)
+  parser.add_argument('scenarios', nargs='*', help=f'any of: {", ".join(SCENARIOS)}')
+  parser.add_argument('-c', '--controllers', type=int, help='override the number of controllers')
+  parser.add_argument('-d', '--duration', type=float, help='override the duration in seconds')
+  parser.add_argument('-l', '--latency', type=float, help='override the adapter latency in seconds')
+  parser.add_argument('-p', '--poll-rate', type=float, help='override Position polls per second per controller')
+  parser.add_argument('-b', '--burst-size', type=int, help='override the number of commands per burst')
+  parser.add_argument('-i', '--burst-interval', type=float, help='override the seconds between bursts')
+
+  args = parser.parse_args()
+
+  if unknown := set(args.scenarios) - SCENARIOS.keys():
+    parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+  args.scenarios = args.scenarios or list(SCENARIOS)
+
+  return args
+
+
+def get_scenario(name: str, args: Namespace) -> Scenario:
+  overrides = {
+    field: value
+    for field in Scenario._fields
+    if (value := getattr(args, field)) is not None
+  }
+
+  return SCENARIOS[name]._replace(**overrides)
+
+
+def main() -> int:
+  args = get_args()
+
+  with private_bus() as address:
+    for name in args.scenarios:
+      scenario = get_scenario(name, args)
+      results, wall, cpu = run_scenario(address, scenario)
+      report(name, scenario, results, wall, cpu)
+
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
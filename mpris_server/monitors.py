@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import heapq
+import logging
+from collections import deque
+from collections.abc import Iterable
+from threading import Lock
+from time import monotonic, perf_counter
+from typing import Final, NamedTuple
+
+from gi.repository import GLib
+
+from .base import BEGINNING, DEFAULT_RATE, Microseconds, PlayState, Position, Rate
+from .events import PlayerEventAdapter
+from .interfaces.interface import CallFinished, MprisInterface, get_caller
+from .interfaces.player import Player
+from .stats import get_percentiles, stats
+
+
+__all__ = [
+  'Dispatch',
+  'LoopMonitor',
+  'SeekMonitor',
+]
+
+log = logging.getLogger(__name__)
+
+MICROSECONDS: Final[int] = 1_000_000
+MILLISECONDS: Final[int] = 1_000
+
+# sample slowly, and only speed up around discontinuities
+DEFAULT_SEEK_INTERVAL: Final[float] = 1.0
+DEFAULT_IDLE_INTERVAL: Final[float] = 5.0
+DEFAULT_SETTLE_INTERVAL: Final[float] = 0.25
+BACKOFF: Final[float] = 2.0
+
+DEFAULT_SEEK_TOLERANCE: Final[Microseconds] = 1 * MICROSECONDS
+
+DEFAULT_LAG_INTERVAL: Final[float] = 0.1
+DEFAULT_LAG_THRESHOLD: Final[float] = 0.05
+DEFAULT_REPORT_INTERVAL: Final[float] = 60.0
+DEFAULT_LAG_SAMPLES: Final[int] = 1_000
+DEFAULT_SLOWEST: Final[int] = 10
+
+LOOP_LAG_WARNINGS: Final[str] = 'loop_lag_warnings'
+LOOP_LAG_PREFIX: Final[str] = 'loop_lag_p'
+
+NO_SOURCE: Final[int] = 0
+
+
+class SeekMonitor:
+  """
+  Emit Player.Seeked when the position jumps without the app reporting it.
+
+  The adapter's position is sampled at a low, adaptive rate and compared
+  against where playback should be given its rate and PlaybackStatus.
+  Seeked signals emitted by anyone else re-baseline the monitor, so each
+  seek is reported exactly once.
+
+  Jumps back to the beginning are treated as track changes and ignored.
+  """
+
+  player: Player
+  events: PlayerEventAdapter | None
+  tolerance: Microseconds
+  interval: float
+  idle_interval: float
+  settle_interval: float
+
+  _position: Position | None
+  _rate: Rate
+  _state: PlayState | None
+  _time: float
+  _lock: Lock
+  _current_interval: float
+  _source: int
+  _subscription: object | None
+
+  def __init__(
+    self,
+    player: Player,
+    events: PlayerEventAdapter | None = None,
+    tolerance: Microseconds = DEFAULT_SEEK_TOLERANCE,
+    interval: float = DEFAULT_SEEK_INTERVAL,
+    idle_interval: float = DEFAULT_IDLE_INTERVAL,
+    settle_interval: float = DEFAULT_SETTLE_INTERVAL,
+  ):
+    self.player = player
+    self.events = events
+    self.tolerance = tolerance
+    self.interval = interval
+    self.idle_interval = idle_interval
+    self.settle_interval = settle_interval
+
+    self._position = None
+    self._rate = DEFAULT_RATE
+    self._state = None
+    self._time = monotonic()
+    # Seeked can be emitted from any thread, while the baseline is sampled on the loop
+    self._lock = Lock()
+    self._current_interval = interval
+    self._source = NO_SOURCE
+    self._subscription = None
+
+  @property
+  def running(self) -> bool:
+    return self._source != NO_SOURCE
+
+  def start(self):
+    if self.running:
+      return
+
+    self._subscription = self.player.Seeked.connect(self._on_seeked)
+    self.reset()
+    self._schedule(self.interval)
+
+    log.debug(f'Monitoring {self.player.name} for seeks.')
+
+  def stop(self):
+    if self._source:
+      GLib.source_remove(self._source)
+      self._source = NO_SOURCE
+
+    if self._subscription:
+      self._subscription.disconnect()
+      self._subscription = None
+
+  def reset(self, position: Position | None = None):
+    """Re-baseline at the adapter's position, or at position if given."""
+    adapter = self.player.adapter
+
+    if position is None:
+      position = adapter.get_current_position()
+
+    state = adapter.get_playstate()
+    rate = adapter.get_rate() or DEFAULT_RATE
+
+    with self._lock:
+      self._position = position
+      self._state = state
+      self._rate = rate
+      self._time = monotonic()
+
+  def get_expected_position(self, now: float) -> Position | None:
+    if self._position is None:
+      return None
+
+    if self._state != PlayState.PLAYING:
+      return self._position
+
+    elapsed = now - self._time
+    return self._position + round(elapsed * float(self._rate) * MICROSECONDS)
+
+  def is_discontinuity(self, position: Position, expected: Position) -> bool:
+    if abs(position - expected) <= self.tolerance:
+      return False
+
+    # position went back to the start, most likely a new track
+    return position > self.tolerance or expected < position
+
+  def sample(self) -> bool:
+    """Sample the position once, emit Seeked and return True on a discontinuity."""
+    adapter = self.player.adapter
+    now = monotonic()
+
+    position = adapter.get_current_position()
+    state = adapter.get_playstate()
+    rate = adapter.get_rate() or DEFAULT_RATE
+
+    with self._lock:
+      expected = self.get_expected_position(now)
+
+      # can't predict the position across state or rate changes
+      seeked = (
+        expected is not None
+        and position is not None
+        and state == self._state
+        and rate == self._rate
+        and self.is_discontinuity(position, expected)
+      )
+
+      self._position = position
+      self._state = state
+      self._rate = rate
+      self._time = now
+
+    if seeked:
+      log.debug(f'Detected seek on {self.player.name}: expected {expected}, got {position}.')
+      self._emit(position)
+
+    return seeked
+
+  def _emit(self, position: Position):
+    if self.events:
+      self.events.on_seek(position)
+
+    else:
+      self.player.Seeked(position)
+
+  def _on_seeked(self, position: Position):
+    with self._lock:
+      self._position = max(position, BEGINNING)
+      self._time = monotonic()
+
+  def _get_next_interval(self, seeked: bool) -> float:
+    if seeked:
+      return self.settle_interval
+
+    if self._state != PlayState.PLAYING:
+      return self.idle_interval
+
+    # back off from the settle interval to the base interval
+    return min(self._current_interval * BACKOFF, self.interval)
+
+  def _schedule(self, interval: float):
+    self._current_interval = interval
+    self._source = GLib.timeout_add(round(interval * MILLISECONDS), self._on_timeout)
+
+  def _on_timeout(self) -> bool:
+    try:
+      seeked = self.sample()
+
+    except Exception as e:
+      log.exception(f'Error while sampling position: {e}')
+      seeked = False
+
+    interval = self._get_next_interval(seeked)
+
+    if interval == self._current_interval:
+      return GLib.SOURCE_CONTINUE
+
+    self._schedule(interval)
+    return GLib.SOURCE_REMOVE
+
+
+class Dispatch(NamedTuple):
+  duration: float
+  member: str
+  sender: str | None
+
+
+class LoopMonitor:
+  """
+  Watch the health of the GLib main loop that serves the interfaces.
+
+  A high priority timeout measures how late the loop gets to it, and calls
+  made on the loop thread are timed to keep the slowest dispatches along with
+  the member that was called. Lag percentiles are logged and set as stats
+  gauges periodically, and lags over the threshold are warned about.
+  """
+
+  interfaces: list[MprisInterface]
+  interval: float
+  threshold: float
+  report_interval: float
+  lags: deque[float]
+  slowest: list[Dispatch]
+  slowest_count: int
+
+  _lock: Lock
+  _expected: float
+  _last_report: float
+  _culprit: Dispatch | None
+  _source: int
+
+  def __init__(
+    self,
+    interfaces: Iterable[MprisInterface],
+    interval: float = DEFAULT_LAG_INTERVAL,
+    threshold: float = DEFAULT_LAG_THRESHOLD,
+    report_interval: float = DEFAULT_REPORT_INTERVAL,
+    samples: int = DEFAULT_LAG_SAMPLES,
+    slowest: int = DEFAULT_SLOWEST,
+  ):
+    self.interfaces = [*interfaces]
+    self.interval = interval
+    self.threshold = threshold
+    self.report_interval = report_interval
+    self.lags = deque(maxlen=samples)
+    self.slowest = []
+    self.slowest_count = slowest
+
+    self._lock = Lock()
+    self._expected = 0.0
+    self._last_report = 0.0
+    self._culprit = None
+    self._source = NO_SOURCE
+
+  @property
+  def running(self) -> bool:
+    return self._source != NO_SOURCE
+
+  def start(self):
+    if self.running:
+      return
+
+    for interface in self.interfaces:
+      interface.add_call_hook(self._on_call)
+
+    self._expected = monotonic() + self.interval
+    self._last_report = monotonic()
+    self._source = GLib.timeout_add(
+      round(self.interval * MILLISECONDS),
+      self._on_timeout,
+      priority=GLib.PRIORITY_HIGH,
+    )
+
+    log.debug(f'Monitoring main loop lag every {self.interval}s.')
+
+  def stop(self):
+    if self._source:
+      GLib.source_remove(self._source)
+      self._source = NO_SOURCE
+
+    for interface in self.interfaces:
+      interface.remove_call_hook(self._on_call)
+
+  def get_percentiles(self) -> dict[float, float]:
+    # copied, the loop appends lags while other threads read them
+    with self._lock:
+      lags = [*self.lags]
+
+    return get_percentiles(lags)
+
+  def get_slowest(self) -> list[Dispatch]:
+    with self._lock:
+      return sorted(self.slowest, reverse=True)
+
+  def report(self):
+    percentiles = self.get_percentiles()
+
+    for percentile, lag in percentiles.items():
+      stats.set_gauge(f'{LOOP_LAG_PREFIX}{percentile:g}', lag)
+
+    lags = ' '.join(f'p{percentile:g}={lag * MILLISECONDS:.1f}ms' for percentile, lag in percentiles.items())
+    log.info(f'Main loop lag: {lags}')
+
+    if slowest := self.get_slowest():
+      dispatches = ', '.join(f'{dispatch.member} {dispatch.duration * MILLISECONDS:.1f}ms' for dispatch in slowest)
+      log.info(f'Slowest dispatches: {dispatches}')
+
+  def _on_call(self, interface: MprisInterface, name: str, args: tuple) -> CallFinished | None:
+    # only calls that hold up the loop, not deferred ones on workers
+    if not GLib.main_context_default().is_owner():
+      return None
+
+    start = perf_counter()
+    sender = get_caller()
+
+    def finished():
+      dispatch = Dispatch(perf_counter() - start, f'{interface.INTERFACE}.{name}', sender)
+      self._add_dispatch(dispatch)
+
+    return finished
+
+  def _add_dispatch(self, dispatch: Dispatch):
+    with self._lock:
+      if not self._culprit or dispatch.duration > self._culprit.duration:
+        self._culprit = dispatch
+
+      if len(self.slowest) < self.slowest_count:
+        heapq.heappush(self.slowest, dispatch)
+
+      elif dispatch.duration > self.slowest[0].duration:
+        heapq.heapreplace(self.slowest, dispatch)
+
+  def _on_timeout(self) -> bool:
+    now = monotonic()
+    lag = max(now - self._expected, 0.0)
+    self._expected = now + self.interval
+
+    with self._lock:
+      self.lags.append(lag)
+      culprit, self._culprit = self._culprit, None
+
+    if lag > self.threshold:
+      stats.incr(LOOP_LAG_WARNINGS)
+      cause = f', slowest call was {culprit.member} ({culprit.duration * MILLISECONDS:.1f}ms)' if culprit else ''
+      log.warning(f'Main loop lagged {lag * MILLISECONDS:.1f}ms{cause}.')
+
+    if now - self._last_report >= self.report_interval:
+      self._last_report = now
+      self.report()
+
+    return GLib.SOURCE_CONTINUE
@@ -2,9 +2,10 @@ from . import compat, metadata
 
 from .compat import enforce_dbus_length, get_dbus_name, get_track_id, DBUS_NAME_MAX
 from .metadata import (
-  DEFAULT_METADATA, Name, Metadata, MetadataEntry, NameMetadata, SortedMetadata,
-  MetadataEntries, MetadataTypes, MetadataObj, ValidMetadata, get_runtime_types,
-  is_dbus_type, is_valid_metadata, get_dbus_metadata
+  DEFAULT_METADATA, Name, Metadata, MetadataBudget, MetadataEntry, NameMetadata, SortedMetadata,
+  MetadataEntries, MetadataTypes, MetadataObj, PrebuiltMetadata, TracksMetadata, ValidMetadata,
+  get_runtime_types, get_validation_mode, is_dbus_type, is_valid_metadata, get_dbus_metadata,
+  get_dbus_tracks_metadata, set_validation_mode
 )
 
 
@@ -15,18 +16,24 @@ __all__ = [
   'enforce_dbus_length',
   'get_dbus_metadata',
   'get_dbus_name',
+  'get_dbus_tracks_metadata',
   'get_runtime_types',
   'get_track_id',
+  'get_validation_mode',
   'is_dbus_type',
   'is_valid_metadata',
   'metadata',
   'Metadata',
+  'MetadataBudget',
   'MetadataEntries',
   'MetadataEntry',
   'MetadataObj',
   'MetadataTypes',
   'Name',
   'NameMetadata',
+  'PrebuiltMetadata',
+  'set_validation_mode',
   'SortedMetadata',
+  'TracksMetadata',
   'ValidMetadata',
 ]
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import logging
-from collections.abc import Collection, Iterable, Mapping, Sequence
+from collections.abc import Callable, Collection, Iterable, Mapping, Sequence
+from hashlib import blake2b
 from typing import Any, Final, NamedTuple, Required, Self, TypedDict, cast
 
 from gi.repository.GLib import Variant
@@ -9,19 +10,32 @@ from strenum import StrEnum
 
 from ..base import Artist, Compatible, DEFAULT_TRACK_ID, DbusPyTypes, DbusTypes, MprisTypes, NO_ARTIST_NAME, PyType, \
   Track
+from ..enums import ValidationMode
+from ..stats import stats
 from ..types import get_type, is_type
 
 
 log = logging.getLogger(__name__)
 
 FIRST: Final[int] = 0
+KEY: Final[int] = 0
+VALUE: Final[int] = 1
 FIELDS_ERROR: Final[str] = "Added or missing fields."
 
+INT32_MIN: Final[int] = -2 ** 31
+INT32_MAX: Final[int] = 2 ** 31 - 1
+INT64_MIN: Final[int] = -2 ** 63
+INT64_MAX: Final[int] = 2 ** 63 - 1
+
 
 type Name = str
 type MetadataEntry = str
 type NameMetadata = tuple[Name, DbusPyTypes]
 type SortedMetadata = dict[Name, DbusPyTypes]
+type Validator = Callable[[Any], bool]
+
+
+DEFAULT_VALIDATION_MODE: Final[ValidationMode] = ValidationMode.LENIENT
 
 
 class MetadataEntries(StrEnum):
@@ -86,6 +100,33 @@ METADATA_TYPES: Final[dict[MetadataEntries, DbusTypes]] = {
   MetadataEntries.USER_RATING: DbusTypes.DOUBLE,
 }
 
+# fields kept regardless of the payload budget
+ESSENTIAL_ENTRIES: Final[frozenset[MetadataEntry]] = frozenset({
+  MetadataEntries.LENGTH,
+  MetadataEntries.TRACK_ID,
+  MetadataEntries.TITLE,
+})
+
+# text fields that are still useful when cut short, anything else over budget is omitted
+TRUNCATABLE_ENTRIES: Final[frozenset[MetadataEntry]] = frozenset({
+  MetadataEntries.AS_TEXT,
+  MetadataEntries.COMMENT,
+  MetadataEntries.TITLE,
+})
+
+DEFAULT_FIELD_BUDGETS: Final[dict[MetadataEntry, int]] = {
+  MetadataEntries.ART_URL: 8 * 1024,
+  MetadataEntries.AS_TEXT: 4 * 1024,
+  MetadataEntries.COMMENT: 1024,
+}
+DEFAULT_PAYLOAD_BUDGET: Final[int] = 32 * 1024
+STRING_OVERHEAD: Final[int] = 5
+
+BUDGET_TRUNCATED: Final[str] = 'metadata.budget.truncated'
+BUDGET_OMITTED: Final[str] = 'metadata.budget.omitted'
+
+FINGERPRINT_SIZE: Final[int] = 8
+
 DBUS_TYPES_TO_PY_TYPES: Final[dict[DbusTypes, PyType]] = {
   DbusTypes.BOOLEAN: MprisTypes.BOOLEAN,
   DbusTypes.DATETIME: MprisTypes.DATETIME,
@@ -214,7 +255,19 @@ class MetadataObj(NamedTuple):
 assert len(MetadataEntries) == len(MetadataObj._fields), FIELDS_ERROR
 
 
-type ValidMetadata = Metadata | MetadataObj
+class PrebuiltMetadata(dict[MetadataEntry, Variant]):
+  """
+  Metadata whose values are already D-Bus Variants.
+
+  Adapters can return this from metadata() or get_tracks_metadata()
+  to have it sent as-is, without validation or re-wrapping.
+  """
+  pass
+
+
+type DbusMetadataVariant = Variant
+type ValidMetadata = Metadata | MetadataObj | PrebuiltMetadata | DbusMetadataVariant
+type TracksMetadata = Sequence[ValidMetadata] | DbusMetadataVariant
 type RuntimeTypes = tuple[type, ...]
 
 
@@ -242,12 +295,107 @@ def is_dbus_type(val: Any) -> bool:
   return isinstance(val, DBUS_RUNTIME_TYPES)
 
 
-def is_valid_metadata(entry: str, val: Any) -> bool:
-  if val is None or entry not in METADATA_TYPES:
+def is_lenient_type(val: Any) -> bool:
+  return is_dbus_type(val) and not is_null_collection(val)
+
+
+def is_any_type(val: Any) -> bool:
+  return True
+
+
+def is_string(val: Any) -> bool:
+  return isinstance(val, str | bytes)
+
+
+def is_string_array(val: Any) -> bool:
+  return (
+    isinstance(val, Sequence)
+    and not isinstance(val, str | bytes)
+    and bool(val)
+    and all(isinstance(item, str) for item in val)
+  )
+
+
+def is_integer(val: Any) -> bool:
+  # bool is an int subclass, but isn't a valid D-Bus integer
+  return isinstance(val, int) and not isinstance(val, bool)
+
+
+def is_int32(val: Any) -> bool:
+  return is_integer(val) and INT32_MIN <= val <= INT32_MAX
+
+
+def is_int64(val: Any) -> bool:
+  return is_integer(val) and INT64_MIN <= val <= INT64_MAX
+
+
+def is_double(val: Any) -> bool:
+  return isinstance(val, float) or is_integer(val)
+
+
+STRICT_TYPE_VALIDATORS: Final[dict[DbusTypes, Validator]] = {
+  DbusTypes.DOUBLE: is_double,
+  DbusTypes.INT32: is_int32,
+  DbusTypes.INT64: is_int64,
+  DbusTypes.STRING: is_string,
+  DbusTypes.STRING_ARRAY: is_string_array,
+}
+
+
+def get_validators(mode: ValidationMode) -> dict[MetadataEntries, Validator]:
+  match mode:
+    case ValidationMode.STRICT:
+      return {
+        entry: STRICT_TYPE_VALIDATORS[metadata_type]
+        for entry, metadata_type in METADATA_TYPES.items()
+      }
+
+    case ValidationMode.LENIENT:
+      return dict.fromkeys(METADATA_TYPES, is_lenient_type)
+
+    case ValidationMode.OFF:
+      return dict.fromkeys(METADATA_TYPES, is_any_type)
+
+  raise ValueError(f"Invalid validation mode: {mode}")
+
+
+# compiled once, validating an entry is then a lookup and a call
+METADATA_VALIDATORS: Final[dict[ValidationMode, dict[MetadataEntries, Validator]]] = {
+  mode: get_validators(mode)
+  for mode in ValidationMode
+}
+
+_validation_mode: ValidationMode = DEFAULT_VALIDATION_MODE
+
+
+def get_validation_mode() -> ValidationMode:
+  return _validation_mode
+
+
+def set_validation_mode(mode: ValidationMode):
+  """
+  Set how metadata from adapters is validated before it's sent to D-Bus.
+
+  STRICT checks collection elements and integer ranges, LENIENT only
+  checks the value's type, and OFF trusts the adapter completely.
+  """
+  global _validation_mode
+
+  _validation_mode = ValidationMode(mode)
+
+
+def is_valid_metadata(entry: str, val: Any, mode: ValidationMode | None = None) -> bool:
+  validators = METADATA_VALIDATORS[mode or _validation_mode]
+
+  if val is None or (validator := validators.get(entry)) is None:
     log.debug(f"<{entry=}, {val=}> isn't valid metadata, skipping.")
     return False
 
-  return is_dbus_type(val) and not is_null_collection(val)
+  if not validator(val):
+    log.debug(f"<{entry=}, {val=}> isn't valid {METADATA_TYPES[entry]} metadata, skipping.")
+    return False
+
+  return True
 
 
 def get_dbus_var(entry: MetadataEntries, val: Any) -> Variant:
@@ -276,7 +424,37 @@ def to_compatible_type(val: Any) -> Compatible:
   return val
 
 
-def get_dbus_metadata(metadata: ValidMetadata) -> Metadata:
+def is_metadata_variant(val: Any) -> bool:
+  return isinstance(val, Variant) and val.get_type_string() == DbusTypes.METADATA
+
+
+def unpack_metadata_variant(variant: DbusMetadataVariant) -> PrebuiltMetadata:
+  # a{sv} -> {s: v}, the boxed values are reused as they are
+  metadata = PrebuiltMetadata()
+
+  for index in range(variant.n_children()):
+    entry = variant.get_child_value(index)
+    name = entry.get_child_value(KEY).get_string()
+    metadata[name] = entry.get_child_value(VALUE).get_variant()
+
+  return metadata
+
+
+def get_prebuilt_metadata(metadata: ValidMetadata) -> Metadata | None:
+  match metadata:
+    case PrebuiltMetadata():
+      return metadata
+
+    case Variant() if is_metadata_variant(metadata):
+      return unpack_metadata_variant(metadata)
+
+  return None
+
+
+def get_dbus_metadata(metadata: ValidMetadata, mode: ValidationMode | None = None) -> Metadata:
+  if (prebuilt := get_prebuilt_metadata(metadata)) is not None:
+    return prebuilt
+
   if isinstance(metadata, MetadataObj):
     metadata: Metadata = metadata.to_dict()
 
@@ -285,10 +463,155 @@ def get_dbus_metadata(metadata: ValidMetadata) -> Metadata:
   return {
     entry: get_dbus_var(entry, value)
     for entry, value in metadata.items()
-    if is_valid_metadata(entry, value)
+    if is_valid_metadata(entry, value, mode)
   }
 
 
+def get_dbus_tracks_metadata(tracks: TracksMetadata | None) -> list[Metadata] | None:
+  match tracks:
+    case None:
+      return None
+
+    case Variant() if tracks.get_type_string() == DbusTypes.METADATA_ARRAY:
+      return [
+        unpack_metadata_variant(tracks.get_child_value(index))
+        for index in range(tracks.n_children())
+      ]
+
+  return [get_dbus_track_metadata(metadata) for metadata in tracks]
+
+
+def get_dbus_track_metadata(metadata: ValidMetadata) -> Metadata:
+  if (prebuilt := get_prebuilt_metadata(metadata)) is not None:
+    return prebuilt
+
+  if isinstance(metadata, MetadataObj):
+    return get_dbus_metadata(metadata)
+
+  # plain dicts are already expected to hold Variants, send them unchanged
+  return metadata
+
+
+type Fingerprint = bytes
+
+
+def get_fingerprint(metadata: Metadata) -> Fingerprint:
+  """A compact digest of D-Bus metadata, equal whenever the content is."""
+  digest = blake2b(digest_size=FINGERPRINT_SIZE)
+
+  for name in sorted(metadata):
+    value = metadata[name]
+    text = value.print_(True) if isinstance(value, Variant) else repr(value)
+    digest.update(f'{name}={text}\0'.encode())
+
+  return digest.digest()
+
+
+def get_metadata_track_id(metadata: Metadata) -> str | None:
+  match value := metadata.get(MetadataEntries.TRACK_ID):
+    case Variant():
+      return value.unpack()
+
+  return value
+
+
+class MetadataBudget(NamedTuple):
+  """
+  Byte budgets for Player.Metadata.
+
+  Fields over their budget are truncated, or omitted if truncating them
+  would break them. Fields that don't fit in the payload budget are omitted,
+  largest first. TrackList.GetTracksMetadata isn't budgeted, so the full
+  values remain available there.
+  """
+
+  fields: Mapping[MetadataEntry, int] = DEFAULT_FIELD_BUDGETS
+  payload: int | None = DEFAULT_PAYLOAD_BUDGET
+
+
+def truncate_text(text: str, size: int) -> str:
+  encoded = text.encode()[:size]
+  return encoded.decode(errors='ignore')
+
+
+def truncate_metadata_var(entry: MetadataEntry, var: Variant, size: int) -> Variant | None:
+  if entry not in TRUNCATABLE_ENTRIES:
+    return None
+
+  match var.get_type_string():
+    case DbusTypes.STRING:
+      text = truncate_text(var.get_string(), size)
+      return Variant(DbusTypes.STRING, text) if text else None
+
+    case DbusTypes.STRING_ARRAY:
+      items: list[str] = []
+
+      for item in var.unpack():
+        if (remaining := size - len(item.encode()) - STRING_OVERHEAD) < 0:
+          if size > STRING_OVERHEAD and (item := truncate_text(item, size - STRING_OVERHEAD)):
+            items.append(item)
+
+          break
+
+        items.append(item)
+        size = remaining
+
+      return Variant(DbusTypes.STRING_ARRAY, items) if items else None
+
+  return None
+
+
+def sort_by_priority(entry_size: tuple[MetadataEntry, int]) -> tuple[bool, int]:
+  entry, size = entry_size
+  return entry not in ESSENTIAL_ENTRIES, size
+
+
+def apply_metadata_budget(metadata: Metadata, budget: MetadataBudget) -> Metadata:
+  sizes: dict[MetadataEntry, int] = {
+    entry: var.get_size()
+    for entry, var in metadata.items()
+  }
+
+  over_field = any(
+    size > budget.fields[entry]
+    for entry, size in sizes.items()
+    if entry in budget.fields
+  )
+  over_payload = budget.payload is not None and sum(sizes.values()) > budget.payload
+
+  if not over_field and not over_payload:
+    return metadata
+
+  budgeted: Metadata = Metadata()
+  total: int = 0
+
+  for entry, size in sorted(sizes.items(), key=sort_by_priority):
+    var: Variant | None = metadata[entry]
+
+    if (limit := budget.fields.get(entry)) is not None and size > limit:
+      var = truncate_metadata_var(entry, var, limit)
+      count_budget_hit(BUDGET_TRUNCATED if var else BUDGET_OMITTED, entry)
+
+      if not var:
+        continue
+
+      size = var.get_size()
+
+    if budget.payload is not None and total + size > budget.payload and entry not in ESSENTIAL_ENTRIES:
+      count_budget_hit(BUDGET_OMITTED, entry)
+      continue
+
+    budgeted[entry] = var
+    total += size
+
+  return budgeted
+
+
+def count_budget_hit(action: str, entry: MetadataEntry):
+  stats.incr(action)
+  stats.incr(f'{action}:{entry}')
+
+
 def sort_metadata_by_name(name_metadata: NameMetadata) -> Name:
   name, _ = name_metadata
 
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+from time import monotonic
+from typing import Final, TYPE_CHECKING
+
+from gi.repository import GLib
+
+from .base import ON_PLAYER_PROPS, ON_PLAYLIST_PROPS, ON_ROOT_PROPS, ON_TRACKS_PROPS, PlayState, Properties, \
+  PropertyValues, emit_properties_changed
+from .enums import Method, Property
+from .interfaces.interface import MprisInterface
+
+
+if TYPE_CHECKING:
+  from .server import Server
+
+
+__all__ = [
+  'StatePoller',
+]
+
+log = logging.getLogger(__name__)
+
+MILLISECONDS: Final[int] = 1_000
+
+DEFAULT_FAST_INTERVAL: Final[float] = 0.5
+DEFAULT_PAUSED_INTERVAL: Final[float] = 1.0
+DEFAULT_STOPPED_INTERVAL: Final[float] = 5.0
+DEFAULT_COMMAND_WINDOW: Final[float] = 2.0
+
+NO_SOURCE: Final[int] = 0
+
+# Position changes continuously, the spec says clients must not expect it in PropertiesChanged
+POLLED_PLAYER_PROPS: Final[Properties] = [
+  prop
+  for prop in ON_PLAYER_PROPS
+  if prop != Property.Position
+]
+
+type Snapshot = PropertyValues
+
+
+class StatePoller:
+  """
+  Poll an adapter that can't push events, and emit what changed.
+
+  Each interface's properties are snapshotted on an adaptive schedule:
+  fast while playing or just after a command, and slow while stopped.
+  Only properties that differ from the previous snapshot are emitted.
+  """
+
+  server: Server
+  props: dict[MprisInterface, Properties]
+  fast_interval: float
+  paused_interval: float
+  stopped_interval: float
+  command_window: float
+
+  _snapshots: dict[MprisInterface, Snapshot]
+  _last_command: float
+  _current_interval: float
+  _source: int
+
+  def __init__(
+    self,
+    server: Server,
+    interfaces: Iterable[MprisInterface] | None = None,
+    fast_interval: float = DEFAULT_FAST_INTERVAL,
+    paused_interval: float = DEFAULT_PAUSED_INTERVAL,
+    stopped_interval: float = DEFAULT_STOPPED_INTERVAL,
+    command_window: float = DEFAULT_COMMAND_WINDOW,
+  ):
+    self.server = server
+    self.fast_interval = fast_interval
+    self.paused_interval = paused_interval
+    self.stopped_interval = stopped_interval
+    self.command_window = command_window
+
+    if interfaces is None:
+      interfaces = get_default_interfaces(server)
+
+    self.props = {
+      interface: get_polled_props(server, interface)
+      for interface in interfaces
+    }
+
+    self._snapshots = {}
+    self._last_command = float('-inf')
+    self._current_interval = stopped_interval
+    self._source = NO_SOURCE
+
+  @property
+  def running(self) -> bool:
+    return self._source != NO_SOURCE
+
+  def start(self):
+    if self.running:
+      return
+
+    for interface in self.props:
+      interface.add_call_hook(self._on_call)
+
+    self.poll()
+    self._schedule(self._get_interval())
+
+    log.debug(f'Polling {self.server.name} for changes.')
+
+  def stop(self):
+    if self._source:
+      GLib.source_remove(self._source)
+      self._source = NO_SOURCE
+
+    for interface in self.props:
+      interface.remove_call_hook(self._on_call)
+
+  def poke(self):
+    """Poll fast for a while, call this after the app changes state."""
+    self._last_command = monotonic()
+
+    if self.running and self._current_interval != self.fast_interval:
+      GLib.source_remove(self._source)
+      self._schedule(self.fast_interval)
+
+  def snapshot(self, interface: MprisInterface) -> Snapshot:
+    snapshot: Snapshot = {}
+
+    for prop in self.props[interface]:
+      try:
+        snapshot[prop] = getattr(interface, prop)
+
+      except Exception as e:
+        log.warning(f'Could not poll {interface.INTERFACE}.{prop}: {e}')
+
+    return snapshot
+
+  def poll(self):
+    """Snapshot each interface and emit properties that changed since the last poll."""
+    for interface in self.props:
+      snapshot = self.snapshot(interface)
+      previous = self._snapshots.get(interface)
+      self._snapshots[interface] = snapshot
+
+      if previous is None:
+        continue
+
+      if changes := get_changes(previous, snapshot):
+        log.debug(f'Polled changes on {interface.INTERFACE}: {", ".join(changes)}')
+        emit_properties_changed(interface, changes)
+
+  def _get_interval(self) -> float:
+    if monotonic() - self._last_command < self.command_window:
+      return self.fast_interval
+
+    match self.server.adapter.get_playstate():
+      case PlayState.PLAYING:
+        return self.fast_interval
+
+      case PlayState.PAUSED:
+        return self.paused_interval
+
+    return self.stopped_interval
+
+  def _on_call(self, interface: MprisInterface, name: str, args: tuple):
+    if name in Method:
+      self.poke()
+
+  def _schedule(self, interval: float):
+    self._current_interval = interval
+    self._source = GLib.timeout_add(round(interval * MILLISECONDS), self._on_timeout)
+
+  def _on_timeout(self) -> bool:
+    try:
+      self.poll()
+      interval = self._get_interval()
+
+    except Exception as e:
+      log.exception(f'Error while polling: {e}')
+      interval = self.stopped_interval
+
+    if interval == self._current_interval:
+      return GLib.SOURCE_CONTINUE
+
+    self._schedule(interval)
+    return GLib.SOURCE_REMOVE
+
+
+def get_default_interfaces(server: Server) -> list[MprisInterface]:
+  interfaces: list[MprisInterface] = [server.root, server.player]
+
+  if server.adapter.has_tracklist():
+    interfaces.append(server.tracklist)
+
+  return interfaces
+
+
+def get_polled_props(server: Server, interface: MprisInterface) -> Properties:
+  if interface is server.root:
+    return ON_ROOT_PROPS
+
+  elif interface is server.player:
+    return POLLED_PLAYER_PROPS
+
+  elif interface is server.tracklist:
+    return ON_TRACKS_PROPS
+
+  elif interface is server.playlists:
+    return ON_PLAYLIST_PROPS
+
+  return ()
+
+
+def get_changes(previous: Snapshot, current: Snapshot) -> PropertyValues:
+  return {
+    prop: value
+    for prop, value in current.items()
+    if prop not in previous or previous[prop] != value
+  }
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import logging
+from collections import deque
+from typing import Final, Self
+
+from gi.repository import Gio, GLib
+
+from .adapters import MprisAdapter
+from .backends.pydbus import PydbusBackend
+from .events import EventAdapter
+from .server import Server
+
+
+__all__ = [
+  'ServerPool',
+]
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE: Final[int] = 2
+IDLE_NAME: Final[str] = 'Idle'
+
+NO_SOURCE: Final[int] = 0
+
+
+def get_session_address() -> str:
+  return Gio.dbus_address_get_for_bus_sync(Gio.BusType.SESSION, None)
+
+
+class ServerPool:
+  """
+  Keep servers registered on their own connections, ready to be claimed.
+
+  Each server needs a private connection, because every MPRIS player exports
+  the same object path. Claiming a server only attaches an adapter and owns
+  its bus name, so new players show up without connecting or registering.
+  """
+
+  size: int
+  address: str
+
+  _idle: deque[Server]
+  _claimed: set[Server]
+  _source: int
+
+  def __init__(self, size: int = DEFAULT_POOL_SIZE, address: str | None = None):
+    self.size = size
+    self.address = address or get_session_address()
+
+    self._idle = deque()
+    self._claimed = set()
+    self._source = NO_SOURCE
+
+  def __len__(self) -> int:
+    return len(self._idle)
+
+  def __enter__(self) -> Self:
+    self.fill()
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def create(self) -> Server:
+    server = Server(IDLE_NAME)
+    server.register(PydbusBackend.connect(self.address))
+
+    return server
+
+  def fill(self):
+    while len(self._idle) < self.size:
+      self._idle.append(self.create())
+
+  def claim(self, name: str, adapter: MprisAdapter, events: EventAdapter | None = None) -> Server:
+    """Take an idle server, or create one if none are left, and publish it as name."""
+    server = self._idle.popleft() if self._idle else self.create()
+
+    server.set_adapter(adapter)
+    server.set_event_adapter(events)
+    server.rename(name)
+    server.request_name()
+
+    self._claimed.add(server)
+    self._schedule_fill()
+
+    log.debug(f'Claimed pooled server for {name}, {len(self._idle)} left idle.')
+    return server
+
+  def release(self, server: Server):
+    """Close a claimed server and its connection."""
+    self._claimed.discard(server)
+    server.close()
+
+  def close(self):
+    if self._source:
+      GLib.source_remove(self._source)
+      self._source = NO_SOURCE
+
+    for server in [*self._idle, *self._claimed]:
+      self.release(server)
+
+    self._idle.clear()
+
+  def _schedule_fill(self):
+    # refill when the loop is idle, so claiming never waits on the bus
+    if not self._source:
+      self._source = GLib.idle_add(self._on_idle)
+
+  def _on_idle(self) -> bool:
+    self._source = NO_SOURCE
+
+    try:
+      self.fill()
+
+    except Exception as e:
+      log.exception(f'Could not refill server pool: {e}')
+
+    return GLib.SOURCE_REMOVE
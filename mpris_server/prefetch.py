@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Final, NamedTuple, TYPE_CHECKING
+
+from pydbus.generic import subscription
+
+from .backends.backend import adapter_calls
+from .base import DbusObj, Track
+from .enums import Property
+from .interfaces.player import Player
+from .mpris.metadata import Metadata, MetadataEntries, create_metadata_from_track, update_metadata
+from .stats import stats
+
+
+if TYPE_CHECKING:
+  from .adapters import MprisAdapter
+
+
+__all__ = [
+  'Prefetched',
+  'Prefetcher',
+]
+
+log = logging.getLogger(__name__)
+
+WORKER_NAME: Final[str] = 'mpris-prefetch'
+PREFETCH_HITS: Final[str] = 'player.metadata.prefetch.hits'
+PREFETCH_MISSES: Final[str] = 'player.metadata.prefetch.misses'
+
+
+class Prefetched(NamedTuple):
+  track: Track
+  metadata: Metadata
+
+
+class Prefetcher:
+  """
+  Build Metadata for the adapter's next and previous tracks ahead of time.
+
+  After each track change, a worker thread asks the adapter for the tracks
+  around the current one, and builds their metadata, including their art URLs.
+  When playback moves to one of them, Player.Metadata is served from what was
+  built, instead of calling get_art_url() and building it on the loop.
+
+  The adapter is called from the worker, see MprisAdapter.is_thread_safe().
+  """
+
+  player: Player
+
+  _entries: dict[DbusObj, Prefetched]
+  _current: DbusObj | None
+  _lock: Lock
+  _executor: ThreadPoolExecutor | None
+  _subscription: subscription | None
+
+  def __init__(self, player: Player):
+    self.player = player
+
+    self._entries = {}
+    self._current = None
+    self._lock = Lock()
+    self._executor = None
+    self._subscription = None
+
+  @property
+  def adapter(self) -> MprisAdapter:
+    return self.player.adapter
+
+  @property
+  def running(self) -> bool:
+    return self._executor is not None
+
+  def start(self):
+    if self.running:
+      return
+
+    self._executor = ThreadPoolExecutor(1, thread_name_prefix=WORKER_NAME)
+    self._subscription = self.player.PropertiesChanged.connect(self._on_properties_changed)
+    self.player.prefetcher = self
+
+    self._submit(force=False)
+    log.debug(f'Prefetching metadata for {self.player.name}.')
+
+  def stop(self):
+    if self.player.prefetcher is self:
+      self.player.prefetcher = None
+
+    if self._subscription:
+      self._subscription.disconnect()
+      self._subscription = None
+
+    if self._executor:
+      self._executor.shutdown(wait=False, cancel_futures=True)
+      self._executor = None
+
+    with self._lock:
+      self._entries.clear()
+      self._current = None
+
+  def prefetch(self):
+    """Prefetch the tracks around the current one again, call this if they change without a track change."""
+    self._submit(force=True)
+
+  def get(self, track: Track) -> Metadata | None:
+    """Metadata built ahead of time for exactly this track, if there is any."""
+    with self._lock:
+      entry = self._entries.get(track.track_id)
+
+    if entry is None or entry.track != track:
+      stats.incr(PREFETCH_MISSES)
+      return None
+
+    stats.incr(PREFETCH_HITS)
+    return entry.metadata
+
+  def build(self, track: Track) -> Metadata:
+    metadata: Metadata = Metadata()
+
+    if art_url := self.player._get_art_url(track):
+      update_metadata(metadata, MetadataEntries.ART_URL, art_url)
+
+    return create_metadata_from_track(track, metadata)
+
+  def _submit(self, force: bool):
+    if self._executor:
+      self._executor.submit(self._prefetch, force)
+
+  def _prefetch(self, force: bool):
+    with adapter_calls(self.adapter):
+      self._prefetch_around(force)
+
+  def _prefetch_around(self, force: bool):
+    try:
+      current = self.adapter.get_current_track()
+      track_id = current.track_id if current else None
+
+      # the neighbours only change with the current track, unless told otherwise
+      if track_id == self._current and not force:
+        return
+
+      tracks = [
+        track
+        for track in (self.adapter.get_next_track(), self.adapter.get_previous_track())
+        if track
+      ]
+      entries = {track.track_id: self._get_entry(track) for track in tracks}
+
+      if current:
+        # keep what was prefetched for the track that's playing now
+        with self._lock:
+          if entry := self._entries.get(current.track_id):
+            entries.setdefault(current.track_id, entry)
+
+      with self._lock:
+        self._entries = entries
+        self._current = track_id
+
+    except Exception as e:
+      log.warning(f'Could not prefetch metadata: {e}')
+
+  def _get_entry(self, track: Track) -> Prefetched:
+    with self._lock:
+      entry = self._entries.get(track.track_id)
+
+    if entry is not None and entry.track == track:
+      return entry
+
+    return Prefetched(track, self.build(track))
+
+  def _on_properties_changed(self, name: str, changed: dict[str, Any], invalidated: list[str]):
+    if Property.Metadata in changed or Property.Metadata in invalidated:
+      self._submit(force=False)
@@ -0,0 +1,389 @@
+"""
+Record and replay adapter interactions.
+
+A Recorder logs every traced interface member called on a Server, and every
+adapter call those members make, with results, timings and D-Bus callers.
+A Replayer drives fresh interfaces with the same top-level calls against a
+stub adapter that answers with the recorded results, so adapter call counts
+and wall time can be compared between library versions.
+
+Replay a recording with `python -m mpris_server.recording <file>`.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import sys
+from argparse import ArgumentParser, Namespace
+from collections import Counter, defaultdict, deque
+from collections.abc import Callable, Iterator, Mapping
+from decimal import Decimal
+from enum import Enum
+from pathlib import Path, PurePath
+from threading import Lock, local
+from time import perf_counter
+from typing import Any, Final, IO, NamedTuple, Self, TYPE_CHECKING
+
+from gi.repository.GLib import Variant
+from strenum import StrEnum
+
+from .base import Album, Artist, Ordering, PlayState, Paths, Track
+from .enums import LoopStatus, Property
+from .interfaces.interface import CallFinished, MprisInterface, get_caller
+from .interfaces.player import Player
+from .interfaces.playlists import Playlists
+from .interfaces.root import Root
+from .interfaces.tracklist import TrackList
+from .mpris.metadata import MetadataObj
+
+
+if TYPE_CHECKING:
+  from .server import Server
+
+
+__all__ = [
+  'Recorder',
+  'RecordingAdapter',
+  'ReplayAdapter',
+  'ReplayResult',
+  'Replayer',
+]
+
+log = logging.getLogger(__name__)
+
+GZIP_SUFFIX: Final[str] = '.gz'
+SEPARATORS: Final[tuple[str, str]] = (',', ':')
+
+TOP_LEVEL: Final[int] = 0
+
+# types that can be restored from a recording
+RECORDABLE_TYPES: Final[dict[str, type]] = {
+  cls.__name__: cls
+  for cls in (Album, Artist, LoopStatus, MetadataObj, Ordering, PlayState, Property, Track)
+}
+
+INTERFACES: Final[tuple[type[MprisInterface], ...]] = (Root, Player, Playlists, TrackList)
+
+
+class RecordKind(StrEnum):
+  """Each record is a JSON list starting with its kind."""
+
+  ADAPTER = 'a'
+  CALL = 'c'
+  RETURN = 'r'
+
+
+def encode(val: Any) -> Any:
+  match val:
+    case None | bool() | int() | float() | str() if not isinstance(val, Enum):
+      return val
+
+    case Variant():
+      return {'$v': val.print_(True)}
+
+    case Decimal():
+      return {'$d': str(val)}
+
+    case Enum():
+      return {'$e': [type(val).__name__, val.value]}
+
+    case tuple() if hasattr(val, '_fields'):
+      return {'$n': [type(val).__name__, [encode(item) for item in val]]}
+
+    case tuple():
+      return {'$t': [encode(item) for item in val]}
+
+    case PurePath():
+      return {'$p': str(val)}
+
+    case Mapping():
+      return {'$m': [[encode(key), encode(item)] for key, item in val.items()]}
+
+    case list() | set() | frozenset():
+      return [encode(item) for item in val]
+
+  log.debug(f'Recording {type(val).__name__} as its repr.')
+  return repr(val)
+
+
+def decode(val: Any) -> Any:
+  match val:
+    case list():
+      return [decode(item) for item in val]
+
+    case {'$v': text}:
+      return Variant.parse(None, text, None, None)
+
+    case {'$d': text}:
+      return Decimal(text)
+
+    case {'$e': [name, value]}:
+      return RECORDABLE_TYPES[name](value)
+
+    case {'$n': [name, items]}:
+      return RECORDABLE_TYPES[name](*map(decode, items))
+
+    case {'$t': items}:
+      return tuple(map(decode, items))
+
+    case {'$p': path}:
+      return PurePath(path)
+
+    case {'$m': items}:
+      return {decode(key): decode(item) for key, item in items}
+
+  return val
+
+
+def open_recording(path: Paths, mode: str) -> IO[str]:
+  if str(path).endswith(GZIP_SUFFIX):
+    return gzip.open(path, f'{mode}t')
+
+  return open(path, mode)
+
+
+class RecordingAdapter:
+  """Wraps an adapter and records each call made on it."""
+
+  adapter: Any
+  recorder: Recorder
+
+  def __init__(self, adapter: Any, recorder: Recorder):
+    self.adapter = adapter
+    self.recorder = recorder
+
+  def __getattr__(self, name: str) -> Any:
+    attr = getattr(self.adapter, name)
+
+    if not callable(attr):
+      return attr
+
+    def record(*args, **kwargs) -> Any:
+      start = perf_counter()
+      result = attr(*args, **kwargs)
+      duration = perf_counter() - start
+
+      args = encode([*args, *kwargs.values()])
+      self.recorder.write(RecordKind.ADAPTER, name, args, encode(result), duration, get_caller())
+
+      return result
+
+    return record
+
+
+class Recorder:
+  """Record a Server's interface calls and the adapter calls they make."""
+
+  server: Server
+  path: Paths
+
+  _file: IO[str] | None
+  _wrapper: RecordingAdapter | None
+  _lock: Lock
+  _local: local
+  _seq: int
+
+  def __init__(self, server: Server, path: Paths):
+    self.server = server
+    self.path = path
+
+    self._file = None
+    self._wrapper = None
+    self._lock = Lock()
+    self._local = local()
+    self._seq = 0
+
+  def __enter__(self) -> Self:
+    self.start()
+    return self
+
+  def __exit__(self, *args):
+    self.stop()
+
+  def start(self):
+    self._file = open_recording(self.path, 'w')
+    recording = self._wrapper = RecordingAdapter(self.server.adapter, self)
+
+    self.server.adapter = recording
+
+    for interface in self.server.interfaces:
+      interface.adapter = recording
+      interface.add_call_hook(self._on_call)
+
+    log.info(f'Recording {self.server.name} to {self.path}')
+
+  def stop(self):
+    if not self._file:
+      return
+
+    if self.server.adapter is not self._wrapper:
+      raise RuntimeError(f"{self.server.name}'s adapter was wrapped again, stop that wrapper first.")
+
+    adapter = self._wrapper.adapter
+    self._wrapper = None
+    self.server.adapter = adapter
+
+    for interface in self.server.interfaces:
+      interface.adapter = adapter
+      interface.remove_call_hook(self._on_call)
+
+    self._file.close()
+    self._file = None
+
+  def write(self, *record: Any):
+    line = json.dumps(record, separators=SEPARATORS)
+
+    with self._lock:
+      if self._file:
+        self._file.write(line + '\n')
+
+  def _on_call(self, interface: MprisInterface, name: str, args: tuple) -> CallFinished:
+    depth = getattr(self._local, 'depth', TOP_LEVEL)
+    self._local.depth = depth + 1
+
+    with self._lock:
+      self._seq += 1
+      seq = self._seq
+
+    self.write(RecordKind.CALL, seq, interface.INTERFACE, name, encode(list(args)), get_caller(), depth)
+    start = perf_counter()
+
+    def finished():
+      self._local.depth = depth
+      self.write(RecordKind.RETURN, seq, perf_counter() - start)
+
+    return finished
+
+
+class ReplayAdapter:
+  """Stub adapter that answers each method with its recorded results, in order."""
+
+  results: defaultdict[str, deque[Any]]
+  last: dict[str, Any]
+  calls: Counter[str]
+
+  def __init__(self, results: Mapping[str, list[Any]]):
+    self.results = defaultdict(deque, {name: deque(values) for name, values in results.items()})
+    self.last = {}
+    self.calls = Counter()
+
+  def __getattr__(self, name: str) -> Callable[..., Any]:
+    def replay(*args, **kwargs) -> Any:
+      self.calls[name] += 1
+
+      # a library version can make more calls than were recorded
+      if queue := self.results[name]:
+        self.last[name] = queue.popleft()
+
+      return self.last.get(name)
+
+    return replay
+
+
+class Call(NamedTuple):
+  interface: str
+  name: str
+  args: list[Any]
+
+
+class ReplayResult(NamedTuple):
+  recorded_calls: Counter[str]
+  recorded_time: float
+  calls: Counter[str]
+  time: float
+
+
+class Replayer:
+  """Replay a recording against fresh interfaces and a ReplayAdapter."""
+
+  calls: list[Call]
+  results: dict[str, list[Any]]
+  recorded_calls: Counter[str]
+  recorded_time: float
+
+  def __init__(self, path: Paths):
+    self.calls = []
+    self.results = defaultdict(list)
+    self.recorded_calls = Counter()
+    self.recorded_time = 0.0
+
+    top_level: set[int] = set()
+
+    for record in self.read(path):
+      match record:
+        case [RecordKind.CALL, seq, interface, name, args, _, depth] if depth == TOP_LEVEL:
+          self.calls.append(Call(interface, name, decode(args)))
+          top_level.add(seq)
+
+        case [RecordKind.RETURN, seq, duration] if seq in top_level:
+          self.recorded_time += duration
+
+        case [RecordKind.ADAPTER, name, _, result, _, _]:
+          self.results[name].append(decode(result))
+          self.recorded_calls[name] += 1
+
+  @staticmethod
+  def read(path: Paths) -> Iterator[list[Any]]:
+    with open_recording(path, 'r') as file:
+      for line in file:
+        yield json.loads(line)
+
+  def run(self) -> ReplayResult:
+    adapter = ReplayAdapter(self.results)
+    interfaces: dict[str, MprisInterface] = {
+      cls.INTERFACE: cls(adapter=adapter)
+      for cls in INTERFACES
+    }
+
+    start = perf_counter()
+
+    for interface, name, args in self.calls:
+      try:
+        call(interfaces[interface], name, args)
+
+      except Exception as e:
+        log.warning(f'Replaying {interface}.{name} failed: {e}')
+
+    return ReplayResult(self.recorded_calls, self.recorded_time, adapter.calls, perf_counter() - start)
+
+
+def call(interface: MprisInterface, name: str, args: list[Any]) -> Any:
+  if name not in Property:
+    return getattr(interface, name)(*args)
+
+  if args:
+    return setattr(interface, name, *args)
+
+  return getattr(interface, name)
+
+
+def report(result: ReplayResult):
+  recorded_calls, recorded_time, calls, time = result
+
+  print(f'{"adapter method":<28} {"recorded":>10} {"replayed":>10}')
+
+  for name in sorted(recorded_calls.keys() | calls.keys()):
+    print(f'{name:<28} {recorded_calls[name]:>10} {calls[name]:>10}')
+
+  print(f'{"total":<28} {recorded_calls.total():>10} {calls.total():>10}')
+  print(f'wall time: recorded {recorded_time:.6f}s, replayed {time:.6f}s')
+
+
+def get_args() -> Namespace:
+  parser = ArgumentParser(prog='python -m mpris_server.recording', description=__doc__)
+  parser.add_argument('recording', type=Path)
+
+  return parser.parse_args()
+
+
+def main() -> int:
+  args = get_args()
+  replayer = Replayer(args.recording)
+  report(replayer.run())
+
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -1,26 +1,36 @@
 from __future__ import annotations
 
 import logging
-from collections.abc import Iterable
-from threading import Thread
-from typing import Final
-from weakref import finalize
+from collections.abc import Collection, Iterable, Iterator, Mapping
+from contextlib import closing
+from threading import Event, Thread, current_thread
+from typing import Final, Self
+from weakref import WeakMethod, finalize
 
 from gi.repository import GLib
+from gi.repository.GLib import Variant
 from pydbus import SessionBus, SystemBus
 from pydbus.bus import Bus
-from pydbus.publication import Publication
 
 from .adapters import MprisAdapter
-from .base import DBUS_PATH, Interface, NAME
-from .enums import BusType
+from .backends.backend import Backend, NameTaken, OnNameLost, get_signals, prune_signal
+from .backends.pydbus import PydbusBackend
+from .backends.spec import PropertySpec, get_interface_spec
+from .base import DBUS_PATH, Interface, NAME, Paths, dbus_emit_changes
+from .enums import BusType, Property
 from .events import EventAdapter
+from .instances import get_instance_name, instances
 from .interfaces.interface import MprisInterface
 from .interfaces.player import Player
 from .interfaces.playlists import Playlists
 from .interfaces.root import Root
 from .interfaces.tracklist import TrackList
+from .monitors import LoopMonitor, SeekMonitor
 from .mpris.compat import get_dbus_name
+from .poller import StatePoller
+from .prefetch import Prefetcher
+from .snapshot import get_restored, get_stale, load_snapshot, save_snapshot, take_snapshot
+from .stats import stats
 
 
 __all__ = [
@@ -33,6 +43,120 @@ log = logging.getLogger(__name__)
 
 DEFAULT_BUS_TYPE: Final[BusType] = BusType.SESSION
 NOW: Final[int] = 0
+JOIN_TIMEOUT: Final[float] = 1.0
+MAX_INSTANCE_ATTEMPTS: Final[int] = 16
+NAME_LOST: Final[str] = 'server.name_lost'
+
+
+class ServerResources:
+  """
+  What a Server has to release, kept apart from the Server itself.
+
+  The Server's finalizer only references this, so it can't keep the Server alive.
+  """
+
+  __slots__ = (
+    'backend',
+    'interfaces',
+    'loop',
+    'thread',
+  )
+
+  backend: Backend | None
+  interfaces: tuple[MprisInterface, ...]
+  loop: GLib.MainLoop | None
+  thread: Thread | None
+
+  def __init__(self, interfaces: tuple[MprisInterface, ...]):
+    self.backend = None
+    self.interfaces = interfaces
+    self.loop = None
+    self.thread = None
+
+
+def get_bus(bus_type: BusType = BusType.DEFAULT) -> Bus:
+  match bus_type:
+    case BusType.DEFAULT:
+      return SessionBus()
+
+    case BusType.SESSION:
+      return SessionBus()
+
+    case BusType.SYSTEM:
+      return SystemBus()
+
+  log.warning(f'Invalid bus "{bus_type}", using {BusType.DEFAULT}.')
+  return SessionBus()
+
+
+def prune_signals(interfaces: Iterable[MprisInterface]):
+  for interface in interfaces:
+    for sig in get_signals(interface):
+      prune_signal(sig, interface)
+
+
+def unpublish(resources: ServerResources):
+  if backend := resources.backend:
+    log.debug('Unpublishing MPRIS interface.')
+
+    resources.backend = None
+    backend.close()
+    prune_signals(resources.interfaces)
+
+
+def quit_loop(resources: ServerResources):
+  try:
+    if loop := resources.loop:
+      log.debug('Quitting GLib loop.')
+      resources.loop = None
+      loop.quit()
+
+  finally:
+    if (thread := resources.thread) and thread is not current_thread():
+      log.debug("Joining background thread.")
+      resources.thread = None
+      thread.join(timeout=JOIN_TIMEOUT)
+
+      if thread.is_alive():
+        log.warning(f'Background thread {thread.name} is still running.')
+
+
+def get_constants(
+  interface: MprisInterface,
+  properties: Mapping[str, PropertySpec],
+  constants: Collection[Property],
+) -> dict[str, Variant]:
+  values: dict[str, Variant] = {}
+
+  for name in constants:
+    if name not in properties or not properties[name].readable:
+      continue
+
+    # left to the adapter, there's no Variant for None
+    if (value := getattr(interface, name)) is None:
+      log.warning(f'Not keeping {interface.INTERFACE}.{name} constant, it returned None.')
+      continue
+
+    values[name] = Variant(properties[name].signature, value)
+
+  return values
+
+
+def get_name_lost_handler(server: Server) -> OnNameLost:
+  # the backend is kept by the server's finalizer, so it mustn't keep the server alive
+  method = WeakMethod(server._on_name_lost)
+
+  def on_name_lost(name: str):
+    if handler := method():
+      handler(name)
+
+  return on_name_lost
+
+
+def release(resources: ServerResources):
+  unpublish(resources)
+  quit_loop(resources)
+  prune_signals(resources.interfaces)
 
 
 class Server[A: MprisAdapter, E: EventAdapter, I: MprisInterface]:
@@ -47,10 +171,15 @@ class Server[A: MprisAdapter, E: EventAdapter, I: MprisInterface]:
   interfaces: tuple[I, ...]
 
   dbus_name: str
+  instance: int | None
+  seek_monitor: SeekMonitor | None
+  loop_monitor: LoopMonitor | None
+  poller: StatePoller | None
+  prefetcher: Prefetcher | None
 
-  _loop: GLib.MainLoop | None
-  _publication_token: Publication | None
-  _thread: Thread | None
+  _resources: ServerResources
+  _finalizer: finalize
+  _restored: dict[MprisInterface, dict[str, Variant]]
 
   def __init__(
     self,
@@ -69,93 +198,380 @@ class Server[A: MprisAdapter, E: EventAdapter, I: MprisInterface]:
     self.interfaces = self.root, self.player, self.playlists, self.tracklist, *interfaces
 
     self.dbus_name = get_dbus_name(self.name)
+    self.instance = None
+    self.seek_monitor = None
+    self.loop_monitor = None
+    self.poller = None
+    self.prefetcher = None
 
-    self._loop = None
-    self._publication_token = None
-    self._thread = None
+    self._resources = ServerResources(self.interfaces)
+    self._finalizer = finalize(self, release, self._resources)
+    self._restored = {}
 
     self.set_event_adapter(events)
 
-    finalize(self, self.__del__)
+  def __enter__(self) -> Self:
+    return self
 
-  def __del__(self):
-    self.quit()
+  def __exit__(self, *args):
+    self.close()
 
-  def _get_dbus_paths(self) -> Iterable[tuple[str, I]]:
-    for interface in self.interfaces:
-      yield DBUS_PATH, interface
+  @property
+  def closed(self) -> bool:
+    return not self._finalizer.alive
 
-  def _run_loop(self):
-    self._loop = GLib.MainLoop()
+  @property
+  def backend(self) -> Backend | None:
+    return self._resources.backend
+
+  @property
+  def bus_name(self) -> str:
+    if self.instance is None:
+      return f'{Interface.Root}.{self.dbus_name}'
+
+    return f'{Interface.Root}.{self.dbus_name}.{get_instance_name(self.instance)}'
+
+  @property
+  def registered(self) -> bool:
+    return self._resources.backend is not None
+
+  @property
+  def published(self) -> bool:
+    backend = self._resources.backend
+    return backend is not None and self.bus_name in backend.names
+
+  def _run_loop(self, loop: GLib.MainLoop, running: Event | None = None):
+    GLib.idle_add(self._on_loop_running, loop, running)
 
     try:
-      self._loop.run()
+      loop.run()
 
     finally:
       self.quit_loop()
 
+  def _on_loop_running(self, loop: GLib.MainLoop, running: Event | None) -> bool:
+    # quit() is ignored by a loop that isn't running yet, so a quit_loop() that
+    # came before run() is honored here instead
+    if self._resources.loop is not loop:
+      loop.quit()
+
+    if running:
+      running.set()
+
+    return GLib.SOURCE_REMOVE
+
+  def _set_name(self, name: str):
+    self.name = name
+    self.dbus_name = get_dbus_name(name)
+
+    for interface in self.interfaces:
+      interface.name = name
+
+  def set_adapter(self, adapter: A | None):
+    self.adapter = adapter
+
+    for interface in self.interfaces:
+      interface.adapter = adapter
+
+    if self.registered:
+      self.refresh_constants()
+
+  def refresh_constants(self):
+    """Read the adapter's constant properties again, and emit the ones that changed."""
+    constants = self.adapter.get_constant_properties() if self.adapter else ()
+
+    for interface in self.interfaces:
+      properties = get_interface_spec(type(interface)).properties
+      previous = interface.constants
+
+      # cleared first, so the getters reach the adapter
+      interface.constants = {}
+      interface.constants = {
+        **self._restored.get(interface, {}),
+        **get_constants(interface, properties, constants),
+      }
+
+      changed = [
+        name
+        for name, value in interface.constants.items()
+        if name in previous and previous[name] != value
+      ]
+
+      if changed and self.registered:
+        dbus_emit_changes(interface, changed)
+
+  @property
+  def restored(self) -> bool:
+    return bool(self._restored)
+
+  def save_snapshot(self, path: Paths):
+    """Save the Root and Player state, for restore_snapshot() to publish after a restart."""
+    save_snapshot(take_snapshot(self.interfaces), path)
+
+  def restore_snapshot(self, path: Paths) -> bool:
+    """
+    Serve the state saved at path until reconcile() is called, so the player
+    can be published before the app is ready. Returns whether a snapshot was found.
+    """
+    if not (snapshot := load_snapshot(path)):
+      return False
+
+    self._restored = {
+      interface: restored
+      for interface in self.interfaces
+      if (restored := get_restored(interface, snapshot))
+    }
+
+    for interface, restored in self._restored.items():
+      # the adapter's constants still take precedence
+      interface.constants = {**restored, **interface.constants}
+
+    log.debug(f'Restored {self.name} from {path}.')
+    return True
+
+  def reconcile(self):
+    """Stop serving the restored snapshot, and emit properties that differ from it."""
+    restored, self._restored = self._restored, {}
+    self.refresh_constants()
+
+    for interface, values in restored.items():
+      if (stale := get_stale(interface, values)) and self.registered:
+        dbus_emit_changes(interface, stale)
+
   def set_event_adapter(self, events: E):
     self.events = events
 
-  def publish(self, bus_type: BusType = BusType.DEFAULT):
-    log.debug(f'Connecting to D-Bus {bus_type} bus...')
-    bus: Bus
+  def start_seek_monitor(self, **options) -> SeekMonitor:
+    """Emit Player.Seeked for seeks that the adapter doesn't report, see SeekMonitor."""
+    self.stop_seek_monitor()
 
-    match bus_type:
-      case BusType.DEFAULT:
-        bus = SessionBus()
+    self.seek_monitor = SeekMonitor(self.player, self.events, **options)
+    self.seek_monitor.start()
 
-      case BusType.SESSION:
-        bus = SessionBus()
+    return self.seek_monitor
 
-      case BusType.SYSTEM:
-        bus = SystemBus()
+  def stop_seek_monitor(self):
+    if self.seek_monitor:
+      self.seek_monitor.stop()
+      self.seek_monitor = None
 
-      case _:
-        log.warning(f'Invalid bus "{bus_type}", using {BusType.DEFAULT}.')
-        bus = SessionBus()
+  def start_loop_monitor(self, **options) -> LoopMonitor:
+    """Measure main loop lag and the slowest calls, see LoopMonitor."""
+    self.stop_loop_monitor()
 
-    log.debug(f'MPRIS server connecting to D-Bus {bus_type} bus.')
-    name = f'{Interface.Root}.{self.dbus_name}'
-    paths = self._get_dbus_paths()
+    self.loop_monitor = LoopMonitor(self.interfaces, **options)
+    self.loop_monitor.start()
 
-    self._publication_token = bus.publish(name, *paths)
-    log.info(f'Published {name} to D-Bus {bus_type} bus.')
+    return self.loop_monitor
+
+  def stop_loop_monitor(self):
+    if self.loop_monitor:
+      self.loop_monitor.stop()
+      self.loop_monitor = None
+
+  def start_poller(self, **options) -> StatePoller:
+    """Poll the adapter and emit changed properties, see StatePoller."""
+    self.stop_poller()
+
+    self.poller = StatePoller(self, **options)
+    self.poller.start()
+
+    return self.poller
+
+  def stop_poller(self):
+    if self.poller:
+      self.poller.stop()
+      self.poller = None
+
+  def start_prefetcher(self) -> Prefetcher:
+    """Build the next and previous tracks' metadata ahead of track changes, see Prefetcher."""
+    self.stop_prefetcher()
+
+    self.prefetcher = Prefetcher(self.player)
+    self.prefetcher.start()
+
+    return self.prefetcher
+
+  def stop_prefetcher(self):
+    if self.prefetcher:
+      self.prefetcher.stop()
+      self.prefetcher = None
+
+  def register(self, backend: Backend):
+    """Export the interfaces through a backend, without owning a bus name yet."""
+    if self.registered:
+      raise RuntimeError(f'{self.name} is already registered.')
+
+    self.refresh_constants()
+    backend.register(DBUS_PATH, self.interfaces)
+    backend.on_name_lost = get_name_lost_handler(self)
+    self._resources.backend = backend
+
+  def request_name(self):
+    """
+    Own this server's bus name on the backend it's registered on.
+
+    If another player owns it, an instance name like `...MyPlayer.instance1234` is owned instead.
+    """
+    if not self.registered:
+      raise RuntimeError(f'{self.name} is not registered on a bus.')
+
+    try:
+      self._resources.backend.request_name(self.bus_name)
+
+    except NameTaken:
+      log.info(f'{self.bus_name} is owned by another player, publishing an instance of it.')
+      self._request_instance(taken=self.instance)
+
+  def _request_instance(self, taken: int | None = None):
+    """Own the first instance name that's free."""
+    backend = self._resources.backend
+
+    with closing(self._get_instances(taken)) as attempts:
+      for _ in attempts:
+        try:
+          backend.request_name(self.bus_name)
+          return
+
+        except NameTaken:
+          # owned outside this process, like by a player with the same pid in another namespace
+          log.debug(f'{self.bus_name} is owned elsewhere, trying the next instance.')
+
+    raise NameTaken(f'Could not own an instance of {self.bus_name}.')
+
+  def _get_instances(self, taken: int | None = None) -> Iterator[int]:
+    """Allocate the instance numbers to try in turn, releasing the ones that weren't owned when closed."""
+    # released when done, so the registry doesn't hand them out again while trying
+    unowned: list[int] = [] if taken is None else [taken]
+    self.instance = None
+
+    try:
+      for _ in range(MAX_INSTANCE_ATTEMPTS):
+        self.instance = instances.allocate(self.dbus_name)
+        yield self.instance
+
+        # only reached when the caller tries again, after the name was taken
+        unowned.append(self.instance)
+
+      self.instance = None
+
+    finally:
+      for index in unowned:
+        instances.release(self.dbus_name, index)
+
+  def _release_instance(self):
+    if self.instance is not None:
+      instances.release(self.dbus_name, self.instance)
+      self.instance = None
+
+  def _on_name_lost(self, name: str):
+    if name != self.bus_name:
+      return
+
+    stats.incr(NAME_LOST)
+
+    # the name belongs to the player that replaced this one now
+    try:
+      self._request_instance(taken=self.instance)
+
+    except Exception as e:
+      log.error(f'Could not publish {self.name} again after losing {name}: {e}')
+      return
+
+    log.info(f'Published {self.name} again as {self.bus_name}.')
+
+  def publish(self, bus_type: BusType = BusType.DEFAULT, backend: Backend | None = None):
+    if not self.registered:
+      if backend is None:
+        log.debug(f'MPRIS server connecting to D-Bus {bus_type} bus.')
+        backend = PydbusBackend(get_bus(bus_type))
+
+      self.register(backend)
+
+    self.request_name()
+    log.info(f'Published {self.bus_name} to D-Bus {bus_type} bus.')
 
   def unpublish(self):
-    if self._publication_token:
-      log.debug('Unpublishing MPRIS interface.')
+    unpublish(self._resources)
+    self._release_instance()
+
+  def republish(self):
+    """Release and own the bus name again, keeping the connection and objects."""
+    if not self.registered:
+      return self.publish()
+
+    self._resources.backend.release_name(self.bus_name)
+    self.request_name()
+    log.info(f'Republished {self.bus_name}.')
+
+  def rename(self, name: str):
+    """Change the server's identity, moving a published server to its new bus name."""
+    published = self.published
+    old_name = self.name
+    old_dbus_name = self.dbus_name
+    old_bus_name = self.bus_name
+    old_instance = self.instance
+    self._set_name(name)
 
-      self._publication_token.unpublish()
-      self._publication_token = None
+    if self.dbus_name != old_dbus_name:
+      # instances are numbered per name
+      self.instance = None
+
+    if published and self.bus_name != old_bus_name:
+      # own the new name before releasing the old one, so the player is never absent
+      try:
+        self.request_name()
+
+      except Exception:
+        self._set_name(old_name)
+        self.instance = old_instance
+        raise
+
+      self._resources.backend.release_name(old_bus_name)
+      log.info(f'Renamed {old_name} to {self.bus_name}.')
+
+    if self.dbus_name != old_dbus_name and old_instance is not None:
+      instances.release(old_dbus_name, old_instance)
+
+    if Property.Identity in self.root.constants:
+      self.refresh_constants()
+
+    elif self.registered:
+      dbus_emit_changes(self.root, [Property.Identity])
 
   def loop(self, bus_type: BusType = BusType.DEFAULT, background: bool = False):
-    if not self._publication_token:
+    if not self.published:
       self.publish(bus_type)
 
+    loop = self._resources.loop = GLib.MainLoop()
+
     if background:
       log.debug("Entering D-Bus loop in background thread.")
-      self._thread = Thread(target=self._run_loop, name=self.name)
-      self._thread.start()
+      running = Event()
+      thread = self._resources.thread = Thread(target=self._run_loop, args=(loop, running), name=self.name)
+      thread.start()
+
+      # return once the loop is running, so quit_loop() can stop it
+      while not running.wait(JOIN_TIMEOUT) and thread.is_alive():
+        pass
 
     else:
       log.debug("Entering D-Bus loop in foreground thread.")
-      self._run_loop()
+      self._run_loop(loop)
 
   def quit_loop(self):
-    try:
-      if self._loop:
-        log.debug('Quitting GLib loop.')
-        self._loop.quit()
-        self._loop = None
-
-    finally:
-      if self._thread:
-        log.debug("Joining background thread.")
-        self._thread.join(timeout=NOW)
-        self._thread = None
+    quit_loop(self._resources)
 
   def quit(self):
     log.debug('Unpublishing and quitting loop.')
+    self.stop_seek_monitor()
+    self.stop_loop_monitor()
+    self.stop_poller()
+    self.stop_prefetcher()
     self.unpublish()
     self.quit_loop()
+
+  def close(self):
+    """Quit, and release everything the server holds. Servers can't be used after closing."""
+    self.quit()
+    self._finalizer()
@@ -0,0 +1,354 @@
+"""
+Share hot player state with an out-of-process engine through a memory-mapped block.
+
+The engine writes position, rate, volume, playback status, capability flags and
+a metadata generation counter into a 64 byte block in a file, usually under
+/dev/shm, and bumps the generation whenever the metadata changes. The MPRIS
+process maps the same file, and reads it without syscalls.
+
+Layout, little-endian, one cache line:
+
+  offset  type     field
+  0       char[4]  magic, b'MPSB'
+  4       u16      version, 1
+  6       u16      reserved
+  8       u64      sequence, odd while a write is in progress
+  16      i64      position, in microseconds
+  24      f64      position_time, CLOCK_MONOTONIC seconds the position was sampled at, or 0
+  32      f64      rate
+  40      f64      volume
+  48      u64      generation
+  56      u32      flags, see Capability
+  60      u8       status, see STATUSES
+  61      u8[3]    padding
+
+Writers increment the sequence, write the fields, then increment it again. Readers
+retry until they see the same even sequence before and after reading the fields.
+
+The engine has to create its StateWriter before the MPRIS process opens a
+StateBlock on the same path. Until the writer has written the header, opening
+the block raises FileNotFoundError or ValueError, and can be retried.
+"""
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+import struct
+from enum import IntFlag
+from time import monotonic
+from typing import Final, NamedTuple, Self
+
+from gi.repository import GLib
+
+from .adapters import DEFAULT_ADAPTER_NAME, MprisAdapter
+from .base import Paths, PlayState, Position, Rate, Volume, dbus_emit_changes
+from .enums import Property
+from .interfaces.player import Player
+
+
+__all__ = [
+  'Capability',
+  'SharedState',
+  'SharedStateAdapter',
+  'SharedStateWatcher',
+  'StateBlock',
+  'StateWriter',
+]
+
+log = logging.getLogger(__name__)
+
+MAGIC: Final[bytes] = b'MPSB'
+VERSION: Final[int] = 1
+BLOCK_SIZE: Final[int] = 64
+
+HEADER: Final[struct.Struct] = struct.Struct('<4sHH')
+SEQUENCE: Final[struct.Struct] = struct.Struct('<Q')
+FIELDS: Final[struct.Struct] = struct.Struct('<qdddQIB3x')
+SEQUENCE_OFFSET: Final[int] = HEADER.size
+FIELDS_OFFSET: Final[int] = SEQUENCE_OFFSET + SEQUENCE.size
+
+MAX_RETRIES: Final[int] = 1_000
+MICROSECONDS: Final[int] = 1_000_000
+MILLISECONDS: Final[int] = 1_000
+DEFAULT_WATCH_INTERVAL: Final[float] = 0.05
+NOT_SAMPLED: Final[float] = 0.0
+NO_SOURCE: Final[int] = 0
+
+STATUSES: Final[tuple[PlayState, ...]] = (PlayState.STOPPED, PlayState.PLAYING, PlayState.PAUSED)
+
+
+class Capability(IntFlag):
+  CONTROL = 1 << 0
+  GO_NEXT = 1 << 1
+  GO_PREVIOUS = 1 << 2
+  PAUSE = 1 << 3
+  PLAY = 1 << 4
+  SEEK = 1 << 5
+
+
+CAPABILITY_PROPS: Final[dict[Capability, Property]] = {
+  Capability.CONTROL: Property.CanControl,
+  Capability.GO_NEXT: Property.CanGoNext,
+  Capability.GO_PREVIOUS: Property.CanGoPrevious,
+  Capability.PAUSE: Property.CanPause,
+  Capability.PLAY: Property.CanPlay,
+  Capability.SEEK: Property.CanSeek,
+}
+
+
+class SharedState(NamedTuple):
+  position: Position = 0
+  position_time: float = NOT_SAMPLED
+  rate: Rate = 1.0
+  volume: Volume = 1.0
+  generation: int = 0
+  flags: int = 0
+  status: int = 0
+
+  @property
+  def playstate(self) -> PlayState:
+    if self.status < len(STATUSES):
+      return STATUSES[self.status]
+
+    return PlayState.STOPPED
+
+  def get_position(self, now: float | None = None) -> Position:
+    """The position, moved ahead by the time since it was sampled while playing."""
+    if self.position_time == NOT_SAMPLED or self.playstate != PlayState.PLAYING:
+      return self.position
+
+    if now is None:
+      now = monotonic()
+
+    elapsed = max(now - self.position_time, 0.0)
+    return self.position + round(elapsed * self.rate * MICROSECONDS)
+
+  def has(self, capability: Capability) -> bool:
+    return bool(self.flags & capability)
+
+
+def open_block(path: Paths, writable: bool) -> mmap.mmap:
+  flags = os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY
+  fd = os.open(path, flags, 0o600)
+
+  try:
+    if writable and os.fstat(fd).st_size < BLOCK_SIZE:
+      os.ftruncate(fd, BLOCK_SIZE)
+
+    access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+    return mmap.mmap(fd, BLOCK_SIZE, access=access)
+
+  finally:
+    # the mapping stays valid after its file is closed
+    os.close(fd)
+
+
+class StateBlock:
+  """Reads a state block mapped from path, once its StateWriter has been created."""
+
+  path: Paths
+
+  _map: mmap.mmap
+  _last: SharedState
+
+  def __init__(self, path: Paths):
+    self.path = path
+    self._map = open_block(path, writable=False)
+    self._last = SharedState()
+
+    magic, version, _ = HEADER.unpack_from(self._map)
+
+    if (magic, version) != (MAGIC, VERSION):
+      self.close()
+      raise ValueError(f"{path} is not a version {VERSION} state block, or its writer hasn't started yet.")
+
+  def __enter__(self) -> Self:
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def read(self) -> SharedState:
+    """A consistent copy of the fields, or the last one if the writer never finishes."""
+    block = self._map
+
+    for _ in range(MAX_RETRIES):
+      before, = SEQUENCE.unpack_from(block, SEQUENCE_OFFSET)
+
+      if before & 1:
+        continue
+
+      fields = FIELDS.unpack_from(block, FIELDS_OFFSET)
+      after, = SEQUENCE.unpack_from(block, SEQUENCE_OFFSET)
+
+      if before == after:
+        self._last = SharedState(*fields)
+        return self._last
+
+    log.debug(f'State block {self.path} is being written to, using the last read.')
+    return self._last
+
+  def close(self):
+    self._map.close()
+
+
+class StateWriter:
+  """Writes a state block at path, from the engine's side. There should only be one writer."""
+
+  path: Paths
+  state: SharedState
+
+  _map: mmap.mmap
+  _sequence: int
+
+  def __init__(self, path: Paths):
+    self.path = path
+    self.state = SharedState()
+
+    self._map = open_block(path, writable=True)
+    self._sequence, = SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)
+    self._sequence += self._sequence & 1
+
+    HEADER.pack_into(self._map, 0, MAGIC, VERSION, 0)
+    self.write()
+
+  def __enter__(self) -> Self:
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def write(self, **changes):
+    """Update some fields, like `write(position=0, generation=state.generation + 1)`."""
+    self.state = self.state._replace(**changes)
+
+    SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, self._sequence + 1)
+    FIELDS.pack_into(self._map, FIELDS_OFFSET, *self.state)
+    self._sequence += 2
+    SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, self._sequence)
+
+  def close(self):
+    self._map.close()
+
+
+class SharedStateAdapter(MprisAdapter):
+  """
+  Answers playback state from a StateBlock.
+
+  Subclass it and implement the rest of MprisAdapter, like metadata(),
+  as usual. Position, rate, volume, status and capabilities are read from the block.
+  """
+
+  block: StateBlock
+
+  def __init__(self, block: StateBlock, name: str = DEFAULT_ADAPTER_NAME):
+    super().__init__(name)
+    self.block = block
+
+  def can_control(self) -> bool:
+    return self.block.read().has(Capability.CONTROL)
+
+  def can_go_next(self) -> bool:
+    return self.block.read().has(Capability.GO_NEXT)
+
+  def can_go_previous(self) -> bool:
+    return self.block.read().has(Capability.GO_PREVIOUS)
+
+  def can_pause(self) -> bool:
+    return self.block.read().has(Capability.PAUSE)
+
+  def can_play(self) -> bool:
+    return self.block.read().has(Capability.PLAY)
+
+  def can_seek(self) -> bool:
+    return self.block.read().has(Capability.SEEK)
+
+  def get_current_position(self) -> Position:
+    return self.block.read().get_position()
+
+  def get_playstate(self) -> PlayState:
+    return self.block.read().playstate
+
+  def get_rate(self) -> Rate:
+    return self.block.read().rate
+
+  def get_volume(self) -> Volume:
+    return self.block.read().volume
+
+
+def get_changes(previous: SharedState, current: SharedState) -> list[Property]:
+  changes: list[Property] = []
+
+  if current.generation != previous.generation:
+    changes.append(Property.Metadata)
+
+  if current.status != previous.status:
+    changes.append(Property.PlaybackStatus)
+
+  if current.rate != previous.rate:
+    changes.append(Property.Rate)
+
+  if current.volume != previous.volume:
+    changes.append(Property.Volume)
+
+  if toggled := current.flags ^ previous.flags:
+    changes += [prop for capability, prop in CAPABILITY_PROPS.items() if toggled & capability]
+
+  return changes
+
+
+class SharedStateWatcher:
+  """
+  Emit Player properties when the engine changes them in a StateBlock.
+
+  The block is read on the loop at a fixed interval, which costs no syscalls,
+  and a new metadata generation emits Metadata. Position isn't emitted, per the spec.
+  """
+
+  player: Player
+  block: StateBlock
+  interval: float
+
+  _state: SharedState
+  _source: int
+
+  def __init__(self, player: Player, block: StateBlock, interval: float = DEFAULT_WATCH_INTERVAL):
+    self.player = player
+    self.block = block
+    self.interval = interval
+
+    self._state = SharedState()
+    self._source = NO_SOURCE
+
+  @property
+  def running(self) -> bool:
+    return self._source != NO_SOURCE
+
+  def start(self):
+    if self.running:
+      return
+
+    self._state = self.block.read()
+    self._source = GLib.timeout_add(round(self.interval * MILLISECONDS), self._on_timeout)
+
+  def stop(self):
+    if self._source:
+      GLib.source_remove(self._source)
+      self._source = NO_SOURCE
+
+  def check(self):
+    state = self.block.read()
+    previous, self._state = self._state, state
+
+    if changes := get_changes(previous, state):
+      dbus_emit_changes(self.player, changes)
+
+  def _on_timeout(self) -> bool:
+    try:
+      self.check()
+
+    except Exception as e:
+      log.exception(f'Error while watching {self.block.path}: {e}')
+
+    return GLib.SOURCE_CONTINUE
@@ -0,0 +1,156 @@
+"""
+Persist the last known Root and Player state, so a restarted player can be published from it.
+
+Snapshots are a single serialized GVariant of type `a{sa{sv}}`, mapping each
+interface name to its property values, after a small header. They're written
+atomically, and snapshots that can't be read are ignored.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import struct
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Final
+
+from gi.repository import GLib
+from gi.repository.GLib import Variant
+
+from .backends.spec import get_interface_spec
+from .base import Interface, ON_PLAYER_PROPS, ON_ROOT_PROPS, Paths, Properties
+from .enums import Property
+from .interfaces.interface import MprisInterface
+
+
+__all__ = [
+  'Snapshot',
+  'get_restored',
+  'get_stale',
+  'load_snapshot',
+  'save_snapshot',
+  'take_snapshot',
+]
+
+log = logging.getLogger(__name__)
+
+MAGIC: Final[bytes] = b'MPRS'
+VERSION: Final[int] = 1
+HEADER: Final[struct.Struct] = struct.Struct('<4sB')
+SNAPSHOT_TYPE: Final[str] = 'a{sa{sv}}'
+TEMP_SUFFIX: Final[str] = '.tmp'
+
+SNAPSHOT_PROPS: Final[dict[Interface, Properties]] = {
+  Interface.Root: ON_ROOT_PROPS,
+  Interface.Player: ON_PLAYER_PROPS,
+}
+
+# the spec says clients must not expect Position in PropertiesChanged
+NOT_EMITTED: Final[frozenset[Property]] = frozenset({Property.Position})
+
+type Snapshot = dict[str, dict[str, Variant]]
+
+
+def box(interface: MprisInterface, name: str, value: object) -> Variant:
+  if isinstance(value, Variant):
+    return value
+
+  signature = get_interface_spec(type(interface)).properties[name].signature
+  return Variant(signature, value)
+
+
+def take_snapshot(interfaces: Iterable[MprisInterface]) -> Snapshot:
+  """Read the snapshotted properties of each interface, skipping ones that fail."""
+  snapshot: Snapshot = {}
+
+  for interface in interfaces:
+    if not (props := SNAPSHOT_PROPS.get(interface.INTERFACE)):
+      continue
+
+    values = snapshot[interface.INTERFACE] = {}
+
+    for prop in props:
+      try:
+        values[prop] = box(interface, prop, getattr(interface, prop))
+
+      except Exception as e:
+        log.warning(f'Could not snapshot {interface.INTERFACE}.{prop}: {e}')
+
+  return snapshot
+
+
+def save_snapshot(snapshot: Snapshot, path: Paths):
+  variant = Variant(SNAPSHOT_TYPE, snapshot)
+  data = HEADER.pack(MAGIC, VERSION) + variant.get_data_as_bytes().get_data()
+
+  path = Path(path)
+  temp = path.with_name(f'{path.name}{TEMP_SUFFIX}')
+  temp.write_bytes(data)
+  os.replace(temp, path)
+
+
+def load_snapshot(path: Paths) -> Snapshot | None:
+  try:
+    data = Path(path).read_bytes()
+
+  except FileNotFoundError:
+    return None
+
+  except OSError as e:
+    log.warning(f'Ignoring snapshot {path} that could not be read: {e}')
+    return None
+
+  if len(data) < HEADER.size or HEADER.unpack_from(data) != (MAGIC, VERSION):
+    log.warning(f'Ignoring snapshot {path} with an unknown format.')
+    return None
+
+  body = GLib.Bytes.new(data[HEADER.size:])
+  variant = Variant.new_from_bytes(GLib.VariantType(SNAPSHOT_TYPE), body, False)
+
+  if not variant.is_normal_form():
+    log.warning(f'Ignoring corrupt snapshot {path}.')
+    return None
+
+  return dict(get_entries(variant))
+
+
+def get_entries(variant: Variant) -> Iterable[tuple[str, dict[str, Variant]]]:
+  # unpack() would unbox the values, they're kept as Variants
+  for index in range(variant.n_children()):
+    entry = variant.get_child_value(index)
+    values = entry.get_child_value(1)
+
+    yield entry.get_child_value(0).get_string(), {
+      value.get_child_value(0).get_string(): value.get_child_value(1).get_variant()
+      for value in map(values.get_child_value, range(values.n_children()))
+    }
+
+
+def get_restored(interface: MprisInterface, snapshot: Snapshot) -> dict[str, Variant]:
+  """The snapshot's values that still match the interface's properties."""
+  properties = get_interface_spec(type(interface)).properties
+  values = snapshot.get(interface.INTERFACE, {})
+
+  return {
+    name: value
+    for name, value in values.items()
+    if name in properties and value.get_type_string() == properties[name].signature
+  }
+
+
+def get_stale(interface: MprisInterface, restored: dict[str, Variant]) -> Properties:
+  """The restored properties whose live values differ, and need to be emitted."""
+  stale: Properties = []
+
+  for name, value in restored.items():
+    if name in NOT_EMITTED or name in interface.constants:
+      continue
+
+    try:
+      if box(interface, name, getattr(interface, name)) != value:
+        stale.append(name)
+
+    except Exception as e:
+      log.warning(f'Could not reconcile {interface.INTERFACE}.{name}: {e}')
+
+  return stale
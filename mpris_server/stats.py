@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Sequence
+from math import ceil
+from threading import Lock
+from typing import Final
+
+
+__all__ = [
+  'Stats',
+  'get_percentile',
+  'get_percentiles',
+]
+
+DEFAULT_PERCENTILES: Final[tuple[float, ...]] = (50, 90, 99)
+
+
+class Stats:
+  """Process-wide counters and gauges for events worth keeping an eye on."""
+
+  counters: Counter[str]
+  gauges: dict[str, float]
+
+  _lock: Lock
+
+  def __init__(self):
+    self.counters = Counter()
+    self.gauges = {}
+    self._lock = Lock()
+
+  def incr(self, name: str, amount: int = 1):
+    with self._lock:
+      self.counters[name] += amount
+
+  def get(self, name: str) -> int:
+    return self.counters[name]
+
+  def set_gauge(self, name: str, value: float):
+    with self._lock:
+      self.gauges[name] = value
+
+  def get_gauge(self, name: str) -> float | None:
+    return self.gauges.get(name)
+
+  def snapshot(self) -> dict[str, float]:
+    with self._lock:
+      return {**self.counters, **self.gauges}
+
+  def reset(self):
+    with self._lock:
+      self.counters.clear()
+      self.gauges.clear()
+
+
+def get_percentile(samples: Sequence[float], percentile: float) -> float:
+  """Nearest-rank percentile of already sorted samples."""
+  if not samples:
+    return 0.0
+
+  rank = ceil(percentile / 100 * len(samples))
+  return samples[max(rank, 1) - 1]
+
+
+def get_percentiles(
+  samples: Sequence[float],
+  percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+) -> dict[float, float]:
+  samples = sorted(samples)
+
+  return {
+    percentile: get_percentile(samples, percentile)
+    for percentile in percentiles
+  }
+
+
+stats: Final[Stats] = Stats()
@@ -0,0 +1,607 @@
+"""
+Host many players across worker processes.
+
+A Supervisor spreads players over a pool of worker processes, so they aren't
+limited by one GIL and a slow player can't stall the others. Each worker runs
+its own GLib loop and owns a bus connection per player, serving properties from
+state the parent sends it. Calls from D-Bus clients are sent back to the parent.
+
+Messages are small pickled tuples of (op, player name, payload) sent over pipes,
+and updates only carry the state that changed. Workers that crash are restarted
+with their players' latest state, and players are moved off workers whose loop
+falls behind.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+from collections.abc import Callable, Iterable
+from multiprocessing.connection import Connection, wait
+from multiprocessing.process import BaseProcess
+from threading import Event, RLock, Thread
+from time import monotonic
+from typing import Any, Final, NamedTuple, Self
+
+from gi.repository import GLib
+from strenum import StrEnum
+
+from .adapters import MprisAdapter
+from .backends.pydbus import PydbusBackend
+from .base import DEFAULT_DESKTOP, DEFAULT_RATE, MIME_TYPES, PlayState, URI
+from .poller import StatePoller
+from .pool import get_session_address
+from .server import Server
+
+
+__all__ = [
+  'Command',
+  'StateAdapter',
+  'Supervisor',
+]
+
+log = logging.getLogger(__name__)
+
+MILLISECONDS: Final[int] = 1_000
+
+START_METHOD: Final[str] = 'spawn'
+DEFAULT_OVERLOAD_LAG: Final[float] = 0.1
+DEFAULT_REPORT_INTERVAL: Final[float] = 1.0
+REBALANCE_COOLDOWN: Final[float] = 5.0
+WAIT_TIMEOUT: Final[float] = 0.5
+JOIN_TIMEOUT: Final[float] = 1.0
+
+type State = dict[str, Any]
+
+# adapter methods that are answered from the state the parent sent
+DEFAULT_STATE: Final[State] = {
+  'can_control': True,
+  'can_fullscreen': False,
+  'can_go_next': False,
+  'can_go_previous': False,
+  'can_pause': False,
+  'can_play': False,
+  'can_quit': False,
+  'can_raise': False,
+  'can_seek': False,
+  'get_art_url': '',
+  'get_current_position': 0,
+  'get_current_track': None,
+  'get_desktop_entry': DEFAULT_DESKTOP,
+  'get_fullscreen': False,
+  'get_maximum_rate': DEFAULT_RATE,
+  'get_mime_types': MIME_TYPES,
+  'get_minimum_rate': DEFAULT_RATE,
+  'get_next_track': None,
+  'get_playstate': PlayState.STOPPED,
+  'get_previous_track': None,
+  'get_rate': DEFAULT_RATE,
+  'get_shuffle': False,
+  'get_stream_title': '',
+  'get_uri_schemes': URI,
+  'get_volume': 1.0,
+  'has_tracklist': False,
+  'is_mute': False,
+  'is_playlist': False,
+  'is_repeating': False,
+  'metadata': None,
+}
+
+# adapter methods that are sent to the parent
+COMMANDS: Final[tuple[str, ...]] = (
+  'next',
+  'open_uri',
+  'pause',
+  'play',
+  'previous',
+  'quit',
+  'resume',
+  'seek',
+  'set_fullscreen',
+  'set_loop_status',
+  'set_maximum_rate',
+  'set_minimum_rate',
+  'set_mute',
+  'set_raise',
+  'set_rate',
+  'set_repeating',
+  'set_shuffle',
+  'set_volume',
+  'stop',
+)
+
+
+class Op(StrEnum):
+  ADD = 'a'
+  UPDATE = 'u'
+  REMOVE = 'r'
+  STOP = 's'
+  COMMAND = 'c'
+  LOAD = 'l'
+  REMOVED = 'd'
+  FAILED = 'f'
+
+
+class Command(NamedTuple):
+  player: str
+  method: str
+  args: tuple[Any, ...]
+
+
+type Message = tuple[str, str, Any]
+type OnCommand = Callable[[Command], None]
+
+
+class StateAdapter(MprisAdapter):
+  """Answers from state sent by the supervisor, and sends commands back to it."""
+
+  state: State
+  send: Callable[[Message], None]
+
+  def __init__(self, name: str, state: State, send: Callable[[Message], None]):
+    super().__init__(name)
+    self.state = state
+    self.send = send
+
+
+def get_state(name: str) -> Callable[..., Any]:
+  def getter(self: StateAdapter, *args) -> Any:
+    return self.state.get(name, DEFAULT_STATE[name])
+
+  getter.__name__ = name
+  return getter
+
+
+def forward(name: str) -> Callable[..., None]:
+  def command(self: StateAdapter, *args):
+    self.send((Op.COMMAND.value, self.name, (name, args)))
+
+  command.__name__ = name
+  return command
+
+
+for _name in DEFAULT_STATE:
+  setattr(StateAdapter, _name, get_state(_name))
+
+for _name in COMMANDS:
+  setattr(StateAdapter, _name, forward(_name))
+
+
+class HostedPlayer(NamedTuple):
+  server: Server
+  adapter: StateAdapter
+  poller: StatePoller
+
+
+class Worker:
+  """Runs in a worker process, hosting players on its own GLib loop."""
+
+  connection: Connection
+  address: str
+  report_interval: float
+  players: dict[str, HostedPlayer]
+  loop: GLib.MainLoop
+
+  _expected: float
+
+  def __init__(self, connection: Connection, address: str, report_interval: float = DEFAULT_REPORT_INTERVAL):
+    self.connection = connection
+    self.address = address
+    self.report_interval = report_interval
+    self.players = {}
+    self.loop = GLib.MainLoop()
+
+    self._expected = monotonic() + report_interval
+
+  def run(self):
+    GLib.io_add_watch(self.connection.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP, self._on_readable)
+    GLib.timeout_add(round(self.report_interval * MILLISECONDS), self._on_report)
+
+    try:
+      self.loop.run()
+
+    finally:
+      for name in [*self.players]:
+        self.remove(name)
+
+  def send(self, message: Message):
+    self.connection.send(message)
+
+  def add(self, name: str, state: State):
+    self.remove(name)
+
+    adapter = StateAdapter(name, state, self.send)
+    server = Server(name, adapter)
+
+    try:
+      server.register(PydbusBackend.connect(self.address))
+      server.request_name()
+
+    except Exception:
+      server.close()
+      raise
+
+    poller = StatePoller(server, [server.root, server.player])
+    poller.poll()
+
+    self.players[name] = HostedPlayer(server, adapter, poller)
+
+  def update(self, name: str, changes: State):
+    if player := self.players.get(name):
+      player.adapter.state.update(changes)
+      player.poller.poll()
+
+  def remove(self, name: str):
+    if player := self.players.pop(name, None):
+      player.server.close()
+
+  def handle(self, message: Message):
+    op, name, payload = message
+
+    match op:
+      case Op.ADD:
+        try:
+          self.add(name, payload)
+
+        except Exception as e:
+          log.exception(f'Could not add {name}: {e}')
+          self.send((Op.FAILED.value, name, str(e)))
+
+      case Op.UPDATE:
+        self.update(name, payload)
+
+      case Op.REMOVE:
+        self.remove(name)
+        self.send((Op.REMOVED.value, name, None))
+
+      case Op.STOP:
+        self.loop.quit()
+
+  def _on_readable(self, fd: int, condition: GLib.IOCondition) -> bool:
+    try:
+      while self.connection.poll():
+        self.handle(self.connection.recv())
+
+    except EOFError:
+      # the supervisor is gone
+      self.loop.quit()
+      return GLib.SOURCE_REMOVE
+
+    except Exception as e:
+      log.exception(f'Error while handling supervisor message: {e}')
+
+    return GLib.SOURCE_CONTINUE
+
+  def _on_report(self) -> bool:
+    now = monotonic()
+    lag = max(now - self._expected, 0.0)
+    self._expected = now + self.report_interval
+
+    try:
+      self.send((Op.LOAD.value, '', (len(self.players), lag)))
+
+    except OSError:
+      self.loop.quit()
+      return GLib.SOURCE_REMOVE
+
+    return GLib.SOURCE_CONTINUE
+
+
+def run_worker(connection: Connection, address: str, report_interval: float):
+  Worker(connection, address, report_interval).run()
+
+
+class WorkerHandle:
+  """The supervisor's side of a worker process."""
+
+  __slots__ = (
+    'connection',
+    'index',
+    'lag',
+    'players',
+    'process',
+  )
+
+  index: int
+  process: BaseProcess | None
+  connection: Connection | None
+  players: set[str]
+  lag: float
+
+  def __init__(self, index: int):
+    self.index = index
+    self.process = None
+    self.connection = None
+    self.players = set()
+    self.lag = 0.0
+
+  @property
+  def load(self) -> tuple[float, int]:
+    return self.lag, len(self.players)
+
+  def send(self, message: Message):
+    if not self.connection:
+      return
+
+    try:
+      self.connection.send(message)
+
+    except OSError as e:
+      # the worker is restarted with its players' latest state
+      log.debug(f'Could not send to worker {self.index}: {e}')
+
+
+class Supervisor:
+  """
+  Host players in worker processes, and keep their state in this one.
+
+  add() starts a player on the least loaded worker, update() sends it state
+  that changed, and on_command is called, from the supervisor's thread, with
+  each Command D-Bus clients send to a player. State keys are the names of
+  the MprisAdapter methods they answer, like `get_playstate` or `metadata`,
+  and values have to be picklable. Players that a worker can't publish are
+  logged and dropped.
+  """
+
+  size: int
+  address: str
+  on_command: OnCommand | None
+  overload_lag: float
+  report_interval: float
+
+  _workers: list[WorkerHandle]
+  _states: dict[str, State]
+  _assigned: dict[str, WorkerHandle]
+  _moving: dict[str, WorkerHandle]
+  _lock: RLock
+  _closed: Event
+  _thread: Thread | None
+  _rebalanced: float
+
+  def __init__(
+    self,
+    size: int | None = None,
+    address: str | None = None,
+    on_command: OnCommand | None = None,
+    overload_lag: float = DEFAULT_OVERLOAD_LAG,
+    report_interval: float = DEFAULT_REPORT_INTERVAL,
+  ):
+    self.size = size or os.cpu_count() or 1
+    self.address = address or get_session_address()
+    self.on_command = on_command
+    self.overload_lag = overload_lag
+    self.report_interval = report_interval
+
+    self._workers = [WorkerHandle(index) for index in range(self.size)]
+    self._states = {}
+    self._assigned = {}
+    self._moving = {}
+    self._lock = RLock()
+    self._closed = Event()
+    self._thread = None
+    self._rebalanced = float('-inf')
+
+  def __enter__(self) -> Self:
+    self.start()
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  @property
+  def players(self) -> Iterable[str]:
+    return self._states.keys()
+
+  def start(self):
+    with self._lock:
+      for worker in self._workers:
+        self._spawn(worker)
+
+    self._thread = Thread(target=self._run, name='mpris-supervisor', daemon=True)
+    self._thread.start()
+
+  def add(self, name: str, state: State | None = None):
+    """Publish a player named name on the least loaded worker."""
+    with self._lock:
+      if name in self._states:
+        raise ValueError(f'{name} is already hosted.')
+
+      self._states[name] = dict(state or {})
+      self._assign(name, min(self._workers, key=lambda worker: worker.load))
+
+  def update(self, name: str, **changes: Any):
+    """Merge changes into a player's state, and emit what changed from its worker."""
+    with self._lock:
+      self._states[name].update(changes)
+
+      # a moving player gets its latest state when it's added to its new worker
+      if name not in self._moving and (worker := self._assigned.get(name)):
+        worker.send((Op.UPDATE.value, name, changes))
+
+  def remove(self, name: str):
+    with self._lock:
+      self._states.pop(name, None)
+      self._moving.pop(name, None)
+
+      if worker := self._assigned.pop(name, None):
+        worker.players.discard(name)
+        worker.send((Op.REMOVE.value, name, None))
+
+  def close(self):
+    self._closed.set()
+
+    if self._thread:
+      self._thread.join(timeout=WAIT_TIMEOUT + JOIN_TIMEOUT)
+      self._thread = None
+
+    with self._lock:
+      for worker in self._workers:
+        self._stop(worker)
+
+      self._assigned.clear()
+      self._moving.clear()
+
+  def _spawn(self, worker: WorkerHandle):
+    context = multiprocessing.get_context(START_METHOD)
+    connection, child = context.Pipe()
+
+    worker.process = context.Process(
+      target=run_worker,
+      args=(child, self.address, self.report_interval),
+      name=f'mpris-worker-{worker.index}',
+      daemon=True,
+    )
+    worker.process.start()
+    child.close()
+
+    worker.connection = connection
+    worker.lag = 0.0
+
+  def _stop(self, worker: WorkerHandle):
+    worker.send((Op.STOP.value, '', None))
+
+    if process := worker.process:
+      process.join(timeout=JOIN_TIMEOUT)
+
+      if process.is_alive():
+        log.warning(f'Worker {process.name} is still running, terminating it.')
+        process.terminate()
+        process.join()
+
+    if worker.connection:
+      worker.connection.close()
+
+    worker.process = None
+    worker.connection = None
+    worker.players.clear()
+
+  def _restart(self, worker: WorkerHandle):
+    log.warning(f'Worker {worker.index} exited with {worker.process.exitcode}, restarting it.')
+    players = [*worker.players]
+
+    self._stop(worker)
+    self._spawn(worker)
+
+    # names it was releasing went with its process
+    for name in [name for name, source in self._moving.items() if source is worker]:
+      self._on_removed(worker, name)
+
+    for name in players:
+      if name in self._moving:
+        # added once its old worker releases the name
+        worker.players.add(name)
+
+      else:
+        self._assign(name, worker)
+
+  def _assign(self, name: str, worker: WorkerHandle):
+    self._assigned[name] = worker
+    worker.players.add(name)
+    worker.send((Op.ADD.value, name, self._states[name]))
+
+  def _move(self, name: str, target: WorkerHandle):
+    source = self._assigned[name]
+    source.players.discard(name)
+
+    # the old worker has to release the name before the new one can own it,
+    # so the player is added to the target when the source acknowledges its removal
+    self._moving[name] = source
+    self._assigned[name] = target
+    target.players.add(name)
+    source.send((Op.REMOVE.value, name, None))
+
+    log.info(f'Moving {name} from worker {source.index} to worker {target.index}.')
+
+  def _on_removed(self, worker: WorkerHandle, name: str):
+    if self._moving.get(name) is not worker:
+      return
+
+    del self._moving[name]
+
+    if target := self._assigned.get(name):
+      self._assign(name, target)
+      log.info(f'Moved {name} from worker {worker.index} to worker {target.index}.')
+
+  def _on_failed(self, worker: WorkerHandle, name: str, error: str):
+    log.error(f'Worker {worker.index} could not add {name}: {error}')
+
+    if self._assigned.get(name) is worker and name not in self._moving:
+      del self._assigned[name]
+      del self._states[name]
+      worker.players.discard(name)
+
+  def _rebalance(self, overloaded: WorkerHandle):
+    if len(overloaded.players) < 2 or monotonic() - self._rebalanced < REBALANCE_COOLDOWN:
+      return
+
+    if not (movable := [name for name in overloaded.players if name not in self._moving]):
+      return
+
+    candidates = [
+      worker
+      for worker in self._workers
+      if worker is not overloaded
+      and worker.lag < self.overload_lag
+      and len(worker.players) < len(overloaded.players) - 1
+    ]
+
+    if not candidates:
+      return
+
+    target = min(candidates, key=lambda worker: worker.load)
+    self._move(movable[0], target)
+    self._rebalanced = monotonic()
+
+  def _receive(self, worker: WorkerHandle):
+    op, name, payload = worker.connection.recv()
+
+    match op:
+      case Op.COMMAND:
+        if self.on_command:
+          self.on_command(Command(name, *payload))
+
+      case Op.LOAD:
+        _, worker.lag = payload
+
+        if worker.lag > self.overload_lag:
+          self._rebalance(worker)
+
+      case Op.REMOVED:
+        self._on_removed(worker, name)
+
+      case Op.FAILED:
+        self._on_failed(worker, name, payload)
+
+  def _run(self):
+    while not self._closed.is_set():
+      with self._lock:
+        waitables = {
+          waitable: worker
+          for worker in self._workers
+          if worker.process and worker.connection
+          for waitable in (worker.connection, worker.process.sentinel)
+        }
+
+      for ready in wait([*waitables], timeout=WAIT_TIMEOUT):
+        worker = waitables[ready]
+
+        with self._lock:
+          if self._closed.is_set():
+            return
+
+          # the worker might have been restarted since
+          if not worker.process or ready not in (worker.connection, worker.process.sentinel):
+            continue
+
+          try:
+            if ready is worker.connection:
+              self._receive(worker)
+
+            elif not worker.process.is_alive():
+              self._restart(worker)
+
+          except EOFError:
+            self._restart(worker)
+
+          except Exception as e:
+            log.exception(f'Error while supervising worker {worker.index}: {e}')
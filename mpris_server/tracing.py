@@ -0,0 +1,363 @@
+"""
+Trace spans from incoming D-Bus calls, through the adapter, to PropertiesChanged.
+
+A Tracer records a span for each traced interface member called on a Server,
+with the caller's unique name and message serial, child spans for the adapter
+methods it calls, and an instant span for each PropertiesChanged emission.
+Emissions are children of the call they're made in, and ones made from another
+thread that carries the call's context, like a deferred worker, are linked to it.
+Emissions made outside of any call, like app events, aren't linked.
+
+Traces are written as JSON lines, or in the Chrome trace event format that
+Perfetto and chrome://tracing load, when the path ends in `.json`.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from enum import auto
+from itertools import count
+from threading import Lock, get_ident, local
+from time import perf_counter
+from typing import Any, Final, IO, NamedTuple, Self, TYPE_CHECKING
+
+from strenum import LowercaseStrEnum
+
+from .base import Paths
+from .interfaces.interface import CallFinished, MprisInterface, current_call
+from .recording import SEPARATORS, open_recording
+
+
+if TYPE_CHECKING:
+  from pydbus.generic import subscription
+  from pydbus.method_call_context import MethodCallContext
+
+  from .server import Server
+
+
+__all__ = [
+  'Span',
+  'TraceFormat',
+  'Tracer',
+  'TracingAdapter',
+]
+
+log = logging.getLogger(__name__)
+
+MICROSECONDS: Final[int] = 1_000_000
+CHROME_SUFFIXES: Final[tuple[str, ...]] = ('.json', '.json.gz')
+NO_PARENT: Final[None] = None
+FLOW: Final[str] = 'follows'
+
+
+class TraceFormat(LowercaseStrEnum):
+  JSONL = auto()
+  CHROME = auto()
+
+
+class SpanKind(LowercaseStrEnum):
+  CALL = auto()
+  ADAPTER = auto()
+  EMIT = auto()
+
+
+class Span(NamedTuple):
+  id: int
+  parent: int | None
+  kind: SpanKind
+  name: str
+  start: float
+  duration: float
+  thread: int
+  args: dict[str, Any]
+  follows: int | None = None
+
+
+def get_format(path: Paths) -> TraceFormat:
+  if str(path).endswith(CHROME_SUFFIXES):
+    return TraceFormat.CHROME
+
+  return TraceFormat.JSONL
+
+
+def get_serial(context: Any) -> int | None:
+  if context is None:
+    return None
+
+  if (serial := getattr(context, 'serial', None)) is not None:
+    return serial
+
+  # pydbus' MethodCallContext only keeps the invocation privately
+  if invocation := getattr(context, '_mi', None):
+    return invocation.get_message().get_serial()
+
+  return None
+
+
+def get_chrome_event(span: Span, pid: int, **fields) -> dict[str, Any]:
+  return {
+    'name': span.name,
+    'cat': span.kind,
+    'pid': pid,
+    'tid': span.thread,
+    'ts': span.start * MICROSECONDS,
+    **fields,
+  }
+
+
+def to_chrome_events(span: Span, pid: int, source: Span | None = None) -> list[dict[str, Any]]:
+  args = {**span.args, 'id': span.id, 'parent': span.parent}
+
+  if span.kind == SpanKind.EMIT:
+    events = [get_chrome_event(span, pid, ph='i', s='t', args=args)]
+
+  else:
+    events = [get_chrome_event(span, pid, ph='X', dur=span.duration * MICROSECONDS, args=args)]
+
+  if source:
+    # a flow arrow from the call to what followed from it
+    events += [
+      get_chrome_event(source, pid, name=FLOW, ph='s', id=source.id),
+      get_chrome_event(span, pid, name=FLOW, ph='f', bp='e', id=source.id),
+    ]
+
+  return events
+
+
+class TracingAdapter:
+  """Wraps an adapter and traces each call made on it."""
+
+  adapter: Any
+  tracer: Tracer
+
+  def __init__(self, adapter: Any, tracer: Tracer):
+    self.adapter = adapter
+    self.tracer = tracer
+
+  def __getattr__(self, name: str) -> Any:
+    attr = getattr(self.adapter, name)
+
+    if not callable(attr):
+      return attr
+
+    def trace(*args, **kwargs) -> Any:
+      with self.tracer.span(SpanKind.ADAPTER, name):
+        return attr(*args, **kwargs)
+
+    return trace
+
+
+class ActiveSpan:
+  """Times a span while it's on the current thread's stack."""
+
+  __slots__ = ('args', 'id', 'kind', 'name', 'parent', 'start', 'thread', 'tracer')
+
+  def __init__(self, tracer: Tracer, kind: SpanKind, name: str, args: dict[str, Any]):
+    self.tracer = tracer
+    self.kind = kind
+    self.name = name
+    self.args = args
+    self.id = tracer.next_id()
+    self.parent = tracer.current_span()
+    self.start = perf_counter()
+    self.thread = get_ident()
+
+  def __enter__(self) -> Self:
+    self.push()
+    return self
+
+  def __exit__(self, *args):
+    self.finish()
+
+  def push(self):
+    self.tracer.stack().append(self.id)
+
+  def to_span(self) -> Span:
+    return Span(
+      self.id, self.parent, self.kind, self.name,
+      self.start - self.tracer.started, perf_counter() - self.start, self.thread, self.args,
+    )
+
+  def finish(self):
+    self.tracer.stack().pop()
+    self.tracer.write(self.to_span())
+
+
+class Tracer:
+  """Trace a Server's interface calls, adapter calls and emissions to a file."""
+
+  server: Server
+  path: Paths
+  format: TraceFormat
+  started: float
+
+  _file: IO[str] | None
+  _wrapper: TracingAdapter | None
+  _lock: Lock
+  _local: local
+  _ids: count
+  _pid: int
+  _written: int
+  _subscriptions: list[subscription]
+  # the call span handling each D-Bus call, while it's handled
+  _calls: dict[MethodCallContext, ActiveSpan]
+
+  def __init__(self, server: Server, path: Paths, format: TraceFormat | None = None):
+    self.server = server
+    self.path = path
+    self.format = format or get_format(path)
+    self.started = perf_counter()
+
+    self._file = None
+    self._wrapper = None
+    self._lock = Lock()
+    self._local = local()
+    self._ids = count(1)
+    self._pid = os.getpid()
+    self._written = 0
+    self._subscriptions = []
+    self._calls = {}
+
+  def __enter__(self) -> Self:
+    self.start()
+    return self
+
+  def __exit__(self, *args):
+    self.stop()
+
+  def start(self):
+    self._file = open_recording(self.path, 'w')
+    self.started = perf_counter()
+
+    if self.format == TraceFormat.CHROME:
+      self._file.write('[\n')
+
+    tracing = self._wrapper = TracingAdapter(self.server.adapter, self)
+    self.server.adapter = tracing
+
+    for interface in self.server.interfaces:
+      interface.adapter = tracing
+      interface.add_call_hook(self._on_call)
+
+      def on_changed(name: str, changed: dict[str, Any], invalidated: list[str], interface=interface):
+        self._on_properties_changed(interface, changed, invalidated)
+
+      self._subscriptions.append(interface.PropertiesChanged.connect(on_changed))
+
+    log.info(f'Tracing {self.server.name} to {self.path}')
+
+  def stop(self):
+    if not self._file:
+      return
+
+    if self.server.adapter is not self._wrapper:
+      raise RuntimeError(f"{self.server.name}'s adapter was wrapped again, stop that wrapper first.")
+
+    adapter = self._wrapper.adapter
+    self._wrapper = None
+    self.server.adapter = adapter
+
+    for interface in self.server.interfaces:
+      interface.adapter = adapter
+      interface.remove_call_hook(self._on_call)
+
+    for sub in self._subscriptions:
+      sub.disconnect()
+
+    self._subscriptions.clear()
+
+    with self._lock:
+      if self.format == TraceFormat.CHROME:
+        self._file.write('\n]\n')
+
+      self._file.close()
+      self._file = None
+
+  def next_id(self) -> int:
+    with self._lock:
+      return next(self._ids)
+
+  def stack(self) -> list[int]:
+    if not hasattr(self._local, 'stack'):
+      self._local.stack = []
+
+    return self._local.stack
+
+  def current_span(self) -> int | None:
+    if stack := self.stack():
+      return stack[-1]
+
+    return NO_PARENT
+
+  def span(self, kind: SpanKind, name: str, **args) -> ActiveSpan:
+    return ActiveSpan(self, kind, name, args)
+
+  def write(self, span: Span, source: Span | None = None):
+    match self.format:
+      case TraceFormat.CHROME:
+        events = to_chrome_events(span, self._pid, source)
+        lines = [json.dumps(event, separators=SEPARATORS) for event in events]
+
+      case _:
+        lines = [json.dumps(span._asdict(), separators=SEPARATORS)]
+
+    with self._lock:
+      if not self._file:
+        return
+
+      for line in lines:
+        if self.format == TraceFormat.CHROME and self._written:
+          self._file.write(',\n')
+
+        self._file.write(line)
+
+        if self.format == TraceFormat.JSONL:
+          self._file.write('\n')
+
+        self._written += 1
+
+  def _on_call(self, interface: MprisInterface, name: str, args: tuple) -> CallFinished:
+    context = current_call.get()
+    span = self.span(
+      SpanKind.CALL,
+      f'{interface.INTERFACE}.{name}',
+      sender=getattr(context, 'sender', None),
+      serial=get_serial(context),
+    )
+    span.push()
+
+    if context is None:
+      return span.finish
+
+    with self._lock:
+      # calls made while handling a call keep its context, the outermost span handles it
+      self._calls.setdefault(context, span)
+
+    def finished():
+      with self._lock:
+        if self._calls.get(context) is span:
+          del self._calls[context]
+
+      span.finish()
+
+    return finished
+
+  def _on_properties_changed(self, interface: MprisInterface, changed: dict[str, Any], invalidated: list[str]):
+    parent = self.current_span()
+    source: Span | None = None
+
+    # emitted on another thread while a call it carries the context of is handled
+    if parent is NO_PARENT and (context := current_call.get()) is not None:
+      with self._lock:
+        call = self._calls.get(context)
+
+      source = call.to_span() if call else None
+
+    span = Span(
+      self.next_id(), parent, SpanKind.EMIT, f'{interface.INTERFACE}.PropertiesChanged',
+      perf_counter() - self.started, 0.0, get_ident(),
+      {'changed': sorted(changed), 'invalidated': sorted(invalidated)},
+      source.id if source else None,
+    )
+    self.write(span, source)
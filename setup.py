@@ -31,6 +31,10 @@ REQS: list[str] = [
 
 README: str = Path('README.md').read_text()
 
+EXTRAS: dict[str, list[str]] = {
+  'asyncio': ['dbus-fast>=2.0.0'],
+}
+
 PYTHON_VERSION: str = '>=3.12'
 
 setup(
@@ -45,5 +49,6 @@ setup(
   packages=PKGS,
   zip_safe=True,
   install_requires=REQS,
+  extras_require=EXTRAS,
   python_requires=PYTHON_VERSION,
 )
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Collection, Iterator, Sequence
+
+import pytest
+
+
+pytest.importorskip('gi')
+pytest.importorskip('pydbus')
+
+from mpris_server.adapters import MprisAdapter  # noqa: E402
+from mpris_server.backends.backend import Backend, NameTaken  # noqa: E402
+from mpris_server.instances import InstanceRegistry, get_instance_name, instances  # noqa: E402
+from mpris_server.interfaces.interface import MprisInterface  # noqa: E402
+from mpris_server.server import MAX_INSTANCE_ATTEMPTS, Server  # noqa: E402
+
+
+class TakenBackend(Backend):
+  """Owns every name except the ones other players took, or none at all."""
+
+  taken: set[str] | None
+  _names: set[str]
+
+  def __init__(self, taken: Collection[str] | None = None):
+    self.taken = None if taken is None else {*taken}
+    self._names = set()
+
+  @property
+  def names(self) -> Collection[str]:
+    return self._names
+
+  def register(self, path: str, interfaces: Sequence[MprisInterface]):
+    pass
+
+  def unregister(self):
+    pass
+
+  def request_name(self, name: str):
+    if self.taken is None or name in self.taken:
+      raise NameTaken(f'{name} is already owned on the bus.')
+
+    self._names.add(name)
+
+  def release_name(self, name: str):
+    self._names.discard(name)
+
+
+def get_bus_names(server: Server, *indexes: int) -> list[str]:
+  # before it owns an instance, the server's bus name is the plain one
+  return [server.bus_name, *(f'{server.bus_name}.{get_instance_name(index)}' for index in indexes)]
+
+
+@pytest.fixture
+def server(request: pytest.FixtureRequest) -> Iterator[Server]:
+  # a name of its own, so the process-wide registry starts from scratch
+  server = Server(request.node.name.replace('_', ''), MprisAdapter())
+
+  yield server
+
+  server.close()
+
+
+def test_registry_reuses_released_numbers():
+  registry = InstanceRegistry()
+
+  assert [registry.allocate('Player') for _ in range(3)] == [0, 1, 2]
+
+  registry.release('Player', 1)
+
+  assert registry.allocate('Player') == 1
+  assert registry.allocate('Player') == 3
+
+
+def test_registry_numbers_each_name():
+  registry = InstanceRegistry()
+
+  assert registry.allocate('Player') == 0
+  assert registry.allocate('Other') == 0
+  assert registry.allocate('Player') == 1
+
+
+def test_instance_names():
+  assert get_instance_name(0, pid=1234) == 'instance1234'
+  assert get_instance_name(2, pid=1234) == 'instance1234_2'
+  assert get_instance_name(0) == f'instance{os.getpid()}'
+
+
+def test_taken_instances_are_released(server: Server):
+  server.register(TakenBackend(get_bus_names(server, 0, 1)))
+  server.request_name()
+
+  assert server.instance == 2
+  assert server.bus_name in server.backend.names
+
+  # the numbers taken elsewhere are free to try again, the owned one isn't
+  reused = {instances.allocate(server.dbus_name) for _ in range(2)}
+  assert reused == {0, 1}
+
+  for index in reused:
+    instances.release(server.dbus_name, index)
+
+
+def test_every_instance_taken(server: Server):
+  server.register(TakenBackend())
+
+  with pytest.raises(NameTaken):
+    server.request_name()
+
+  assert server.instance is None
+
+  reused = {instances.allocate(server.dbus_name) for _ in range(MAX_INSTANCE_ATTEMPTS)}
+  assert reused == {*range(MAX_INSTANCE_ATTEMPTS)}
+
+  for index in reused:
+    instances.release(server.dbus_name, index)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import os
+import shutil
+from typing import Final
+
+import pytest
+
+
+pytest.importorskip('gi')
+pytest.importorskip('pydbus')
+
+if not shutil.which('dbus-daemon'):
+  pytest.skip('dbus-daemon is needed for a private bus', allow_module_level=True)
+
+from mpris_server.bench import DEFAULT_CYCLES, run_lifecycle  # noqa: E402
+
+
+STRESS_ENV: Final[str] = 'MPRIS_STRESS'
+
+# the benchmark's full run takes minutes, so it's opt-in with MPRIS_STRESS=1
+CYCLES: Final[int] = DEFAULT_CYCLES if os.environ.get(STRESS_ENV) else 200
+SAMPLES: Final[int] = 4
+KIB: Final[int] = 1024
+
+# memory allowed to stay allocated after every server is closed, for caches that fill up once
+MAX_RETAINED: Final[int] = 256 * KIB
+# growth allowed between the first and last samples
+MAX_GROWTH: Final[int] = 64 * KIB
+
+
+def test_lifecycle_releases_servers():
+  lifecycle = run_lifecycle(CYCLES, SAMPLES)
+
+  assert lifecycle.alive == 0
+  assert lifecycle.signal_entries == 0
+
+
+def test_lifecycle_memory_is_bounded():
+  lifecycle = run_lifecycle(CYCLES, SAMPLES)
+  first, *_, last = lifecycle.retained
+
+  assert last < MAX_RETAINED
+  assert last - first < MAX_GROWTH
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import Final
+
+import pytest
+
+
+pytest.importorskip('gi')
+pytest.importorskip('pydbus')
+
+from mpris_server.adapters import MprisAdapter  # noqa: E402
+from mpris_server.base import Track  # noqa: E402
+from mpris_server.interfaces.player import Player  # noqa: E402
+from mpris_server.prefetch import PREFETCH_HITS, PREFETCH_MISSES, Prefetcher  # noqa: E402
+from mpris_server.stats import stats  # noqa: E402
+
+
+FIRST: Final[Track] = Track(name='First', track_id='/track/1')
+SECOND: Final[Track] = Track(name='Second', track_id='/track/2')
+THIRD: Final[Track] = Track(name='Third', track_id='/track/3')
+
+
+class QueueAdapter(MprisAdapter):
+  """Plays a queue of tracks, counting the art URLs it's asked for."""
+
+  current: Track | None
+  next_track: Track | None
+  previous_track: Track | None
+  art_urls: int
+
+  def __init__(self):
+    super().__init__()
+    self.current = FIRST
+    self.next_track = SECOND
+    self.previous_track = None
+    self.art_urls = 0
+
+  def get_current_track(self) -> Track | None:
+    return self.current
+
+  def get_next_track(self) -> Track | None:
+    return self.next_track
+
+  def get_previous_track(self) -> Track | None:
+    return self.previous_track
+
+  def get_art_url(self, track: Track | None) -> str:
+    self.art_urls += 1
+    return ''
+
+  def get_stream_title(self) -> str:
+    return ''
+
+
+def wait(prefetcher: Prefetcher):
+  # the worker runs one task at a time, so this one runs after what was submitted
+  prefetcher._executor.submit(lambda: None).result()
+
+
+@pytest.fixture
+def adapter() -> QueueAdapter:
+  return QueueAdapter()
+
+
+@pytest.fixture
+def player(adapter: QueueAdapter) -> Player:
+  return Player(adapter=adapter)
+
+
+@pytest.fixture
+def prefetcher(player: Player) -> Iterator[Prefetcher]:
+  prefetcher = Prefetcher(player)
+  prefetcher.start()
+  wait(prefetcher)
+
+  yield prefetcher
+
+  prefetcher.stop()
+
+
+def test_next_track_is_served_from_prefetch(adapter: QueueAdapter, player: Player, prefetcher: Prefetcher):
+  hits = stats.get(PREFETCH_HITS)
+  art_urls = adapter.art_urls
+
+  adapter.current = SECOND
+  assert player.Metadata
+
+  assert stats.get(PREFETCH_HITS) == hits + 1
+  assert adapter.art_urls == art_urls
+
+
+def test_unknown_track_misses(adapter: QueueAdapter, player: Player, prefetcher: Prefetcher):
+  misses = stats.get(PREFETCH_MISSES)
+
+  adapter.current = THIRD
+  assert player.Metadata
+
+  assert stats.get(PREFETCH_MISSES) == misses + 1
+
+
+def test_changed_track_with_the_same_id_misses(adapter: QueueAdapter, player: Player, prefetcher: Prefetcher):
+  misses = stats.get(PREFETCH_MISSES)
+  renamed = SECOND._replace(name='Renamed')
+
+  adapter.current = renamed
+
+  assert prefetcher.get(renamed) is None
+  assert stats.get(PREFETCH_MISSES) == misses + 1
+
+
+def test_prefetch_refreshes_neighbours(adapter: QueueAdapter, prefetcher: Prefetcher):
+  adapter.next_track = THIRD
+  assert prefetcher.get(THIRD) is None
+
+  prefetcher.prefetch()
+  wait(prefetcher)
+
+  assert prefetcher.get(THIRD) is not None
+
+
+def test_stopped_prefetcher_serves_nothing(prefetcher: Prefetcher):
+  prefetcher.stop()
+
+  assert prefetcher.get(SECOND) is None
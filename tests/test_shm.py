@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from pathlib import Path
+from threading import Event, Thread
+from typing import Final
+
+import pytest
+
+
+pytest.importorskip('gi')
+pytest.importorskip('pydbus')
+
+from mpris_server.base import PlayState  # noqa: E402
+from mpris_server.enums import Property  # noqa: E402
+from mpris_server.shm import Capability, SEQUENCE, SEQUENCE_OFFSET, SharedState, StateBlock, StateWriter, \
+  get_changes  # noqa: E402
+
+
+READS: Final[int] = 20_000
+PLAYING: Final[int] = 1
+PAUSED: Final[int] = 2
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> Path:
+  return tmp_path / 'state'
+
+
+def test_read_what_was_written(path: Path):
+  with StateWriter(path) as writer, StateBlock(path) as block:
+    writer.write(position=5, rate=2.0, volume=0.5, generation=3, flags=Capability.PLAY, status=PLAYING)
+
+    assert block.read() == writer.state
+
+
+def test_reads_are_never_torn(path: Path):
+  stopped = Event()
+
+  def write(writer: StateWriter):
+    value = 0
+
+    while not stopped.is_set():
+      value += 1
+      writer.write(position=value, rate=float(value), volume=float(value), generation=value)
+
+  with StateWriter(path) as writer, StateBlock(path) as block:
+    thread = Thread(target=write, args=(writer,))
+    thread.start()
+
+    try:
+      for _ in range(READS):
+        state = block.read()
+        assert state.position == state.rate == state.volume == state.generation
+
+    finally:
+      stopped.set()
+      thread.join()
+
+
+def test_unfinished_write_falls_back_to_last_read(path: Path):
+  with StateWriter(path) as writer, StateBlock(path) as block:
+    writer.write(position=5)
+    last = block.read()
+
+    # a writer that stopped halfway through, leaving the sequence odd
+    sequence, = SEQUENCE.unpack_from(writer._map, SEQUENCE_OFFSET)
+    SEQUENCE.pack_into(writer._map, SEQUENCE_OFFSET, sequence + 1)
+
+    assert block.read() == last
+
+
+def test_writer_resumes_from_an_unfinished_write(path: Path):
+  with StateWriter(path) as writer:
+    sequence, = SEQUENCE.unpack_from(writer._map, SEQUENCE_OFFSET)
+    SEQUENCE.pack_into(writer._map, SEQUENCE_OFFSET, sequence + 1)
+
+  with StateWriter(path) as writer, StateBlock(path) as block:
+    writer.write(position=7)
+
+    assert block.read().position == 7
+
+
+def test_block_before_writer(path: Path):
+  with pytest.raises(FileNotFoundError):
+    StateBlock(path)
+
+  path.write_bytes(bytes(64))
+
+  with pytest.raises(ValueError):
+    StateBlock(path)
+
+
+def test_position_moves_while_playing():
+  state = SharedState(position=1_000_000, position_time=10.0, rate=2.0, status=PLAYING)
+
+  assert state.playstate == PlayState.PLAYING
+  assert state.get_position(now=11.5) == 4_000_000
+
+
+def test_position_is_still_while_paused():
+  state = SharedState(position=1_000_000, position_time=10.0, status=PAUSED)
+
+  assert state.get_position(now=20.0) == 1_000_000
+
+
+def test_position_without_sample_time():
+  state = SharedState(position=1_000_000, status=PLAYING)
+
+  assert state.get_position(now=20.0) == 1_000_000
+
+
+def test_position_never_moves_back():
+  state = SharedState(position=1_000_000, position_time=10.0, status=PLAYING)
+
+  assert state.get_position(now=9.0) == 1_000_000
+
+
+def test_unknown_status_is_stopped():
+  assert SharedState(status=255).playstate == PlayState.STOPPED
+
+
+def test_changes_for_toggled_flags():
+  previous = SharedState(flags=Capability.CONTROL | Capability.PLAY)
+  current = SharedState(flags=Capability.CONTROL | Capability.PAUSE | Capability.SEEK)
+
+  assert get_changes(previous, current) == [Property.CanPause, Property.CanPlay, Property.CanSeek]
+
+
+def test_changes_for_fields():
+  previous = SharedState()
+  current = SharedState(position=5, rate=2.0, volume=0.5, generation=1, status=PLAYING)
+
+  assert get_changes(previous, current) == [
+    Property.Metadata,
+    Property.PlaybackStatus,
+    Property.Rate,
+    Property.Volume,
+  ]
+
+
+def test_no_changes_for_position():
+  assert get_changes(SharedState(), SharedState(position=5, position_time=1.0)) == []
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Final
+
+import pytest
+
+
+pytest.importorskip('gi')
+pytest.importorskip('pydbus')
+
+from gi.repository.GLib import Variant  # noqa: E402
+
+from mpris_server.adapters import MprisAdapter  # noqa: E402
+from mpris_server.base import Interface, PlayState, Track  # noqa: E402
+from mpris_server.enums import Property  # noqa: E402
+from mpris_server.events import EventAdapter  # noqa: E402
+from mpris_server.server import Server  # noqa: E402
+from mpris_server.snapshot import load_snapshot, take_snapshot  # noqa: E402
+
+
+TITLE: Final[str] = 'Restored Title'
+METADATA: Final[str] = 'a{sv}'
+
+
+class PlayingAdapter(MprisAdapter):
+  def get_current_track(self) -> Track:
+    return Track(name=TITLE, track_id='/track/1')
+
+  def get_art_url(self, track: Track | None) -> str:
+    return ''
+
+  def get_playstate(self) -> PlayState:
+    return PlayState.PLAYING
+
+  def get_stream_title(self) -> str:
+    return ''
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> Path:
+  path = tmp_path / 'snapshot'
+
+  with Server('Saved', PlayingAdapter()) as server:
+    server.save_snapshot(path)
+
+  return path
+
+
+def test_restored_metadata_can_be_emitted(path: Path):
+  # an app that isn't ready yet
+  server = Server('Restored', MprisAdapter())
+  assert server.restore_snapshot(path)
+
+  emitted: list[Variant] = []
+
+  def on_changed(name: str, changed: dict[str, Any], invalidated: list[str]):
+    # boxed the way both backends box PropertiesChanged
+    emitted.append(Variant(METADATA, changed[Property.Metadata]))
+
+  subscription = server.player.PropertiesChanged.connect(on_changed)
+
+  try:
+    EventAdapter(root=server.root, player=server.player).on_title()
+
+  finally:
+    subscription.disconnect()
+    server.close()
+
+  metadata, = emitted
+  assert metadata.unpack()['xesam:title'] == TITLE
+
+
+def test_restored_server_can_be_snapshotted(path: Path):
+  server = Server('Restored', MprisAdapter())
+  server.restore_snapshot(path)
+
+  try:
+    snapshot = take_snapshot(server.interfaces)
+
+  finally:
+    server.close()
+
+  restored = load_snapshot(path)
+  assert snapshot[Interface.Player][Property.Metadata] == restored[Interface.Player][Property.Metadata]
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path: Path):
+  assert load_snapshot(tmp_path) is None
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Final
+
+import pytest
+
+
+pytest.importorskip('gi')
+pytest.importorskip('pydbus')
+
+from mpris_server.supervisor import Message, Op, Supervisor, WorkerHandle  # noqa: E402
+
+
+ADDRESS: Final[str] = 'unix:path=/nonexistent'
+
+
+class FakeConnection:
+  """Records what the supervisor sends, and replies with what a test queued."""
+
+  sent: list[Message]
+  replies: deque[Message]
+
+  def __init__(self):
+    self.sent = []
+    self.replies = deque()
+
+  def send(self, message: Message):
+    self.sent.append(message)
+
+  def recv(self) -> Message:
+    return self.replies.popleft()
+
+  def close(self):
+    pass
+
+  def get_ops(self, name: str) -> list[str]:
+    return [op for op, player, _ in self.sent if player == name]
+
+
+class FakeProcess:
+  exitcode: int = 1
+
+
+def reply(supervisor: Supervisor, worker: WorkerHandle, op: Op, name: str, payload: Any = None):
+  worker.connection.replies.append((op.value, name, payload))
+  supervisor._receive(worker)
+
+
+@pytest.fixture
+def supervisor(monkeypatch: pytest.MonkeyPatch) -> Supervisor:
+  supervisor = Supervisor(size=2, address=ADDRESS)
+
+  def spawn(worker: WorkerHandle):
+    worker.process = FakeProcess()
+    worker.connection = FakeConnection()
+    worker.lag = 0.0
+
+  def stop(worker: WorkerHandle):
+    worker.process = None
+    worker.connection = None
+    worker.players.clear()
+
+  monkeypatch.setattr(supervisor, '_spawn', spawn)
+  monkeypatch.setattr(supervisor, '_stop', stop)
+
+  for worker in supervisor._workers:
+    spawn(worker)
+
+  return supervisor
+
+
+def test_move_waits_for_removal(supervisor: Supervisor):
+  source, target = supervisor._workers
+  supervisor.add('Player')
+
+  supervisor._move('Player', target)
+
+  assert source.connection.get_ops('Player') == [Op.ADD, Op.REMOVE]
+  assert target.connection.get_ops('Player') == []
+
+  reply(supervisor, source, Op.REMOVED, 'Player')
+
+  assert target.connection.get_ops('Player') == [Op.ADD]
+  assert 'Player' not in supervisor._moving
+
+
+def test_updates_while_moving_are_added(supervisor: Supervisor):
+  source, target = supervisor._workers
+  supervisor.add('Player', {'get_volume': 1.0})
+
+  supervisor._move('Player', target)
+  supervisor.update('Player', get_volume=0.5)
+
+  assert source.connection.get_ops('Player') == [Op.ADD, Op.REMOVE]
+
+  reply(supervisor, source, Op.REMOVED, 'Player')
+
+  (op, _, state), = target.connection.sent
+  assert op == Op.ADD
+  assert state['get_volume'] == 0.5
+
+
+def test_source_restarted_while_moving(supervisor: Supervisor):
+  source, target = supervisor._workers
+  supervisor.add('Player')
+  supervisor._move('Player', target)
+
+  # the name went with the old process, so there's no removal to wait for
+  supervisor._restart(source)
+
+  assert target.connection.get_ops('Player') == [Op.ADD]
+  assert source.connection.get_ops('Player') == []
+  assert 'Player' not in supervisor._moving
+
+
+def test_target_restarted_while_moving(supervisor: Supervisor):
+  source, target = supervisor._workers
+  supervisor.add('Player')
+  supervisor._move('Player', target)
+
+  supervisor._restart(target)
+
+  assert 'Player' in target.players
+  assert target.connection.get_ops('Player') == []
+
+  reply(supervisor, source, Op.REMOVED, 'Player')
+
+  assert target.connection.get_ops('Player') == [Op.ADD]
+
+
+def test_failed_add_drops_player(supervisor: Supervisor):
+  worker, _ = supervisor._workers
+  supervisor.add('Player')
+
+  reply(supervisor, worker, Op.FAILED, 'Player', 'Name taken')
+
+  assert 'Player' not in supervisor.players
+  assert 'Player' not in worker.players
+  assert 'Player' not in supervisor._assigned
+
+  # its name can be hosted again
+  supervisor.add('Player')
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from threading import Barrier, Lock, Thread
+from time import monotonic
+from typing import Final
+
+import pytest
+
+
+pytest.importorskip('gi')
+pytest.importorskip('pydbus')
+
+from gi.repository.GLib import Variant  # noqa: E402
+
+from mpris_server.adapters import MprisAdapter  # noqa: E402
+from mpris_server.backends.backend import adapter_calls  # noqa: E402
+from mpris_server.base import PlayState, Position  # noqa: E402
+from mpris_server.events import EventAdapter  # noqa: E402
+from mpris_server.interfaces.interface import MprisInterface, NO_HOOKS  # noqa: E402
+from mpris_server.interfaces.player import Player  # noqa: E402
+from mpris_server.interfaces.root import Root  # noqa: E402
+from mpris_server.interfaces.tracklist import TrackList  # noqa: E402
+from mpris_server.monitors import LoopMonitor, SeekMonitor  # noqa: E402
+
+
+THREADS: Final[int] = 8
+ROUNDS: Final[int] = 2_000
+TRACKS: Final[int] = 50
+MICROSECONDS: Final[int] = 1_000_000
+
+
+def run_threads(target: Callable[[int], None], threads: int = THREADS):
+  barrier = Barrier(threads)
+  errors: list[BaseException] = []
+
+  def run(index: int):
+    barrier.wait()
+
+    try:
+      target(index)
+
+    except BaseException as e:
+      errors.append(e)
+
+  workers = [Thread(target=run, args=(index,)) for index in range(threads)]
+
+  for worker in workers:
+    worker.start()
+
+  for worker in workers:
+    worker.join()
+
+  assert not errors, errors
+
+
+class PlayingAdapter(MprisAdapter):
+  """Plays from when it was created, at the default rate."""
+
+  def __init__(self):
+    super().__init__()
+    self.started = monotonic()
+
+  def get_current_position(self) -> Position:
+    return round((monotonic() - self.started) * MICROSECONDS)
+
+  def get_playstate(self) -> PlayState:
+    return PlayState.PLAYING
+
+
+class ThreadSafeAdapter(MprisAdapter):
+  def is_thread_safe(self) -> bool:
+    return True
+
+
+def test_call_hooks_from_threads():
+  root = Root(adapter=MprisAdapter())
+  calls: list[str] = []
+  calls_lock = Lock()
+
+  def record(interface: MprisInterface, name: str, args: tuple) -> None:
+    with calls_lock:
+      calls.append(name)
+
+  root.add_call_hook(record)
+
+  def hammer(index: int):
+    def hook(interface: MprisInterface, name: str, args: tuple) -> None:
+      pass
+
+    for _ in range(ROUNDS):
+      if index % 2:
+        root.add_call_hook(hook)
+        root.remove_call_hook(hook)
+
+      else:
+        assert root.Identity == root.name
+
+  run_threads(hammer)
+
+  assert root.call_hooks == (record,)
+  assert len(calls) == ROUNDS * THREADS // 2
+
+  root.remove_call_hook(record)
+  assert root.call_hooks == NO_HOOKS
+
+
+def test_fingerprints_from_threads():
+  adapter = MprisAdapter()
+  tracklist = TrackList(adapter=adapter)
+  events = EventAdapter(root=Root(adapter=adapter), tracklist=tracklist)
+
+  emitted: list[str] = []
+  emitted_lock = Lock()
+
+  def on_changed(track_id: str, metadata: dict):
+    with emitted_lock:
+      emitted.append(track_id)
+
+  subscription = tracklist.TrackMetadataChanged.connect(on_changed)
+
+  def change(index: int):
+    for track in range(TRACKS):
+      track_id = f'/track/{track}'
+      metadata = {
+        'mpris:trackid': Variant('o', track_id),
+        'xesam:title': Variant('s', f'Track {track}'),
+      }
+      events.on_track_metadata_change(track_id, metadata)
+
+  try:
+    run_threads(change)
+
+  finally:
+    subscription.disconnect()
+
+  # each track's metadata is the same from every thread, so it's only sent once
+  assert sorted(emitted) == sorted(f'/track/{track}' for track in range(TRACKS))
+
+
+def test_adapter_calls_take_turns():
+  adapter = MprisAdapter()
+  active = 0
+  most_active = 0
+  counter_lock = Lock()
+
+  def call(index: int):
+    nonlocal active, most_active
+
+    for _ in range(ROUNDS):
+      with adapter_calls(adapter):
+        with counter_lock:
+          active += 1
+          most_active = max(most_active, active)
+
+        with counter_lock:
+          active -= 1
+
+  run_threads(call)
+
+  assert most_active == 1
+
+
+def test_adapter_calls_share_a_lock():
+  adapter = MprisAdapter()
+  locks: list[object] = []
+  locks_lock = Lock()
+
+  def get_lock(index: int):
+    lock = adapter_calls(adapter)
+
+    with locks_lock:
+      locks.append(lock)
+
+  run_threads(get_lock)
+
+  assert all(lock is locks[0] for lock in locks)
+
+
+def test_adapter_calls_skip_thread_safe_adapters():
+  adapter = ThreadSafeAdapter()
+
+  with adapter_calls(adapter), adapter_calls(adapter):
+    pass
+
+
+def test_seeked_from_threads_keeps_baseline():
+  adapter = PlayingAdapter()
+  monitor = SeekMonitor(Player(adapter=adapter))
+  monitor.reset()
+
+  def seek(index: int):
+    for _ in range(ROUNDS):
+      if index:
+        monitor._on_seeked(adapter.get_current_position())
+
+      else:
+        assert not monitor.sample()
+
+  run_threads(seek)
+
+
+def test_loop_lag_percentiles_from_threads():
+  monitor = LoopMonitor([], threshold=float('inf'), report_interval=float('inf'))
+
+  def sample(index: int):
+    for _ in range(ROUNDS):
+      if index:
+        monitor.get_percentiles()
+
+      else:
+        monitor._on_timeout()
+
+  run_threads(sample)
+
+  assert len(monitor.lags) == min(ROUNDS, monitor.lags.maxlen)